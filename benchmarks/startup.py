@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Start the program several times with --profile-startup and compare the
+median time of every phase with the budget in startup_budget.json. The
+exit status is 1 if some phase is over budget.
+
+The budget is three times the medians measured offscreen, rounded up to
+10 ms. Phases that depend on the display (placeholder, which draws the
+equation shown until its first render is ready, show window and the
+total) are reported without budget.
+
+Run it from the sources tree: python3 benchmarks/startup.py [runs]
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+SOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'startup_budget.json')
+RUNS = 5
+
+
+def run():
+    """ Return a dict phase -> seconds of a start of the program. """
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    output = subprocess.run(
+        [sys.executable, "-m", "visualequation", "--profile-startup"],
+        cwd=SOURCES_DIR, env=env, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, check=True).stderr.decode('utf8')
+    times = {}
+    for line in output.splitlines():
+        name, sep, seconds = line.rpartition(' ')[0].rpartition(' ')
+        try:
+            times[name.strip()] = float(seconds)
+        except ValueError:
+            # Other messages of the program
+            pass
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    with open(BUDGET, "r") as fbudget:
+        budget = json.load(fbudget)
+    samples = [run() for i in range(runs)]
+    over = False
+    print("%-20s %8s %8s" % ("phase", "median", "budget"))
+    names = list(samples[0])
+    names += [name for name in budget if name not in names]
+    for name in names:
+        limit = budget.get(name)
+        values = [times[name] for times in samples if name in times]
+        if not values:
+            print("%-20s %8s %8.3f  MISSING" % (name, "-", limit))
+            over = True
+            continue
+        median = statistics.median(values)
+        if limit is None:
+            print("%-20s %8.3f %8s" % (name, median, "-"))
+            continue
+        status = "  OVER" if median > limit else ""
+        over = over or median > limit
+        print("%-20s %8.3f %8.3f%s" % (name, median, limit, status))
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
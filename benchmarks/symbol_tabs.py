@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Report how long it takes to create the tabs of symbols before the window
+is shown (only the visible tab is built) and how long it would take to
+build every tab, as it was done before they were built lazily.
+
+Run it from the sources tree, once the icons are generated:
+python3 benchmarks/symbol_tabs.py
+"""
+import os
+import sys
+import time
+import gettext
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+gettext.install('visualequation')
+
+from PyQt5.QtWidgets import QApplication
+
+from visualequation import icons
+from visualequation import symbolstab
+from visualequation.symbols import lists
+
+
+def main():
+    app = QApplication(sys.argv)
+    # TabWidget would stop at a modal error dialog
+    if not icons.exists(lists.MENUITEMSDATA[0].tag):
+        sys.exit("Icons not found. Generate them with generate_icons.py.")
+    start = time.perf_counter()
+    tabs = symbolstab.TabWidget(None, None)
+    lazy = time.perf_counter() - start
+    start = time.perf_counter()
+    for index in range(len(tabs.tabs)):
+        tabs.build_tab(index)
+    rest = time.perf_counter() - start
+    print("Tabs: %d" % len(tabs.tabs))
+    print("Startup, visible tab only: %7.3f s" % lazy)
+    print("Startup, every tab:        %7.3f s" % (lazy + rest))
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Zoom in and out an equation as the menu of the program does and report how
+many times latex and dvipng were run and how long it took, with and
+without the render cache.
+
+Run it from the sources tree: python3 benchmarks/zoom_sweep.py
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from visualequation import conversions
+from visualequation import rendercache
+from visualequation.symbols import utils
+
+EQ = [utils.JUXT, utils.Op(2, r'\frac{{{0}}}{{{1}}}'), 'a', 'b',
+      utils.JUXT, '+', utils.SUP, 'x', '2']
+DPIS = list(range(300, 1001, 50)) + list(range(950, 99, -50))
+
+
+class Counter:
+    def __init__(self, fun):
+        self.fun = fun
+        self.calls = 0
+        self.time = 0.
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            return self.fun(*args, **kwargs)
+        finally:
+            self.time += time.perf_counter() - start
+
+
+def sweep(render):
+    latex = conversions.latex_file2dvi = Counter(conversions.latex_file2dvi)
+    dvipng = conversions.dvi2png = Counter(conversions.dvi2png)
+    start = time.perf_counter()
+    for dpi in DPIS:
+        render(dpi)
+    total = time.perf_counter() - start
+    conversions.latex_file2dvi = latex.fun
+    conversions.dvi2png = dvipng.fun
+    return total, latex, dvipng
+
+
+def main():
+    temp_dirpath = tempfile.mkdtemp()
+    cache = rendercache.RenderCache(os.path.join(temp_dirpath, 'cache'))
+    results = (
+        ('eq2png', sweep(lambda dpi: conversions.eq2png(EQ, dpi, None,
+                                                        temp_dirpath))),
+        ('cache', sweep(lambda dpi: cache.png(EQ, dpi))),
+    )
+    shutil.rmtree(temp_dirpath)
+    print("Zoom sweep of %d steps" % len(DPIS))
+    for name, (total, latex, dvipng) in results:
+        print("%-8s total %7.3f s | latex %3d runs %7.3f s | "
+              "dvipng %3d runs %7.3f s"
+              % (name, total, latex.calls, latex.time, dvipng.calls,
+                 dvipng.time))
+
+
+if __name__ == '__main__':
+    main()
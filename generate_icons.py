@@ -15,22 +15,47 @@
 
 """
 Run this script before packaging or installing.
-It requires the LaTeX system and imagemagick to be installed.
+It requires the LaTeX system, PyQt5 and NumPy to be installed.
 """
 import sys
 import os
+import json
+import hashlib
+import struct
 import tempfile
 import shutil
 import subprocess
 import configparser
+import concurrent.futures
+
+import numpy as np
+from PyQt5.QtGui import QImage
 
 DPI = 200
+# Icons are generated for screens with these device pixel ratios, at
+# DPI times the ratio
+SCALES = (1, 2)
 ICONS_DEF = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                          'data', 'icons-def.ini'))
 ICONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                          'data', 'icons'))
 LATEX_TEMPLATE = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                               'data', 'eq_template.tex'))
+# Number of icons rendered in the same LaTeX document
+BATCH_SIZE = 32
+# It separates the codes of the icons in the document
+PAGE_BREAK = "\n\\end{displaymath}\n\\newpage\n\\begin{displaymath}\n"
+# Index of the atlases of scale 1, read by visualequation/icons.py
+ATLAS_INDEX = os.path.join(ICONS_DIR, 'atlas.json')
+# Hash of the inputs of every icon, to know which ones must be regenerated
+MANIFEST = os.path.join(ICONS_DIR, 'manifest.json')
+# Maximum width of an atlas and space between icons, in pixels
+ATLAS_WIDTH = 1024
+ATLAS_PADDING = 1
+# Columns of the image taken by the character added by edit_expr
+CHOP = 5
+# Version of the output of postprocess, increase it when it changes
+POSTPROCESS = 2
 
 
 def edit_expr(latex_code):
@@ -41,54 +66,260 @@ def edit_expr(latex_code):
     return r"\textcolor{white}{|}" + latex_code
 
 
-def postprocess(filename):
+def suffix(scale):
+    """ Return the suffix of the names of the files of a scale. """
+    return '' if scale == 1 else '@' + str(scale) + 'x'
+
+
+def icon_name(tag, scale=1):
+    return tag + suffix(scale)
+
+
+def atlas_name(section, scale=1):
+    return 'atlas-' + section.lower() + suffix(scale) + '.png'
+
+
+def atlas_index(scale=1):
+    return os.path.join(ICONS_DIR, 'atlas' + suffix(scale) + '.json')
+
+
+def read_png(filename):
+    """
+    Return the image of a PNG file as an RGBA array of shape
+    (height, width, 4). ValueError is raised if it cannot be read.
+    """
+    image = QImage(filename)
+    if image.isNull():
+        raise ValueError("File " + filename + " could not be read")
+    image = image.convertToFormat(QImage.Format_RGBA8888)
+    width, height = image.width(), image.height()
+    bits = image.constBits()
+    bits.setsize(image.bytesPerLine() * height)
+    rows = np.frombuffer(bits, np.uint8).reshape(height, -1)
+    # Rows can be padded, copy the data before the image is freed
+    return rows[:, :width * 4].reshape(height, width, 4).copy()
+
+
+def write_png(image, filename):
+    """ Write an RGBA array of shape (height, width, 4) in a PNG file. """
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    qimage = QImage(image.data, width, height, width * 4,
+                    QImage.Format_RGBA8888)
+    if not qimage.save(filename, "PNG"):
+        raise ValueError("File " + filename + " could not be written")
+
+
+def trim(image, chop=CHOP):
+    """
+    Remove the first chop columns and the transparent columns around the
+    symbol. The height is kept, so symbols keep their alignment.
+    """
+    image = image[:, chop:]
+    columns = np.flatnonzero(image[..., 3].any(axis=0))
+    if columns.size:
+        image = image[:, columns[0]:columns[-1] + 1]
+    return image
+
+
+def postprocess(filename, chop=CHOP):
     """
     Remove the extra added character from the image.
     """
     try:
-        subprocess.call(["mogrify", "-chop", "5x0", filename])
-    except OSError:
-        raise SystemExit("Command mogrify was not found. "
-                         + " You need installed imagemagick.")
+        write_png(trim(read_png(filename), chop), filename)
+    except ValueError as error:
+        raise SystemExit(str(error))
 
 
-def code2icon(code, file_output, temp_dir):
+def compile_icons(codes, output_files, temp_dir, scale=1):
+    """
+    Write every code in a page of one LaTeX document and convert all the
+    pages with one call to dvipng at DPI times scale. Return False if latex
+    fails.
+    """
     # Create LaTeX file
     latex_file = os.path.join(temp_dir, 've.tex')
     dvi_file = os.path.join(temp_dir, 've.dvi')
     log_file = os.path.join(temp_dir, 've.log')
+    body = PAGE_BREAK.join(edit_expr(code) for code in codes)
     with open(LATEX_TEMPLATE, "r") as ftempl:
         with open(latex_file, "w") as flatex:
             for line in ftempl:
-                flatex.write(line.replace('%EQ%', edit_expr(code)))
+                flatex.write(line.replace('%EQ%', body))
     # Generate the DVI
     try:
         subprocess.check_output(["latex", "-interaction=nonstopmode",
                                  "-halt-on-error",
                                  "-output-directory=" + temp_dir,
                                  latex_file])
-    except subprocess.CalledProcessError as error:
-        msg = "Error reported by latex. The equation cannot be generated.\n" \
-              + "If you have installed the required packages, it could be " \
-              + "an internal error.\nCode:" + code
-        raise SystemExit(msg)
+    except subprocess.CalledProcessError:
+        return False
     except OSError:
         raise SystemExit("Command latex was not found.")
-    # Generate the icon
+    # Generate the icons, dvipng replaces %d by the number of the page
     with open(log_file, "w") as flog:
         try:
-            subprocess.call(["dvipng", "-T", "tight", "-D", str(DPI),
+            subprocess.call(["dvipng", "-T", "tight", "-D", str(DPI * scale),
                              "-bg", "Transparent",
-                             "-o", file_output, dvi_file], stdout=flog)
+                             "-o", os.path.join(temp_dir, 'icon%d.png'),
+                             dvi_file], stdout=flog)
         except OSError:
             raise SystemExit("Command dvipng was not found.")
-    postprocess(file_output)
+    for page, file_output in enumerate(output_files, 1):
+        page_file = os.path.join(temp_dir, 'icon' + str(page) + '.png')
+        if not os.path.exists(page_file):
+            raise SystemExit("dvipng did not generate the icon " + file_output)
+        postprocess(page_file, CHOP * scale)
+        shutil.move(page_file, file_output)
+    return True
 
 
-if __name__ == '__main__':
+def code2icon(code, file_output, temp_dir, scale=1):
+    if not compile_icons([code], [file_output], temp_dir, scale):
+        msg = "Error reported by latex. The equation cannot be generated.\n" \
+              + "If you have installed the required packages, it could be " \
+              + "an internal error.\nCode:" + code
+        raise SystemExit(msg)
+
+
+def batch2icons(batch, scale=1):
+    """
+    Generate the icons of a list of (code, file_output) in a new temporal
+    directory. It is run in the worker processes.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        codes, output_files = zip(*batch)
+        if not compile_icons(codes, output_files, temp_dir, scale):
+            # Compile them one by one to report the code with errors
+            for code, file_output in batch:
+                code2icon(code, file_output, temp_dir, scale)
+    finally:
+        shutil.rmtree(temp_dir)
+    return len(batch)
 
-    # Prepare a temporal directory to manage all LaTeX files
-    temp_dirpath = tempfile.mkdtemp()
+
+def icon_hash(code, template, dpi=DPI, chop=CHOP):
+    """ Return a hash of everything the icon of code is generated from. """
+    digest = hashlib.sha256()
+    for part in (edit_expr(code), template, str(dpi), str(chop),
+                 str(POSTPROCESS)):
+        digest.update(part.encode('utf8') + b'\0')
+    return digest.hexdigest()
+
+
+def read_json(filepath):
+    """ Return the content of a JSON file, or {} if it cannot be read. """
+    try:
+        with open(filepath, "r") as fjson:
+            return json.load(fjson)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(data, filepath):
+    with open(filepath, "w") as fjson:
+        json.dump(data, fjson, indent=0, sort_keys=True)
+
+
+def icon_hashes(config):
+    """
+    Return a dict name of an icon -> hash of its inputs, for every tag and
+    scale.
+    """
+    with open(LATEX_TEMPLATE, "r") as ftempl:
+        template = ftempl.read()
+    return {icon_name(tag, scale): icon_hash(code, template, DPI * scale,
+                                             CHOP * scale)
+            for scale in SCALES for section in config
+            for tag, code in config[section].items()}
+
+
+def stale_icons(hashes, manifest):
+    """
+    Return the names of the icons which do not exist or were generated from
+    other inputs, according to the manifest.
+    """
+    return [name for name, hash_ in hashes.items()
+            if manifest.get(name) != hash_
+            or not os.path.exists(os.path.join(ICONS_DIR, name + '.png'))]
+
+
+def orphan_files(config):
+    """ Return the images in ICONS_DIR which are not used anymore. """
+    expected = set()
+    for scale in SCALES:
+        expected.update(icon_name(tag, scale) + '.png' for section in config
+                        for tag in config[section])
+        expected.update(atlas_name(section, scale)
+                        for section in config.sections())
+    try:
+        fnames = os.listdir(ICONS_DIR)
+    except OSError:
+        return []
+    return [os.path.join(ICONS_DIR, fname) for fname in fnames
+            if fname.endswith('.png') and fname not in expected]
+
+
+def png_size(filename):
+    """ Return the (width, height) of a PNG file. """
+    with open(filename, "rb") as fpng:
+        header = fpng.read(24)
+    if len(header) < 24 or header[12:16] != b'IHDR':
+        raise SystemExit("File " + filename + " is not a valid PNG.")
+    return struct.unpack('>II', header[16:24])
+
+
+def pack(sizes, max_width=ATLAS_WIDTH, padding=ATLAS_PADDING):
+    """
+    Place rectangles of the given (width, height) in shelves, tallest
+    first. Return the list of their (x, y) and the (width, height) of the
+    atlas.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True)
+    positions = [None] * len(sizes)
+    x = y = shelf_height = atlas_width = 0
+    for i in order:
+        width, height = sizes[i]
+        if x and x + width > max_width:
+            y += shelf_height + padding
+            x = shelf_height = 0
+        positions[i] = (x, y)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+        atlas_width = max(atlas_width, x - padding)
+    return positions, (atlas_width, y + shelf_height)
+
+
+def join_icons(icon_paths, positions, atlas_size, atlas_filepath):
+    """ Write the atlas with the icons at the given positions. """
+    atlas = np.zeros((atlas_size[1], atlas_size[0], 4), np.uint8)
+    for icon_path, (x, y) in zip(icon_paths, positions):
+        icon = read_png(icon_path)
+        atlas[y:y + icon.shape[0], x:x + icon.shape[1]] = icon
+    write_png(atlas, atlas_filepath)
+
+
+def make_atlas(tags, atlas_filepath, scale=1):
+    """
+    Join the icons of tags in one image and return the entries of the index
+    of the atlas: tag -> [atlas file name, x, y, width, height].
+    """
+    icon_paths = [os.path.join(ICONS_DIR, icon_name(tag, scale) + '.png')
+                  for tag in tags]
+    sizes = [png_size(icon_path) for icon_path in icon_paths]
+    positions, atlas_size = pack(sizes)
+    try:
+        join_icons(icon_paths, positions, atlas_size, atlas_filepath)
+    except ValueError:
+        raise SystemExit("Atlas " + atlas_filepath + " could not be created.")
+    atlas_name = os.path.basename(atlas_filepath)
+    return {tag: [atlas_name, x, y, width, height]
+            for tag, (x, y), (width, height) in zip(tags, positions, sizes)}
+
+
+if __name__ == '__main__':
 
     if not os.path.exists(ICONS_DIR):
         os.makedirs(ICONS_DIR)
@@ -96,11 +327,51 @@ if __name__ == '__main__':
     config = configparser.ConfigParser(delimiters=(' ',))
     config.read(ICONS_DEF)
 
-    for index, section in enumerate(config):
-        print("Generating icons...", index + 1, "/", len(config))
-        for tag, code in config[section].items():
-            png_filepath = os.path.join(ICONS_DIR, tag + '.png')
-            if not os.path.exists(png_filepath):
-                code2icon(code, png_filepath, temp_dirpath)
+    for filepath in orphan_files(config):
+        print("Removing", filepath)
+        os.remove(filepath)
+
+    hashes = icon_hashes(config)
+    manifest = read_json(MANIFEST)
+    stale = set(stale_icons(hashes, manifest))
+    # Batches are compiled in parallel, each one in its own directory
+    batches = []
+    scales = []
+    n_pending = 0
+    for scale in SCALES:
+        pending = []
+        for section in config:
+            for tag, code in config[section].items():
+                name = icon_name(tag, scale)
+                if name in stale:
+                    pending.append((code, os.path.join(ICONS_DIR,
+                                                       name + '.png')))
+        for i in range(0, len(pending), BATCH_SIZE):
+            batches.append(pending[i:i + BATCH_SIZE])
+            scales.append(scale)
+        n_pending += len(pending)
+    done = 0
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        for n_icons in executor.map(batch2icons, batches, scales):
+            done += n_icons
+            print("Generating icons...", done, "/", n_pending)
+    write_json(hashes, MANIFEST)
 
-    shutil.rmtree(temp_dirpath)
+    # One atlas per section and scale, so the program reads a few files at
+    # start. Only the ones with new icons are generated again.
+    for scale in SCALES:
+        old_index = read_json(atlas_index(scale))
+        index = {}
+        for section in config.sections():
+            tags = list(config[section])
+            name = atlas_name(section, scale)
+            atlas_filepath = os.path.join(ICONS_DIR, name)
+            if stale.isdisjoint(icon_name(tag, scale) for tag in tags) \
+                    and os.path.exists(atlas_filepath) \
+                    and all(old_index.get(tag, [None])[0] == name
+                            for tag in tags):
+                index.update((tag, old_index[tag]) for tag in tags)
+            else:
+                print("Generating atlas", atlas_filepath)
+                index.update(make_atlas(tags, atlas_filepath, scale))
+        write_json(index, atlas_index(scale))
@@ -26,24 +26,41 @@ ICONS_DEF = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                          'data', 'icons-def.ini'))
 ICONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                          'data', 'icons'))
+ATLAS_INDEX = os.path.join(ICONS_DIR, 'atlas.json')
 
 
 def check_icons():
-    """ Check that icons are created. """
-    config = configparser.ConfigParser(delimiters=(' ',))
-    config.read(ICONS_DEF)
-    for section in config:
-        for tag, code in config[section].items():
-            png_filepath = os.path.join(ICONS_DIR, tag + '.png')
-            if not os.path.exists(png_filepath):
-                msg = "***** ERROR *****\n" \
-                      + png_filepath + " does not exist.\n" \
-                      + "setup.py will not work until icons are generated.\n" \
-                      + '(run "./generate_icons.py" to solve the problem)\n' \
-                      + "*****************"
-                raise SystemExit(msg)
+    """ Check that icons are created and up to date. """
+    try:
+        import generate_icons
+    except ImportError:
+        # An sdist ships the icons, but not the script which generates them
+        generate_icons = None
+    stale = []
+    if generate_icons is not None:
+        config = configparser.ConfigParser(delimiters=(' ',))
+        config.read(ICONS_DEF)
+        stale = generate_icons.stale_icons(
+            generate_icons.icon_hashes(config),
+            generate_icons.read_json(generate_icons.MANIFEST))
+    if not os.path.exists(ATLAS_INDEX):
+        stale.append(ATLAS_INDEX)
+    if stale:
+        msg = "***** ERROR *****\n" \
+              + "Icons missing or out of date: " + ", ".join(stale[:10]) \
+              + (" and %d more" % (len(stale) - 10) if len(stale) > 10
+                 else "") + "\n" \
+              + "setup.py will not work until icons are generated.\n" \
+              + '(run "./generate_icons.py" to solve the problem)\n' \
+              + "*****************"
+        raise SystemExit(msg)
 
 
+# Icons are packaged by these commands
+if any(command.startswith(('build', 'install', 'sdist', 'bdist'))
+       for command in sys.argv[1:]):
+    check_icons()
+
 setuptools.setup(
     name="visualequation",
     version=commons.VERSION,
@@ -62,7 +79,8 @@ setuptools.setup(
         ('share/applications', ['data/visualequation.desktop']),
         ('share/visualequation', ['data/eq_template.tex',
                                   'data/visualequation.png', ]),
-        ('share/visualequation/icons', glob.glob('data/icons/*.png')),
+        ('share/visualequation/icons', glob.glob('data/icons/*.png')
+         + glob.glob('data/icons/atlas*.json')),
         ('share/locale/es/LC_MESSAGES',
          ['locale/es/LC_MESSAGES/visualequation.mo']),
     ],
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from visualequation import conversions
+from visualequation import metadata
+from visualequation.errors import CommandNotFound, CommandFailed, \
+    CommandTimeout, LatexError
+from visualequation.symbols import utils
+
+TESTS_DIR = os.path.dirname(__file__)
+# Program -> extension of the sample file it is faked with
+OUTPUTS = {'dvipng': 'png', 'dvips': 'eps', 'epstopdf': 'pdf',
+           'dvisvgm': 'svg'}
+
+
+def fake_run(cmd, log_fpath=None, check=True, **kwargs):
+    """ Copy a sample file where the program would write its output. """
+    if cmd[0] == 'exiftool':
+        raise CommandNotFound("Command exiftool was not found.")
+    if cmd[0] == 'epstopdf':
+        out_fpath = cmd[cmd.index('--outfile') + 1]
+    else:
+        out_fpath = cmd[cmd.index('-o') + 1]
+    shutil.copyfile(os.path.join(TESTS_DIR, 'im.' + OUTPUTS[cmd[0]]),
+                    out_fpath)
+
+
+@mock.patch.object(conversions, 'ShowError')
+@mock.patch.object(conversions, 'eq2dvi',
+                   return_value=os.path.join(TESTS_DIR, 'im.dvi'))
+class Eq2FilesTest(unittest.TestCase):
+
+    EQ = [utils.JUXT, 'x', '2']
+    SIZES = {'PNG': 300, 'PDF': 600, 'EPS': 600, 'SVG': 5}
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+        self.dest_dirpath = tempfile.mkdtemp()
+        self.base = os.path.join(self.dest_dirpath, 'eq')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dirpath)
+        shutil.rmtree(self.dest_dirpath)
+
+    def test_export(self, eq2dvi, show_error):
+        with mock.patch.object(conversions.runner, 'run',
+                               side_effect=fake_run):
+            fpaths = conversions.eq2files(self.EQ, self.base, self.SIZES,
+                                          self.temp_dirpath)
+        self.assertEqual(sorted(fpaths),
+                         sorted(self.base + '.' + ext for ext in
+                                ('png', 'pdf', 'eps', 'svg')))
+        self.assertEqual(sorted(os.listdir(self.dest_dirpath)),
+                         ['eq.eps', 'eq.pdf', 'eq.png', 'eq.svg'])
+        eq2dvi.assert_called_once()
+        for ext in ('png', 'eps', 'svg'):
+            self.assertEqual(metadata.read_eq(self.base + '.' + ext),
+                             self.EQ)
+        # Only exiftool, used for PDF, was missing
+        show_error.assert_called_once()
+        self.assertTrue(show_error.call_args[0][0].startswith("PDF: "))
+        self.assertFalse(show_error.call_args[0][1])
+
+    def test_rollback(self, eq2dvi, show_error):
+        # A file which must not be modified
+        with open(self.base + '.png', "w") as fpng:
+            fpng.write("old")
+
+        def failing_run(cmd, log_fpath=None, check=True, **kwargs):
+            if cmd[0] == 'dvisvgm':
+                raise CommandFailed("Command dvisvgm failed.")
+            fake_run(cmd, log_fpath, check, **kwargs)
+
+        with mock.patch.object(conversions.runner, 'run',
+                               side_effect=failing_run):
+            fpaths = conversions.eq2files(self.EQ, self.base, self.SIZES,
+                                          self.temp_dirpath)
+        self.assertEqual(fpaths, [])
+        self.assertEqual(os.listdir(self.dest_dirpath), ['eq.png'])
+        with open(self.base + '.png') as fpng:
+            self.assertEqual(fpng.read(), "old")
+        show_error.assert_called_once()
+        self.assertIn("SVG: Command dvisvgm failed.",
+                      show_error.call_args[0][0])
+
+    def test_nothing(self, eq2dvi, show_error):
+        self.assertEqual(conversions.eq2files(self.EQ, self.base, {},
+                                              self.temp_dirpath), [])
+        eq2dvi.assert_not_called()
+        show_error.assert_not_called()
+
+
+
+LOG = r"""! Undefined control sequence.
+l.16 \frac{a}{\foo
+"""
+
+
+@mock.patch.object(conversions, 'ShowError')
+class Eq2DviTest(unittest.TestCase):
+
+    EQ = [utils.JUXT, 'x', '2']
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dirpath)
+
+    def fake_latex(self, cmd, log_fpath=None, **kwargs):
+        with open(os.path.join(self.temp_dirpath, 've.log'), "w") as flog:
+            flog.write(LOG)
+        raise CommandFailed("latex failed.")
+
+    def test_latex_error(self, show_error):
+        with mock.patch.object(conversions.runner, 'run',
+                               side_effect=self.fake_latex):
+            for interactive in (True, False):
+                with self.assertRaises(LatexError) as context:
+                    conversions.eq2dvi(self.EQ, self.temp_dirpath,
+                                       interactive=interactive)
+                # Numbered from the code of the equation
+                self.assertEqual(context.exception.line, 2)
+                self.assertEqual(context.exception.token, '\\foo')
+        show_error.assert_not_called()
+
+    @mock.patch.object(conversions.runner, 'run',
+                       side_effect=CommandTimeout("latex took too long."))
+    def test_timeout(self, run, show_error):
+        # Other equations can be generated, the program does not exit
+        conversions.eq2dvi(self.EQ, self.temp_dirpath)
+        self.assertFalse(show_error.call_args[0][1])
+        with self.assertRaises(CommandTimeout):
+            conversions.eq2dvi(self.EQ, self.temp_dirpath, interactive=False)
+
+    @mock.patch.object(conversions.runner, 'run',
+                       side_effect=CommandNotFound("latex was not found."))
+    def test_not_found(self, run, show_error):
+        conversions.eq2dvi(self.EQ, self.temp_dirpath)
+        self.assertTrue(show_error.call_args[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,10 +19,9 @@ import unittest
 import tempfile
 import shutil
 import subprocess
-import json
 
 from visualequation import commons
-from visualequation import conversions
+from visualequation import eqcodec
 
 class DependenciesTest(unittest.TestCase):
 
@@ -110,8 +109,7 @@ class DependenciesTest(unittest.TestCase):
                 eq_str = eq_str_b.decode('utf8')
                 if not eq_str:
                     raise SystemExit("No equation inside file %s!" % fpath)
-                json.JSONDecoder(object_hook=conversions.from_json
-                ).decode(eq_str)
+                eqcodec.decode(eq_str)
             except subprocess.CalledProcessError:
                 raise SystemExit("Error by exiftool when trying to extract"
                                  + "equation from file.")
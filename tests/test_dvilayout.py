@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import re
+import struct
+import tempfile
+import unittest
+
+from visualequation import dvilayout
+from visualequation import eqtools
+from visualequation.symbols import utils
+
+# 10pt in scaled points, the DVI unit of TeX
+TEN_PT = 10 * 65536
+
+
+def fix_word(value):
+    return struct.pack('>i', round(value * 2 ** 20))
+
+
+def make_tfm():
+    """ A font with a single character 'A': 0.5 wide, 0.7 high, 0.2 deep."""
+    header = struct.pack('>12H', 16, 2, 65, 65, 2, 2, 2, 1, 0, 0, 0, 0)
+    header += fix_word(0) + fix_word(10)
+    char_info = bytes([1, 0x11, 0, 0])
+    tables = fix_word(0) + fix_word(0.5) + fix_word(0) + fix_word(0.7) \
+             + fix_word(0) + fix_word(0.2) + fix_word(0)
+    return header + char_info + tables
+
+
+def make_dvi():
+    """ 'AA' where the first is block 1, the second block 2 and both 0. """
+    def special(text):
+        return bytes([239, len(text)]) + text
+
+    dvi = bytes([247, 2]) + struct.pack('>III', 25400000, 473628672, 1000) \
+          + bytes([0])
+    dvi += bytes([139]) + bytes(44)
+    dvi += bytes([243, 0]) + struct.pack('>III', 0, TEN_PT, TEN_PT) \
+           + bytes([0, 4]) + b'test'
+    dvi += bytes([171])
+    dvi += special(b've:b 0') + special(b've:b 1') + b'A' \
+           + special(b've:e 1')
+    dvi += special(b've:b 2') + b'A' + special(b've:e 2')
+    # An empty block at the end
+    dvi += special(b've:b 3') + special(b've:e 3') + special(b've:e 0')
+    dvi += bytes([140])
+    return dvi
+
+
+class DviLayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tfm_fpath = os.path.join(self.temp_dir.name, 'test.tfm')
+        with open(self.tfm_fpath, 'wb') as ftfm:
+            ftfm.write(make_tfm())
+        self.dvi_fpath = os.path.join(self.temp_dir.name, 'test.dvi')
+        with open(self.dvi_fpath, 'wb') as fdvi:
+            fdvi.write(make_dvi())
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assertBox(self, box, expected_pt):
+        for dim, expected in zip(box, expected_pt):
+            self.assertAlmostEqual(dim, expected * dvilayout.POINT, places=5)
+
+    def test_read_tfm(self):
+        metrics = dvilayout.read_tfm(make_tfm())
+        self.assertEqual(list(metrics), [65])
+        for dim, expected in zip(metrics[65], (0.5, 0.7, 0.2, 0)):
+            self.assertAlmostEqual(dim, expected, places=5)
+
+    def test_boxes(self):
+        layout = dvilayout.read_layout(self.dvi_fpath,
+                                       lambda name: self.tfm_fpath)
+        self.assertBox(layout.box(0), (0, -7, 10, 2))
+        self.assertBox(layout.box(1), (0, -7, 5, 2))
+        self.assertBox(layout.box(2), (5, -7, 10, 2))
+        self.assertBox(layout.box(3), (10, -dvilayout.EMPTY_HEIGHT, 10,
+                                       dvilayout.EMPTY_DEPTH))
+        self.assertIsNone(layout.box(4))
+        margin = dvilayout.MARGIN
+        self.assertBox(layout.frame, (-margin, -7 - margin, 10 + margin,
+                                      2 + margin))
+
+    def test_block_at(self):
+        boxes = {0: (0, 0, 10, 4), 1: (0, 0, 6, 4), 2: (1, 1, 3, 3),
+                 3: (6, 0, 10, 4), 4: (6, 0, 10, 4)}
+        layout = dvilayout.Layout(boxes, (-1, -1, 11, 5))
+        self.assertEqual(layout.block_at(2, 2), 2)
+        self.assertEqual(layout.block_at(5, 0.5), 1)
+        self.assertEqual(layout.block_at(8, 2), 4)
+        self.assertEqual(layout.block_at(5.9, 2), 1)
+        self.assertIsNone(layout.block_at(11, 2))
+        self.assertIsNone(layout.block_at(2, -0.5))
+
+    def test_invalid(self):
+        with open(self.dvi_fpath, 'wb') as fdvi:
+            fdvi.write(make_dvi()[:-10])
+        with self.assertRaises(ValueError):
+            dvilayout.read_layout(self.dvi_fpath, lambda name: self.tfm_fpath)
+
+    def test_marked_code(self):
+        hat = utils.Op(1, r'\hat{{{0}}}')
+        eq = [utils.JUXT, utils.JUXT, utils.SUP, 'x', '2', hat, 'y', 'z']
+        code = eqtools.eq2latex_code_marked(eq)
+        # Neither the intermediate JUXT, the base nor the accented symbol
+        for index in (0, 2, 4, 5, 7):
+            self.assertIn(eqtools.MARK_START.format(index), code)
+            self.assertIn(eqtools.MARK_END.format(index), code)
+        for index in (1, 3, 6):
+            self.assertNotIn(eqtools.MARK_START.format(index), code)
+        self.assertIn(r'x^{', code)
+        self.assertIn(r'\hat{y}', code)
+
+    def test_marked_script_layout(self):
+        # The script is attached to b, not to the whole base
+        eq = [utils.SUP, utils.JUXT, 'a', 'b', '2']
+        code = eqtools.eq2latex_code_marked(eq)
+        unmarked = re.sub(r'\\special\{ve:[be] \d+\}', '', code)
+        self.assertEqual(unmarked, eqtools.eq2latex_code(eq))
+        self.assertTrue(code.endswith('}' + eqtools.MARK_END.format(3)
+                                      + eqtools.MARK_END.format(0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
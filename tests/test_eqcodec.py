@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import unittest
+
+from visualequation import eqcodec
+from visualequation.symbols import utils
+
+
+class EqCodecTest(unittest.TestCase):
+
+    EQ = [utils.JUXT, utils.SUP, 'x', '2', utils.JUXT,
+          utils.Op(2, r'\frac{{{0}}}{{{1}}}'), r'\alpha', utils.NEWARG,
+          utils.SUP, 'x', '2']
+
+    def test_roundtrip(self):
+        for compress in (False, True):
+            eq_str = eqcodec.encode(self.EQ, compress)
+            self.assertTrue(eqcodec.is_compact(eq_str))
+            self.assertEqual(eqcodec.decode(eq_str), self.EQ)
+
+    def test_interned_ops(self):
+        eq = eqcodec.decode(eqcodec.encode(self.EQ))
+        self.assertIs(eq[0], utils.JUXT)
+        self.assertIs(eq[1], eq[8])
+
+    def test_compression(self):
+        eq = [utils.JUXT, 'a'] * 300 + ['a']
+        self.assertIn(':z:', eqcodec.encode(eq))
+        self.assertIn(':-:', eqcodec.encode(eq, compress=False))
+        self.assertEqual(eqcodec.decode(eqcodec.encode(eq)), eq)
+
+    def test_stream_decoder(self):
+        eq = [utils.JUXT, r'\beta'] * 200 + [r'\beta']
+        eq_str = eqcodec.encode(eq)
+        decoder = eqcodec.StreamDecoder()
+        for i in range(0, len(eq_str), 7):
+            decoder.feed(eq_str[i:i + 7])
+        self.assertEqual(decoder.close(), eq)
+
+    def test_legacy_json(self):
+        eq_str = json.dumps(self.EQ, default=lambda o: o.__dict__)
+        self.assertEqual(eqcodec.decode(eq_str), self.EQ)
+
+    def test_invalid(self):
+        eq_str = eqcodec.encode(self.EQ)
+        for invalid in (eq_str[:-4], 'VEQ9:-:AA==', 'VEQ1:x:AA==', '[]',
+                        '{"n_args": 1}', 'not an equation'):
+            with self.assertRaises(ValueError):
+                eqcodec.decode(invalid)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import sys
+import math
+import time
+import shutil
+import threading
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtSvg import QSvgRenderer
+
+from visualequation import conversions
+from visualequation import eqsel
+from visualequation import engine
+from visualequation import runner
+from visualequation import scratch
+from visualequation.errors import LatexError, CommandFailed
+from visualequation.symbols import utils
+
+TESTS_DIR = os.path.dirname(__file__)
+app = QApplication.instance() or QApplication([])
+
+
+def fake_eq2dvi(eq, directory, fname='ve', latex_template=None,
+                interactive=True):
+    # An empty DVI has no layout, so the ghost is rendered with LaTeX
+    dvi_fpath = os.path.join(directory, fname + '.dvi')
+    open(dvi_fpath, "w").close()
+    return dvi_fpath
+
+
+def fake_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg, frame=None,
+                interactive=True):
+    shutil.copyfile(os.path.join(TESTS_DIR, 'im.png'), png_fpath)
+
+
+def fake_dvisvgm(dvi_fpath, svg_fpath, log_fpath, scale=5,
+                 interactive=True):
+    shutil.copyfile(os.path.join(TESTS_DIR, 'im.svg'), svg_fpath)
+
+
+@mock.patch.object(conversions, 'dvi2png', side_effect=fake_dvipng)
+@mock.patch.object(conversions, 'eq2dvi', side_effect=fake_eq2dvi)
+class SelectionTest(unittest.TestCase):
+
+    EQ = [utils.JUXT, 'x', '2']
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+        self.engine = engine.Engine(scratch.Scratch(
+            base_dir=self.temp_dirpath))
+        self.pixmaps = []
+        self.sel = eqsel.Selection(list(self.EQ), 1, self.engine,
+                                   self.pixmaps.append)
+
+    def tearDown(self):
+        self.sel.close()
+        shutil.rmtree(self.temp_dirpath)
+
+    def wait_for(self, condition, seconds=5):
+        """ Process events until condition() is true. Return it. """
+        deadline = time.monotonic() + seconds
+        while not condition() and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        return condition()
+
+    def png_size(self, factor=1):
+        pixmap = QPixmap(os.path.join(TESTS_DIR, 'im.png'))
+        return (round(pixmap.width() * factor),
+                round(pixmap.height() * factor))
+
+    def svg_size(self, dpi, ratio=1):
+        viewbox = QSvgRenderer(os.path.join(TESTS_DIR, 'im.svg')).viewBoxF()
+        factor = dpi / 72. * ratio
+        return (math.ceil(viewbox.width() * factor),
+                math.ceil(viewbox.height() * factor))
+
+    @mock.patch.object(conversions, 'dvi2svg', side_effect=fake_dvisvgm)
+    def test_vector(self, dvisvgm, eq2dvi, dvipng):
+        self.assertTrue(self.sel.set_vector(True))
+        self.sel.display()
+        pixmap = self.pixmaps[-1]
+        self.assertEqual((pixmap.width(), pixmap.height()),
+                         self.svg_size(self.sel.dpi))
+        renderer = self.sel.svg_renderer
+        # Zooming paints the same SVG again
+        self.sel.dpi = 600
+        self.sel.display()
+        pixmap = self.pixmaps[-1]
+        self.assertEqual((pixmap.width(), pixmap.height()),
+                         self.svg_size(600))
+        self.assertIs(self.sel.svg_renderer, renderer)
+        self.assertEqual(dvisvgm.call_count, 1)
+        dvipng.assert_not_called()
+        # Another equation is loaded
+        self.sel.display(self.EQ + ['y'])
+        self.assertIsNot(self.sel.svg_renderer, renderer)
+        self.assertEqual(dvisvgm.call_count, 2)
+
+    @mock.patch.object(conversions, 'dvi2svg', side_effect=fake_dvisvgm)
+    def test_pixel_ratio(self, dvisvgm, eq2dvi, dvipng):
+        self.sel.set_vector(True)
+        with mock.patch.object(eqsel, 'qApp') as qapp:
+            qapp.devicePixelRatio.return_value = 2
+            self.sel.display()
+        pixmap = self.pixmaps[-1]
+        self.assertEqual(pixmap.devicePixelRatio(), 2)
+        self.assertEqual((pixmap.width(), pixmap.height()),
+                         self.svg_size(self.sel.dpi, 2))
+
+    @mock.patch.object(eqsel, 'ShowError')
+    @mock.patch.object(conversions, 'dvi2svg')
+    def test_vector_fallback(self, dvisvgm, show_error, eq2dvi, dvipng):
+        # dvisvgm did not write the SVG
+        self.sel.set_vector(True)
+        # The raster image is final, without a refine in background
+        self.sel.dpi = eqsel.PREVIEW_DPI
+        self.sel.display()
+        show_error.assert_called_once()
+        self.assertFalse(self.sel.vector)
+        dvipng.assert_called_once()
+        self.assertFalse(self.pixmaps[-1].isNull())
+
+    def test_layout_error(self, eq2dvi, dvipng):
+        def failing_eq2dvi(eq, *args, **kwargs):
+            # Only the marked code is given as a string
+            if isinstance(eq, str):
+                raise LatexError("Undefined control sequence.")
+            return fake_eq2dvi(eq, *args, **kwargs)
+
+        eq2dvi.side_effect = failing_eq2dvi
+        self.sel.dpi = eqsel.PREVIEW_DPI
+        self.sel.display()
+        self.assertIsNone(self.sel.marked_layout)
+        self.assertFalse(self.pixmaps[-1].isNull())
+        dvipng.assert_called_once()
+
+    def test_next_states(self, eq2dvi, dvipng):
+        eq = [utils.JUXT, 'x', utils.JUXT, 'y', 'z']
+        for index in range(len(eq)):
+            for right in (True, False):
+                if not eqsel.is_valid_index(eq, index)[0]:
+                    continue
+                self.sel.eq = list(eq)
+                self.sel.index, self.sel.right = index, right
+                states = self.sel.next_states()
+                actions = (eqsel.Selection.display_next,
+                           eqsel.Selection.display_prev,
+                           eqsel.Selection.display_surrounding_block)
+                for state, action in zip(states, actions):
+                    sel = eqsel.Selection(list(eq), index, self.engine,
+                                          self.pixmaps.append)
+                    sel.right = right
+                    sel.dpi = eqsel.PREVIEW_DPI
+                    action(sel)
+                    sel.close()
+                    self.assertEqual((sel.index, sel.right), state,
+                                     (index, right, action.__name__))
+
+    def test_prefetch(self, eq2dvi, dvipng):
+        with mock.patch.object(self.engine.prefetcher, 'submit') as submit:
+            self.sel.prefetch()
+        jobs, owner = submit.call_args[0]
+        # Without layout, every state needs its own render
+        self.assertEqual(len(jobs), 3)
+        self.assertIs(owner, self.sel)
+        for job in jobs:
+            job()
+        self.assertEqual(dvipng.call_count, 3)
+
+    def test_refine(self, eq2dvi, dvipng):
+        self.sel.display()
+        # The image at PREVIEW_DPI is scaled while dvipng runs at 300 dpi
+        factor = self.sel.dpi / eqsel.PREVIEW_DPI
+        self.assertEqual(self.pixmaps[-1].size().width(),
+                         self.png_size(factor)[0])
+        self.assertTrue(self.wait_for(lambda: len(self.pixmaps) == 2))
+        pixmap = self.pixmaps[-1]
+        self.assertEqual((pixmap.width(), pixmap.height()), self.png_size())
+        self.assertEqual([call[0][3] for call in dvipng.call_args_list],
+                         [eqsel.PREVIEW_DPI, self.sel.dpi])
+
+    def test_refine_error(self, eq2dvi, dvipng):
+        def failing_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg,
+                           frame=None, interactive=True):
+            if not interactive and dpi == self.sel.dpi:
+                raise CommandFailed("Command dvipng failed.")
+            fake_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg, frame,
+                        interactive)
+
+        dvipng.side_effect = failing_dvipng
+        self.sel.display()
+        # The preview is replaced by the image rendered in the GUI thread,
+        # which would show the error
+        self.assertTrue(self.wait_for(lambda: len(self.pixmaps) == 2))
+        self.assertEqual((self.pixmaps[-1].width(),
+                          self.pixmaps[-1].height()), self.png_size())
+        # Arguments dpi and interactive
+        self.assertEqual(dvipng.call_args[0][3], self.sel.dpi)
+        self.assertTrue(dvipng.call_args[0][6])
+
+    def test_refine_cancelled(self, eq2dvi, dvipng):
+        started = threading.Event()
+        finished = threading.Event()
+
+        def slow_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg,
+                        frame=None, interactive=True):
+            if interactive or dpi != self.sel.dpi:
+                return fake_dvipng(dvi_fpath, png_fpath, log_fpath, dpi,
+                                   bg, frame, interactive)
+            started.set()
+            try:
+                runner.run([sys.executable, "-c",
+                            "import time; time.sleep(30)"])
+            finally:
+                finished.set()
+
+        dvipng.side_effect = slow_dvipng
+        self.sel.display()
+        self.assertTrue(started.wait(5))
+        start = time.monotonic()
+        # Other display makes the refine stale
+        self.sel.display(self.EQ + ['y'])
+        self.assertTrue(finished.wait(5))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_refine_kept(self, eq2dvi, dvipng):
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocked_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg,
+                           frame=None, interactive=True):
+            if not interactive and dpi == self.sel.dpi:
+                started.set()
+                release.wait(5)
+            fake_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg, frame,
+                        interactive)
+
+        dvipng.side_effect = blocked_dvipng
+        self.sel.display()
+        self.assertTrue(started.wait(5))
+        generation = self.sel.generation
+        # Displaying the same version again does not restart the refine
+        self.sel.display()
+        self.assertEqual(self.sel.generation, generation)
+        release.set()
+        self.assertTrue(self.wait_for(lambda: self.sel.refining is None))
+        self.assertEqual(self.pixmaps[-1].size().width(), self.png_size()[0])
+        self.assertEqual([call[0][3] for call in dvipng.call_args_list],
+                         [eqsel.PREVIEW_DPI, self.sel.dpi])
+
+    def test_outputs_not_blocked(self, eq2dvi, dvipng):
+        # The GUI gets other outputs of the version while it is refined
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocked_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg,
+                           frame=None, interactive=True):
+            if dpi == 600:
+                started.set()
+                release.wait(5)
+            fake_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg, frame,
+                        interactive)
+
+        dvipng.side_effect = blocked_dvipng
+        cache = self.engine.cache
+        thread = threading.Thread(target=cache.png, args=(self.EQ, 600))
+        thread.start()
+        try:
+            self.assertTrue(started.wait(5))
+            start = time.monotonic()
+            cache.png(self.EQ, eqsel.PREVIEW_DPI)
+            cache.layout(self.EQ)
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertFalse(cache.has(self.EQ, ('png', 600, None, None)))
+        finally:
+            release.set()
+            thread.join()
+        self.assertTrue(cache.has(self.EQ, ('png', 600, None, None)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+import configparser
+from unittest import mock
+
+import numpy as np
+
+import generate_icons
+
+IM_PNG = os.path.join(os.path.dirname(__file__), 'im.png')
+
+
+def fake_latex(cmd):
+    with open(cmd[-1]) as flatex:
+        n_pages = flatex.read().count(r'\newpage') + 1
+    output_dir = cmd[-2][len("-output-directory="):]
+    with open(os.path.join(output_dir, 've.dvi'), 'w') as fdvi:
+        fdvi.write(str(n_pages))
+
+
+def fake_dvipng(cmd, stdout):
+    with open(cmd[-1]) as fdvi:
+        n_pages = int(fdvi.read())
+    for page in range(1, n_pages + 1):
+        shutil.copy(IM_PNG, cmd[-2].replace('%d', str(page)))
+
+
+class GenerateIconsTest(unittest.TestCase):
+
+    @mock.patch.object(generate_icons, 'postprocess')
+    @mock.patch.object(generate_icons.subprocess, 'call',
+                       side_effect=fake_dvipng)
+    @mock.patch.object(generate_icons.subprocess, 'check_output',
+                       side_effect=fake_latex)
+    def test_batch(self, latex, dvipng, postprocess):
+        with tempfile.TemporaryDirectory() as output_dir:
+            batch = [(code, os.path.join(output_dir, str(i) + '.png'))
+                     for i, code in enumerate(['a', r'\alpha', r'\sum'])]
+            self.assertEqual(generate_icons.batch2icons(batch), 3)
+            self.assertEqual(latex.call_count, 1)
+            self.assertEqual(dvipng.call_count, 1)
+            self.assertEqual(postprocess.call_count, 3)
+            for code, file_output in batch:
+                self.assertTrue(os.path.exists(file_output))
+
+    def test_png_size(self):
+        width, height = generate_icons.png_size(IM_PNG)
+        self.assertGreater(width, 0)
+        self.assertGreater(height, 0)
+
+    def test_pack(self):
+        sizes = [(30, 10), (50, 20), (40, 15), (10, 5)]
+        positions, (width, height) = generate_icons.pack(sizes, 100, 1)
+        self.assertLessEqual(width, 100)
+        boxes = [(x, y, x + w, y + h)
+                 for (x, y), (w, h) in zip(positions, sizes)]
+        for box in boxes:
+            self.assertGreaterEqual(box[0], 0)
+            self.assertLessEqual(box[2], width)
+            self.assertLessEqual(box[3], height)
+        for i, box1 in enumerate(boxes):
+            for box2 in boxes[i + 1:]:
+                self.assertTrue(box1[2] <= box2[0] or box2[2] <= box1[0]
+                                or box1[3] <= box2[1] or box2[3] <= box1[1])
+        # The tallest goes first
+        self.assertEqual(positions[1], (0, 0))
+
+    def test_manifest(self):
+        config = configparser.ConfigParser(delimiters=(' ',))
+        config.read_string("[GREEK]\nalpha \\alpha\nbeta \\beta\n")
+        hashes = generate_icons.icon_hashes(config)
+        self.assertEqual(sorted(hashes),
+                         ['alpha', 'alpha@2x', 'beta', 'beta@2x'])
+        self.assertNotEqual(hashes['alpha'], hashes['beta'])
+        self.assertNotEqual(hashes['alpha'], hashes['alpha@2x'])
+        self.assertNotEqual(generate_icons.icon_hash('a', 'T', 200),
+                            generate_icons.icon_hash('a', 'T', 300))
+        self.assertNotEqual(generate_icons.icon_hash('a', 'T', 200, 5),
+                            generate_icons.icon_hash('a', 'T', 200, 10))
+        old_hash = generate_icons.icon_hash('a', 'T')
+        with mock.patch.object(generate_icons, 'POSTPROCESS', 1):
+            self.assertNotEqual(generate_icons.icon_hash('a', 'T'), old_hash)
+        with tempfile.TemporaryDirectory() as icons_dir, \
+                mock.patch.object(generate_icons, 'ICONS_DIR', icons_dir):
+            for fname in [name + '.png' for name in hashes] \
+                    + ['gamma.png', 'atlas-greek.png', 'atlas-greek@2x.png',
+                       'atlas-old.png']:
+                shutil.copy(IM_PNG, os.path.join(icons_dir, fname))
+            manifest = dict(hashes, beta='other')
+            self.assertEqual(generate_icons.stale_icons(hashes, manifest),
+                             ['beta'])
+            os.remove(os.path.join(icons_dir, 'alpha@2x.png'))
+            self.assertEqual(sorted(generate_icons.stale_icons(hashes,
+                                                               manifest)),
+                             ['alpha@2x', 'beta'])
+            orphans = generate_icons.orphan_files(config)
+            self.assertEqual(sorted(map(os.path.basename, orphans)),
+                             ['atlas-old.png', 'gamma.png'])
+
+    def test_read_png(self):
+        image = generate_icons.read_png(IM_PNG)
+        self.assertEqual(image.shape[1::-1] + (4,),
+                         generate_icons.png_size(IM_PNG) + (4,))
+        # A palette with a transparent background
+        self.assertEqual(image[0, 0, 3], 0)
+        self.assertEqual(image[..., 3].max(), 255)
+        # Odd width, so rows of other formats would be padded
+        rgba = np.arange(5 * 7 * 4, dtype=np.uint8).reshape(5, 7, 4)
+        rgba[..., 3] = 255
+        with tempfile.TemporaryDirectory() as temp_dir:
+            png_file = os.path.join(temp_dir, 'image.png')
+            generate_icons.write_png(rgba, png_file)
+            self.assertEqual(generate_icons.png_size(png_file), (7, 5))
+            self.assertTrue((generate_icons.read_png(png_file)
+                             == rgba).all())
+            with self.assertRaises(ValueError):
+                generate_icons.read_png(os.path.join(temp_dir, 'none.png'))
+
+    def test_trim(self):
+        image = np.zeros((4, 12, 4), np.uint8)
+        image[:, 1, 3] = 255
+        image[1:3, 8:10] = 200
+        trimmed = generate_icons.trim(image, 5)
+        self.assertEqual(trimmed.shape, (4, 2, 4))
+        self.assertTrue((trimmed[1:3] == 200).all())
+
+    def test_postprocess(self):
+        image = np.zeros((6, 20, 4), np.uint8)
+        image[:, :3] = 255
+        image[2:4, 12:15] = 255
+        with tempfile.TemporaryDirectory() as temp_dir:
+            png_file = os.path.join(temp_dir, 'icon.png')
+            generate_icons.write_png(image, png_file)
+            generate_icons.postprocess(png_file, 5)
+            # The height is kept
+            self.assertEqual(generate_icons.png_size(png_file), (3, 6))
+
+
+if __name__ == "__main__":
+    unittest.main()
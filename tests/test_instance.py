@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import time
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtWidgets import QApplication
+
+from visualequation import instance
+
+app = QApplication.instance() or QApplication([])
+
+
+@unittest.skipIf(instance.QLocalServer is None, "QtNetwork is not installed")
+class InstanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+        # A path, so the tests do not use the socket of a running program
+        self.name = os.path.join(self.temp_dirpath, 've.sock')
+        self.messages = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dirpath)
+
+    def server(self):
+        server = instance.Server(self.name)
+        server.received.connect(self.messages.append)
+        self.addCleanup(lambda: server.server.close())
+        return server
+
+    def send(self, message):
+        """
+        Send message from another thread, since send() blocks, while the
+        events of the server are processed. Return what send() returned.
+        """
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(instance.send(message, self.name)))
+        thread.start()
+        deadline = time.time() + 10
+        while thread.is_alive() and time.time() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        thread.join()
+        app.processEvents()
+        return result[0]
+
+    def test_round_trip(self):
+        self.assertTrue(self.server().listen())
+        message = {'files': ['a.png', 'b.png']}
+        self.assertTrue(self.send(message))
+        self.assertTrue(self.send({}))
+        self.assertEqual(self.messages, [message, {}])
+
+    def test_no_server(self):
+        self.assertFalse(instance.send({}, self.name))
+
+    def test_running(self):
+        self.assertTrue(self.server().listen())
+        # A second instance does not take the socket of the first one
+        server2 = instance.Server(self.name)
+        self.assertFalse(server2.listen())
+        self.assertTrue(self.send({'files': []}))
+        self.assertEqual(self.messages, [{'files': []}])
+
+    def test_stale(self):
+        # The socket of an instance which did not finish properly
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(self.name)
+        stale.close()
+        self.assertTrue(self.server().listen())
+        self.assertTrue(self.send({}))
+        self.assertEqual(self.messages, [{}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import time
+import shutil
+import gettext
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+gettext.install('visualequation')
+from PyQt5.QtWidgets import QApplication, QDialogButtonBox
+
+from visualequation import conversions
+from visualequation import engine
+from visualequation import latexdialogs
+from visualequation import runner
+from visualequation import scratch
+from visualequation.errors import LatexError
+
+TESTS_DIR = os.path.dirname(__file__)
+app = QApplication.instance() or QApplication([])
+
+
+class EditLatexDialogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+        self.engine = engine.Engine(scratch.Scratch(
+            base_dir=self.temp_dirpath))
+        # Codes compiled and codes whose compilation finished
+        self.compiled = []
+        self.finished = []
+        patchers = [
+            mock.patch.object(conversions, 'eq2dvi',
+                              side_effect=self.fake_eq2dvi),
+            mock.patch.object(conversions, 'dvi2png',
+                              side_effect=self.fake_dvipng)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.dialog = latexdialogs.EditLatexDialog('x', self.engine)
+
+    def tearDown(self):
+        self.dialog.done(0)
+        shutil.rmtree(self.temp_dirpath)
+
+    def fake_eq2dvi(self, code, directory, fname='ve', latex_template=None,
+                    interactive=True):
+        self.compiled.append(code)
+        try:
+            if code == 'slow':
+                runner.run(['sleep', '10'])
+            if code == 'bad':
+                raise LatexError("Undefined control sequence.", 1, '\\bad')
+            dvi_fpath = os.path.join(directory, fname + '.dvi')
+            open(dvi_fpath, "w").close()
+            return dvi_fpath
+        finally:
+            self.finished.append(code)
+
+    def fake_dvipng(self, dvi_fpath, png_fpath, log_fpath, dpi, bg,
+                    frame=None, interactive=True):
+        shutil.copyfile(os.path.join(TESTS_DIR, 'im.png'), png_fpath)
+
+    def wait_for(self, condition, seconds=5):
+        """ Process events until condition() is true. Return it. """
+        deadline = time.monotonic() + seconds
+        while not condition() and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        return condition()
+
+    def message(self):
+        return self.dialog.compilationmsg.text()
+
+    def ok_enabled(self):
+        return self.dialog.buttons.button(QDialogButtonBox.Ok).isEnabled()
+
+    def test_debounce(self):
+        for code in ('a', 'ab', 'abc'):
+            self.dialog.text.setPlainText(code)
+        # Nothing is compiled while the user is typing
+        self.assertEqual(self.compiled, ['x'])
+        self.assertTrue(self.wait_for(self.ok_enabled))
+        self.assertEqual(self.compiled, ['x', 'abc'])
+        self.assertEqual(self.message(), 'LaTex code is valid')
+
+    def test_cache(self):
+        self.dialog.text.setPlainText('bad\n')
+        self.dialog.handlecheck()
+        self.assertTrue(self.wait_for(
+            lambda: 'not valid' in self.message()))
+        self.assertIn("Undefined control sequence.", self.message())
+        self.dialog.text.setPlainText('y')
+        self.dialog.handlecheck()
+        self.assertTrue(self.wait_for(self.ok_enabled))
+        # Going back to previous versions does not compile them again
+        self.dialog.text.setPlainText('bad')
+        self.dialog.handlecheck()
+        self.assertIn("Undefined control sequence.", self.message())
+        self.dialog.text.setPlainText('y')
+        self.dialog.handlecheck()
+        self.assertTrue(self.ok_enabled())
+        self.assertEqual(self.compiled, ['x', 'bad', 'y'])
+
+    def test_generation(self):
+        generation = self.dialog.generation
+        self.dialog.text.setPlainText('y')
+        # A result of the previous version is not displayed
+        self.dialog.on_checked(generation, 'x', '')
+        self.assertFalse(self.ok_enabled())
+        self.assertEqual(self.message(), 'Change LaTeX code as desired')
+
+    def test_cancel(self):
+        self.dialog.text.setPlainText('slow')
+        self.dialog.handlecheck()
+        self.assertTrue(self.wait_for(lambda: 'slow' in self.compiled))
+        start = time.monotonic()
+        self.dialog.text.setPlainText('y')
+        # LaTeX of the stale version is killed, not let finish
+        self.assertTrue(self.wait_for(lambda: 'slow' in self.finished))
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIsNone(self.engine.cache.error('slow'))
+        self.assertTrue(self.wait_for(self.ok_enabled))
+        self.assertEqual(self.compiled, ['x', 'slow', 'y'])
+        self.assertEqual(self.message(), 'LaTex code is valid')
+
+
+if __name__ == '__main__':
+    unittest.main()
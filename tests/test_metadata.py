@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from visualequation import eqcodec
+from visualequation import metadata
+from visualequation.symbols import utils
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+class MetadataTest(unittest.TestCase):
+
+    EQ = [utils.JUXT, utils.SUP, 'x', '2', r'\alpha'] * 100 + ['y']
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dirpath)
+
+    def copy(self, fname):
+        fpath = os.path.join(self.temp_dirpath, fname)
+        shutil.copy(os.path.join(TESTS_DIR, fname), fpath)
+        return fpath
+
+    def test_legacy_png_pdf(self):
+        for fname in ('im.png', 'im.pdf'):
+            eq = metadata.read_eq(os.path.join(TESTS_DIR, fname))
+            self.assertTrue(eq)
+
+    def test_png(self):
+        png_fpath = self.copy('im.png')
+        metadata.add_to_png(png_fpath, eqcodec.encode(self.EQ))
+        # The new chunk is found before the one written by exiftool
+        self.assertEqual(metadata.read_eq(png_fpath), self.EQ)
+
+    def test_svg(self):
+        svg_fpath = self.copy('im.svg')
+        self.assertIsNone(metadata.read_eq(svg_fpath))
+        metadata.add_to_svg(svg_fpath, eqcodec.encode(self.EQ))
+        self.assertEqual(metadata.read_eq(svg_fpath), self.EQ)
+
+    def test_eps(self):
+        eps_fpath = self.copy('im.eps')
+        self.assertIsNone(metadata.read_eq(eps_fpath))
+        eq_str = eqcodec.encode(self.EQ, compress=False)
+        metadata.add_to_eps(eps_fpath, eq_str)
+        with open(eps_fpath, "rb") as feps:
+            for line in feps:
+                self.assertLessEqual(len(line.rstrip()),
+                                     metadata.EPS_MAX_LINE)
+                if line.startswith(b'%%EndComments'):
+                    break
+        self.assertEqual(metadata.read_eq(eps_fpath), self.EQ)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+import time
+import threading
+import unittest
+from unittest import mock
+
+from visualequation import prefetch
+from visualequation import runner
+from visualequation.errors import ConversionError, CommandCancelled, \
+    CommandTimeout, CommandFailed
+
+
+class PrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prefetcher = prefetch.Prefetcher()
+        self.done = []
+
+    def job(self, name, event=None):
+        def run():
+            if event is not None:
+                event.wait(5)
+            self.done.append(name)
+        return run
+
+    def test_jobs_in_order(self):
+        finished = threading.Event()
+        self.prefetcher.submit([self.job(1), self.job(2), finished.set])
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(self.done, [1, 2])
+
+    def test_errors_ignored(self):
+        def fail():
+            raise ConversionError("latex failed")
+        finished = threading.Event()
+        self.prefetcher.submit([fail, self.job(1), finished.set])
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(self.done, [1])
+
+    def test_retry(self):
+        calls = []
+
+        def slow():
+            calls.append('slow')
+            if calls.count('slow') == 2:
+                retried.set()
+            raise CommandTimeout("Command latex took too long.")
+
+        def wrong():
+            calls.append('wrong')
+            raise CommandFailed("Command latex failed.")
+
+        retried = threading.Event()
+        finished = threading.Event()
+        self.prefetcher.submit([slow, wrong, self.job(1)])
+        self.assertTrue(retried.wait(5))
+        self.prefetcher.submit([finished.set], object())
+        self.assertTrue(finished.wait(5))
+        # Retried once, after the pending jobs
+        self.assertEqual(calls, ['slow', 'wrong', 'slow'])
+        self.assertEqual(self.done, [1])
+
+    @mock.patch.object(prefetch.traceback, 'print_exc')
+    def test_bugs_ignored(self, print_exc):
+        def fail():
+            raise KeyError("bug")
+        finished = threading.Event()
+        self.prefetcher.submit([fail])
+        self.prefetcher.submit([fail, self.job(1), finished.set], object())
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(self.done, [1])
+        # The worker is still running
+        finished.clear()
+        self.prefetcher.submit([self.job(2), finished.set])
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(self.done, [1, 2])
+        self.assertEqual(print_exc.call_count, 2)
+
+    def test_submit_replaces_pending(self):
+        release = threading.Event()
+        finished = threading.Event()
+        self.prefetcher.submit([self.job('running', release), self.job(1)])
+        self.prefetcher.submit([self.job(2), finished.set])
+        release.set()
+        self.assertTrue(finished.wait(5))
+        # Only the programs of the job running are killed, it ends
+        self.assertNotIn(1, self.done)
+        self.assertEqual(self.done[-1], 2)
+
+    def test_cancel(self):
+        release = threading.Event()
+        self.prefetcher.submit([self.job('running', release), self.job(1)])
+        self.prefetcher.cancel()
+        self.assertEqual(self.prefetcher.pending(), 0)
+        release.set()
+
+    def test_kill_running(self):
+        for cancel in (self.prefetcher.cancel,
+                       lambda: self.prefetcher.submit([])):
+            started = threading.Event()
+            finished = threading.Event()
+            errors = []
+
+            def slow():
+                started.set()
+                try:
+                    runner.run([sys.executable, "-c",
+                                "import time; time.sleep(30)"])
+                except CommandCancelled as error:
+                    errors.append(error)
+                finally:
+                    finished.set()
+
+            self.prefetcher.submit([slow])
+            self.assertTrue(started.wait(5))
+            start = time.monotonic()
+            # The user is waiting for the worker
+            cancel()
+            self.assertTrue(finished.wait(5))
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual(len(errors), 1)
+
+    def test_owners(self):
+        started = threading.Event()
+        release = threading.Event()
+        finished = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        self.prefetcher.submit([block])
+        self.assertTrue(started.wait(5))
+        owner_a, owner_b = object(), object()
+        self.prefetcher.submit([self.job('a')], owner_a)
+        self.prefetcher.submit([self.job('b')], owner_b)
+        # Other owners keep their jobs
+        self.prefetcher.cancel(owner_a)
+        self.prefetcher.submit([finished.set])
+        self.assertEqual(self.prefetcher.pending(), 2)
+        release.set()
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(self.done, ['b'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from visualequation import commons
+from visualequation import conversions
+from visualequation import rendercache
+from visualequation import metadata
+from visualequation.errors import LatexError
+from visualequation.symbols import utils
+
+
+def fake_latex(latex_fpath, output_dir, first_line=1):
+    dvi_fpath = os.path.splitext(latex_fpath)[0] + '.dvi'
+    open(dvi_fpath, "w").close()
+
+
+def fake_dvipng(dvi_fpath, png_fpath, log_fpath, dpi, bg, frame=None,
+                interactive=True):
+    shutil.copyfile(os.path.join(os.path.dirname(__file__), 'im.png'),
+                    png_fpath)
+
+
+@mock.patch.object(conversions, 'dvi2png', side_effect=fake_dvipng)
+@mock.patch.object(conversions, 'latex_file2dvi', side_effect=fake_latex)
+class RenderCacheTest(unittest.TestCase):
+
+    EQ = [utils.JUXT, 'x', utils.REDIT, '2']
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+        self.cache = rendercache.RenderCache(self.temp_dirpath, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dirpath)
+
+    def test_zoom_sweep(self, latex, dvipng):
+        for dpi in list(range(100, 1001, 50)) + list(range(1000, 99, -50)):
+            self.assertTrue(os.path.exists(self.cache.png(self.EQ, dpi)))
+        self.assertEqual(latex.call_count, 1)
+        self.assertEqual(dvipng.call_count, len(range(100, 1001, 50)))
+
+    def test_eviction(self, latex, dvipng):
+        png_fpath = self.cache.png(['a'], 300)
+        self.cache.png(['b'], 300)
+        self.cache.png(['a'], 300)
+        self.cache.png(['c'], 300)
+        self.assertTrue(os.path.exists(png_fpath))
+        self.assertFalse(self.cache.has(['b']))
+        self.assertEqual(latex.call_count, 3)
+
+    def test_tagged_png(self, latex, dvipng):
+        for ignored in range(3):
+            png_fpath = self.cache.tagged_png(self.EQ, 300)
+        self.assertEqual(metadata.read_eq(png_fpath), self.EQ)
+        self.assertEqual(dvipng.call_count, 1)
+        self.cache.png(['a'], 300)
+        self.cache.png(['b'], 300)
+        self.assertFalse(os.path.exists(png_fpath))
+
+    def test_tagged_png_trees(self, latex, dvipng):
+        # Same LaTeX code, different equations
+        other_eq = ['x 2']
+        self.assertEqual(rendercache.eq2key([utils.JUXT, 'x', '2']),
+                         rendercache.eq2key(other_eq))
+        png_fpath = self.cache.tagged_png([utils.JUXT, 'x', '2'], 300)
+        other_fpath = self.cache.tagged_png(other_eq, 300)
+        self.assertNotEqual(png_fpath, other_fpath)
+        self.assertEqual(metadata.read_eq(png_fpath), [utils.JUXT, 'x', '2'])
+        self.assertEqual(metadata.read_eq(other_fpath), other_eq)
+        self.assertEqual(latex.call_count, 1)
+
+    def test_threads(self, latex, dvipng):
+        threads = [threading.Thread(target=self.cache.png,
+                                    args=(self.EQ, 300))
+                   for ignored in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(latex.call_count, 1)
+        self.assertEqual(dvipng.call_count, 1)
+
+    def test_svg(self, latex, dvipng):
+        def fake_dvisvgm(dvi_fpath, svg_fpath, log_fpath, scale=5,
+                         interactive=True):
+            shutil.copyfile(os.path.join(os.path.dirname(__file__),
+                                         'im.svg'), svg_fpath)
+
+        with mock.patch.object(conversions, 'dvi2svg',
+                               side_effect=fake_dvisvgm) as dvisvgm:
+            svg_fpath = self.cache.svg(self.EQ)
+            self.assertEqual(self.cache.svg(self.EQ), svg_fpath)
+            self.assertNotEqual(self.cache.svg(self.EQ, 2), svg_fpath)
+            self.assertEqual(dvisvgm.call_count, 2)
+        self.assertTrue(os.path.exists(svg_fpath))
+        self.assertEqual(latex.call_count, 1)
+        with mock.patch.object(conversions, 'dvi2svg') as dvisvgm:
+            # dvisvgm did not write it, it is tried again next time
+            self.assertIsNone(self.cache.svg(['a']))
+            self.assertIsNone(self.cache.svg(['a']))
+            self.assertEqual(dvisvgm.call_count, 2)
+
+    def test_errors(self, latex, dvipng):
+        error = LatexError("Undefined control sequence.", 1, '\\foo')
+        with mock.patch.object(conversions, 'eq2dvi',
+                               side_effect=error) as eq2dvi:
+            for ignored in range(3):
+                with self.assertRaises(LatexError) as context:
+                    self.cache.png('\\foo', 300, interactive=False)
+                self.assertIs(context.exception, error)
+        self.assertEqual(eq2dvi.call_count, 1)
+        self.assertIs(self.cache.error('\\foo'), error)
+        self.assertIsNone(self.cache.error(self.EQ))
+        self.assertEqual(self.cache.files(), [])
+
+    def test_shown_errors(self, latex, dvipng):
+        # dvipng failed, the error was shown
+        dvipng.side_effect = None
+        png_fpath = self.cache.png(self.EQ, 300)
+        self.assertFalse(os.path.exists(png_fpath))
+        self.assertFalse(self.cache.has(self.EQ, ('png', 300, None, None)))
+        self.assertEqual(self.cache.files(), [self.cache.dvi(self.EQ)])
+        # It is tried again
+        dvipng.side_effect = fake_dvipng
+        self.assertEqual(self.cache.png(self.EQ, 300), png_fpath)
+        self.assertTrue(os.path.exists(png_fpath))
+        self.assertEqual(dvipng.call_count, 2)
+
+    def test_latex_killed(self, latex, dvipng):
+        # latex was killed, the error was shown
+        latex.side_effect = None
+        self.assertFalse(os.path.exists(self.cache.png(self.EQ, 300)))
+        self.assertIsNone(self.cache.svg(self.EQ))
+        self.assertFalse(self.cache.has(self.EQ))
+        self.assertIsNone(self.cache.error(self.EQ))
+        dvipng.assert_not_called()
+
+    def test_interactive_errors(self, latex, dvipng):
+        error = LatexError("Undefined control sequence.", 1, '\\foo')
+        with mock.patch.object(conversions, 'eq2dvi',
+                               side_effect=error) as eq2dvi, \
+                mock.patch.object(conversions,
+                                  'show_latex_error') as show_error:
+            # Shown every time without exiting, compiled once
+            for ignored in range(2):
+                png_fpath = self.cache.png('\\foo', 300)
+                self.assertFalse(os.path.exists(png_fpath))
+            self.assertEqual(show_error.call_count, 2)
+            self.assertIs(show_error.call_args[0][0], error)
+            with self.assertRaises(LatexError):
+                self.cache.png('\\foo', 300, interactive=False)
+        self.assertEqual(eq2dvi.call_count, 1)
+        dvipng.assert_not_called()
+
+    def test_layout_errors(self, latex, dvipng):
+        error = LatexError("Undefined control sequence.")
+        with mock.patch.object(conversions, 'eq2dvi',
+                               side_effect=error) as eq2dvi:
+            self.assertIsNone(self.cache.layout('\\foo'))
+            self.assertIsNone(self.cache.layout('\\foo'))
+        eq2dvi.assert_called_once()
+        # Never interactive, it would exit the program
+        self.assertFalse(eq2dvi.call_args[0][4])
+
+
+LOG = r"""This is pdfTeX, Version 3.14159265-2.6-1.40.20 (TeX Live 2019)
+(./ve.tex
+LaTeX2e <2018-12-01>
+! Undefined control sequence.
+l.16 \frac{a}{\foo
+                  {b}
+The control sequence at the end of the top line
+of your error message was never \def'ed.
+No pages of output.
+"""
+
+
+class LatexErrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+        self.log_fpath = os.path.join(self.temp_dirpath, 've.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dirpath)
+
+    def write_log(self, log):
+        with open(self.log_fpath, "w") as flog:
+            flog.write(log)
+
+    def test_log(self):
+        self.write_log(LOG)
+        error = conversions.latex_error(self.log_fpath, 15)
+        self.assertEqual(error.message, "Undefined control sequence.")
+        self.assertEqual(error.line, 2)
+        self.assertEqual(error.token, '\\foo')
+        self.assertEqual(str(error),
+                         "Line 2: Undefined control sequence. (\\foo)")
+
+    def test_template(self):
+        self.write_log("! LaTeX Error: File `esint.sty' not found.\n\n"
+                       "l.10 \\usepackage\n")
+        error = conversions.latex_error(self.log_fpath, 15)
+        self.assertIsNone(error.line)
+        self.assertEqual(error.token, '\\usepackage')
+        self.assertIsInstance(conversions.latex_error(
+            os.path.join(self.temp_dirpath, 'none.log')), LatexError)
+
+    def test_first_line(self):
+        self.assertEqual(conversions.code_first_line(
+            commons.LATEX_TEMPLATE), 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from visualequation import runner
+from visualequation.errors import CommandNotFound, CommandFailed, \
+    CommandTimeout, CommandKilled, CommandCancelled
+
+
+class RunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dirpath = tempfile.mkdtemp()
+        self.log_fpath = os.path.join(self.temp_dirpath, 'run.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dirpath)
+
+    def python(self, code):
+        return [sys.executable, "-c", code]
+
+    def test_output(self):
+        self.assertEqual(runner.run(self.python("print('ok')")), b'ok\n')
+        self.assertIsNone(runner.run(
+            self.python("import sys; sys.stderr.write('ok')"),
+            self.log_fpath))
+        with open(self.log_fpath) as flog:
+            self.assertEqual(flog.read(), 'ok')
+
+    def test_errors(self):
+        with self.assertRaises(CommandNotFound):
+            runner.run(["visualequation-none"])
+        with self.assertRaises(CommandFailed):
+            runner.run(self.python("raise SystemExit(1)"))
+        runner.run(self.python("raise SystemExit(1)"), check=False)
+
+    @unittest.skipUnless(os.name == 'posix', "process groups are POSIX")
+    def test_timeout(self):
+        # The child of the program must be killed too
+        pid_fpath = os.path.join(self.temp_dirpath, 'pid')
+        code = "import subprocess, sys, time\n" \
+               "child = subprocess.Popen([sys.executable, '-c', " \
+               "'import time; time.sleep(30)'])\n" \
+               "open(%r, 'w').write(str(child.pid))\n" \
+               "time.sleep(30)" % pid_fpath
+        start = time.monotonic()
+        with self.assertRaises(CommandTimeout) as context:
+            runner.run(self.python(code), timeout=1)
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertTrue(context.exception.retry)
+        with open(pid_fpath) as fpid:
+            pid = int(fpid.read())
+        for ignored in range(50):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail("child of the program was not killed")
+
+    def test_cancel(self):
+        event = threading.Event()
+        threading.Timer(0.2, event.set).start()
+        start = time.monotonic()
+        with runner.cancelled_by(event):
+            with self.assertRaises(CommandCancelled):
+                runner.run(self.python("import time; time.sleep(30)"))
+            # Nothing is started once it is set
+            with self.assertRaises(CommandCancelled):
+                runner.run(self.python("pass"))
+        self.assertLess(time.monotonic() - start, 10)
+        # Only inside the with statement
+        runner.run(self.python("pass"))
+
+    @unittest.skipIf(runner.resource is None, "resource is not available")
+    def test_limits(self):
+        with self.assertRaises(CommandKilled) as context:
+            runner.run(self.python("while True: pass"), cpu=1, timeout=20)
+        self.assertFalse(context.exception.retry)
+        with self.assertRaises(CommandFailed):
+            runner.run(self.python("data = bytearray(512 * 1024 ** 2)"),
+                       memory=256 * 1024 ** 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
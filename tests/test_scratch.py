@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from visualequation import scratch
+
+
+class ScratchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dirpath = tempfile.mkdtemp()
+        self.scratch = scratch.Scratch(quota=3000,
+                                       base_dir=self.base_dirpath)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dirpath)
+
+    def write(self, fname, size, age):
+        fpath = os.path.join(self.scratch.path, fname)
+        with open(fpath, "wb") as ffile:
+            ffile.write(bytes(size))
+        last_use = time.time() - age
+        os.utime(fpath, (last_use, last_use))
+        return fpath
+
+    def test_collect(self):
+        oldest = self.write('oldest.png', 1000, 300)
+        pinned = self.write('pinned.dvi', 1000, 200)
+        old = self.write('old.log', 1000, 100)
+        recent = self.write('recent.aux', 1000, 0)
+        self.scratch.add_pins(lambda: [pinned])
+        self.assertEqual(self.scratch.usage(), 4000)
+        self.assertEqual(self.scratch.collect(), 1000)
+        self.assertFalse(os.path.exists(oldest))
+        for fpath in (pinned, old, recent):
+            self.assertTrue(os.path.exists(fpath))
+        self.assertEqual(self.scratch.collect(), 0)
+
+    def test_grace(self):
+        fpaths = [self.write(str(i), 1000, 0) for i in range(5)]
+        self.assertEqual(self.scratch.collect(), 0)
+        self.assertTrue(all(os.path.exists(fpath) for fpath in fpaths))
+
+    def test_stale_dirs(self):
+        def make_dir(name, lock, age=0):
+            dirpath = os.path.join(self.base_dirpath, scratch.PREFIX + name)
+            os.mkdir(dirpath)
+            if lock:
+                open(os.path.join(dirpath, scratch.LOCK_FNAME), "w").close()
+            last_use = time.time() - age
+            os.utime(dirpath, (last_use, last_use))
+            return dirpath
+
+        # Process 1 is running, but the lock is not held
+        stale = make_dir('1-abc', True)
+        old_unlocked = make_dir('2-abc', False, 300)
+        # A session which has not created its lock yet
+        starting = make_dir('3-abc', False)
+        running = scratch.Scratch(base_dir=self.base_dirpath)
+        other = scratch.Scratch(base_dir=self.base_dirpath)
+        for dirpath in (stale, old_unlocked):
+            self.assertFalse(os.path.exists(dirpath))
+        for dirpath in (starting, running.path, self.scratch.path):
+            self.assertTrue(os.path.exists(dirpath))
+        self.assertEqual(self.scratch.usage(), 0)
+        running.remove()
+        other.remove()
+        self.assertFalse(os.path.exists(other.path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import unittest
+
+from visualequation import startup
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_report(self):
+        n_phases = len(startup.phases)
+        startup.mark("one")
+        startup.mark("two")
+        self.assertEqual([name for name, ignored in startup.phases[-2:]],
+                         ["one", "two"])
+        self.assertAlmostEqual(sum(seconds for ignored, seconds
+                                   in startup.phases), startup.total())
+        output = io.StringIO()
+        startup.report(output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), n_phases + 3)
+        self.assertTrue(lines[-1].startswith("total"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import time
+import shutil
+import gettext
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+gettext.install('visualequation')
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QPixmap, QColor
+
+from visualequation import commons
+from visualequation import icons
+from visualequation import symbolstab
+from visualequation.symbols import lists
+
+app = QApplication.instance() or QApplication([])
+
+
+class TabWidgetTest(unittest.TestCase):
+
+    def setUp(self):
+        # Blank icons, so the test does not need LaTeX to generate them
+        self.icons_dirpath = tempfile.mkdtemp()
+        for menuitemdata in lists.MENUITEMSDATA:
+            tags = [menuitemdata.tag] + [s.tag for s in menuitemdata.symb_l]
+            for tag in tags:
+                icon = QPixmap(10, 10)
+                icon.fill(QColor('white'))
+                icon.save(os.path.join(self.icons_dirpath, tag + '.png'))
+        patcher = mock.patch.object(commons, 'ICONS_DIR', self.icons_dirpath)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for cache in (icons._indices, icons._atlases, icons._pixmaps):
+            self.addCleanup(cache.clear)
+            cache.clear()
+        self.tabs = symbolstab.TabWidget(None, None)
+
+    def tearDown(self):
+        self.tabs.deleteLater()
+        app.processEvents()
+        shutil.rmtree(self.icons_dirpath)
+
+    def labels(self, index):
+        layout = self.tabs.tabs[index].layout()
+        return 0 if layout is None else layout.count()
+
+    def test_lazy(self):
+        self.assertEqual(len(self.tabs.tabs), len(lists.MENUITEMSDATA))
+        self.assertEqual(self.tabs.built,
+                         [True] + [False] * (len(lists.MENUITEMSDATA) - 1))
+        self.assertEqual(self.labels(0), len(lists.MENUITEMSDATA[0].symb_l))
+        self.assertEqual(self.labels(1), 0)
+        self.tabs.setCurrentIndex(2)
+        self.assertTrue(self.tabs.built[2])
+        self.assertFalse(self.tabs.built[1])
+        self.assertEqual(self.labels(2), len(lists.MENUITEMSDATA[2].symb_l))
+        # Showing it again does not add the labels twice
+        self.tabs.setCurrentIndex(0)
+        self.tabs.setCurrentIndex(2)
+        self.assertEqual(self.labels(2), len(lists.MENUITEMSDATA[2].symb_l))
+
+    def test_warm(self):
+        self.tabs.warm()
+        # One tab per call, the rest are left to the event loop
+        self.assertEqual(self.tabs.built.count(True), 2)
+        deadline = time.time() + 5
+        while False in self.tabs.built and time.time() < deadline:
+            app.processEvents()
+        self.assertNotIn(False, self.tabs.built)
+        for index, menuitemdata in enumerate(lists.MENUITEMSDATA):
+            self.assertEqual(self.labels(index), len(menuitemdata.symb_l))
+        self.assertEqual(self.tabs.currentIndex(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from visualequation import timing
+
+
+class TimingTest(unittest.TestCase):
+
+    def test_histograms(self):
+        histograms = timing.Histograms()
+        for seconds in (0.0005, 0.003, 0.003, 0.04, 10):
+            histograms.add("compile", seconds)
+        self.assertEqual(histograms.count("compile"), 5)
+        self.assertAlmostEqual(histograms.mean("compile"), 10.0465 / 5)
+        self.assertEqual(histograms.percentile("compile", 0.5), 5)
+        self.assertEqual(histograms.percentile("compile", 0.8), 50)
+        self.assertIsNone(histograms.percentile("compile", 1))
+        self.assertIsNone(histograms.mean("paint"))
+        output = io.StringIO()
+        histograms.report(output)
+        self.assertTrue(output.getvalue().startswith("compile"))
+
+    def test_span(self):
+        histograms = timing.Histograms()
+        timing.add_collector(histograms)
+        try:
+            with self.assertRaises(ValueError):
+                with timing.span("decode"):
+                    raise ValueError
+        finally:
+            timing.remove_collector(histograms)
+        self.assertEqual(histograms.count("decode"), 1)
+
+    def test_background(self):
+        histograms = timing.Histograms()
+        timing.add_collector(histograms)
+        try:
+            with timing.span("rasterize"):
+                pass
+            def work():
+                with timing.span("rasterize"):
+                    pass
+            for ignored in range(2):
+                thread = threading.Thread(target=work)
+                thread.start()
+                thread.join()
+        finally:
+            timing.remove_collector(histograms)
+        # The renders of the workers do not mix with the ones waited for
+        self.assertEqual(histograms.count("rasterize"), 1)
+        self.assertEqual(histograms.count("rasterize", True), 2)
+        output = io.StringIO()
+        histograms.report(output)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("rasterize "))
+        self.assertTrue(lines[1].startswith("rasterize (bg)"))
+
+    def test_profile(self):
+        temp_dirpath = tempfile.mkdtemp()
+        profile_fpath = os.path.join(temp_dirpath, 'profile.jsonl')
+        try:
+            with mock.patch.dict(os.environ, {timing.ENV_VAR: ''}):
+                self.assertIsNone(timing.profile())
+            with mock.patch.dict(os.environ,
+                                 {timing.ENV_VAR: profile_fpath}):
+                sink = timing.profile()
+            try:
+                with timing.span("serialize"):
+                    pass
+            finally:
+                sink.close()
+            self.assertNotIn(sink, timing.collectors)
+            # A span ending in a worker after the file was closed
+            sink.add("compile", 0.1, True)
+            with open(profile_fpath) as fprofile:
+                records = [json.loads(line) for line in fprofile]
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0]['stage'], "serialize")
+            self.assertFalse(records[0]['background'])
+        finally:
+            shutil.rmtree(temp_dirpath)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from visualequation import warmup
+from tests.test_dvilayout import make_tfm
+
+
+class FakeCache:
+    def __init__(self, layout):
+        self.calls = []
+        self.layout_value = layout
+
+    def layout(self, eq):
+        self.calls.append(('layout', eq))
+        return self.layout_value
+
+    def png(self, eq, dpi, frame=None, interactive=True):
+        self.calls.append(('png', eq, dpi, frame, interactive))
+
+
+class WarmupTest(unittest.TestCase):
+
+    def test_touch_fonts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tfm_fpath = os.path.join(temp_dir, 'test.tfm')
+            with open(tfm_fpath, 'wb') as ftfm:
+                ftfm.write(make_tfm())
+
+            def finder(name):
+                if name == 'missing':
+                    raise ValueError("not found")
+                return tfm_fpath
+
+            self.assertEqual(warmup.touch_fonts(('a', 'missing', 'b'), finder),
+                             ['a', 'b'])
+
+    @mock.patch.object(warmup, 'touch_fonts')
+    def test_warm_up(self, touch_fonts):
+        layout = mock.Mock(frame=(0, 0, 1, 1))
+        cache = FakeCache(layout)
+        warmup.warm_up(cache, 'marked', ['fallback'], 300)
+        self.assertEqual(cache.calls,
+                         [('layout', 'marked'),
+                          ('png', 'marked', 300, (0, 0, 1, 1), False)])
+        cache = FakeCache(None)
+        warmup.warm_up(cache, 'marked', ['fallback'], 300)
+        self.assertEqual(cache.calls[-1],
+                         ('png', ['fallback'], 300, None, False))
+        self.assertEqual(touch_fonts.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
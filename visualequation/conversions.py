@@ -16,15 +16,21 @@ A module to manage creation of LaTeX templates, generations of DVI and
 conversions to other formats
 """
 import os
-import subprocess
-import json
+import re
+import shutil
+import tempfile
+import concurrent.futures
 
 from PyQt5.QtWidgets import *
 
 from . import commons
 from . import eqtools
-from .symbols import utils
-from .errors import ShowError
+from . import eqcodec
+from . import metadata
+from . import runner
+from . import timing
+from .errors import ShowError, ConversionError, LatexError, \
+    CommandError, CommandNotFound, CommandFailed, CommandKilled
 
 
 def eq2latex_file(eq, latex_file, template_file):
@@ -32,77 +38,139 @@ def eq2latex_file(eq, latex_file, template_file):
     Write equation in a LaTeX file using the template template_file.
     It looks for string '%EQ%' in the file and replace it by eq.
     """
-    if isinstance(eq, str):
-        latex_code = eq
-    elif isinstance(eq, list):
-        latex_code = eqtools.eq2latex_code(eq)
-    else:
-        ShowError('Cannot understand equation type when writing LaTeX file.',
-                  True)
+    with timing.span('serialize'):
+        if isinstance(eq, str):
+            latex_code = eq
+        elif isinstance(eq, list):
+            latex_code = eqtools.eq2latex_code(eq)
+        else:
+            ShowError('Cannot understand equation type when writing LaTeX '
+                      'file.', True)
+    with timing.span('write'):
+        with open(template_file, "r") as ftempl:
+            with open(latex_file, "w") as flatex:
+                for line in ftempl:
+                    flatex.write(line.replace(
+                        '%EQ%', '%' + repr(eq) + "\n" + latex_code))
+
+
+def code_first_line(template_file):
+    """
+    Return the number of the line where the code of the equation starts in
+    the LaTeX files written with template_file (see eq2latex_file).
+    """
     with open(template_file, "r") as ftempl:
-        with open(latex_file, "w") as flatex:
-            for line in ftempl:
-                flatex.write(line.replace('%EQ%',
-                                          '%' + repr(eq) + "\n" + latex_code))
+        for number, line in enumerate(ftempl, 1):
+            if '%EQ%' in line:
+                # The equation is written first as a comment
+                return number + 1
+    return 1
 
 
-def latex_file2dvi(latex_file, output_dir):
+def latex_error(log_file, first_line=1):
     """
-    Compile the LaTeX file to DVI image and put the output in the given dir.
-    The log is saved in the specified file.
+    Return a LatexError describing the first error reported in the log of
+    latex. Lines are numbered from first_line of the LaTeX file, so they
+    refer to the code of the equation if it starts there.
     """
     try:
-        subprocess.check_output(["latex", "-interaction=nonstopmode",
-                                 "-halt-on-error",
-                                 "-output-directory=" + output_dir,
-                                 latex_file])
-    except subprocess.CalledProcessError as error:
-        msg = "Error reported by latex. The equation cannot be generated.\n" \
-              + "If you have installed the required packages, it could be " \
-              + "an internal error. Feel free to report it including " \
-              + "the content of the following file:\n" + latex_file + "\n" \
-              + "Finishing execution."
-        ShowError(msg, True)
+        with open(log_file, "r", errors='replace') as flog:
+            log = flog.read().splitlines()
     except OSError:
-        msg = "Command latex was not found. This is an essential " \
-              + "program for Visual Equation. Finishing execution."
-        ShowError(msg, True)
+        return LatexError("latex failed and wrote no log.")
+    for index, text in enumerate(log):
+        if not text.startswith('! '):
+            continue
+        line = token = None
+        # The context of the error follows the message and some help
+        for context in log[index + 1:index + 16]:
+            match = re.match(r'l\.(\d+) ?(.*)$', context)
+            if match:
+                line = int(match.group(1)) - first_line + 1
+                if line < 1:
+                    # It is in the template
+                    line = None
+                # TeX stops reading just after the offending token
+                match = re.search(r'(\\[A-Za-z@]+|\\.|[^\s\\])\s*$',
+                                  match.group(2))
+                if match:
+                    token = match.group(1)
+                break
+        return LatexError(text[2:].strip(), line, token)
+    return LatexError("latex failed without reporting an error.")
+
+
+def latex_file2dvi(latex_file, output_dir, first_line=1):
+    """
+    Compile the LaTeX file to DVI image and put the output in the given dir.
+    Errors raise ConversionError. If latex reports one, it is a LatexError
+    with the lines numbered from first_line (see latex_error).
+    """
+    name = os.path.splitext(os.path.basename(latex_file))[0]
+    log_file = os.path.join(output_dir, name + '.log')
+    if os.path.exists(log_file):
+        # It could be the log of other equation
+        os.remove(log_file)
+    try:
+        _run(["latex", "-interaction=nonstopmode", "-halt-on-error",
+              "-output-directory=" + output_dir, latex_file],
+             os.path.join(output_dir, name + '_latex.log'))
+    except CommandFailed:
+        if not os.path.exists(log_file):
+            # latex was not run
+            raise
+        raise latex_error(log_file, first_line)
 
 
-def dvi2png(dvi_file, png_file, log_file, dpi, bg):
+def show_latex_error(error, latex_file):
+    """
+    Show an error of eq2dvi, a LatexError or CommandKilled, without exiting.
+    """
+    msg = "Error reported by latex. The equation cannot be generated.\n" \
+          + str(error)
+    if isinstance(error, LatexError):
+        msg += "\nIf you have installed the required packages, it could " \
+               + "be an internal error. Feel free to report it including " \
+               + "the content of the following file:\n" + latex_file
+    ShowError(msg, False)
+
+
+def dvi2png(dvi_file, png_file, log_file, dpi, bg, frame=None,
+            interactive=True):
     """ Convert a DVI file to PNG.
     The log is saved in the specified file.
+    If frame (left, top, right, bottom), in inches from the origin of the
+    DVI, is given, the image covers exactly that region instead of being
+    cropped to the equation.
+    If interactive is False, errors raise ConversionError instead of being
+    shown (see _run).
     """
     if bg is None:
         bg = "Transparent"
-
-    with open(log_file, "w") as flog:
-        try:
-            subprocess.call(["dvipng", "-T", "tight", "-D", str(dpi),
-                             "-bg", bg,
-                             "-o", png_file, dvi_file], stdout=flog)
-        except OSError:
-            msg = "Command dvipng was not found. This is an essential " \
-                  + "program for Visual Equation. Finishing execution."
-            ShowError(msg, True)
-
-
-def dvi2eps(dvi_file, eps_file, log_file, dpi=600):
-    """ Convert the DVI file to PostScript. """
-    with open(log_file, "w") as flog:
-        try:
-            subprocess.call(["dvips", "-E", "-D", str(dpi), "-Ppdf",
-                             "-o", eps_file, dvi_file], stderr=flog)
-        except OSError:
-            ShowError("Command dvips was not found. No EPS was created.",
-                      False)
-
-
-def eps2pdf(eps_file, pdf_file):
+    if frame is None:
+        size_args = ["-T", "tight"]
+    else:
+        left, top, right, bottom = frame
+        # By default, dvipng places the origin of the DVI at (1in, 1in)
+        size_args = ["-T", "{:.5f}in,{:.5f}in".format(right - left,
+                                                       bottom - top),
+                     "-O", "{:.5f}in,{:.5f}in".format(-1 - left, -1 - top)]
+
+    cmd = ["dvipng"] + size_args + ["-D", str(dpi), "-bg", bg,
+                                    "-o", png_file, dvi_file]
+    if not interactive:
+        with timing.span('rasterize'):
+            _run(cmd, log_file)
+        return
     try:
-        subprocess.call(["epstopdf", "--outfile", pdf_file, eps_file])
-    except OSError:
-        ShowError("Command epstopdf was not found. No PDF was created.", False)
+        with timing.span('rasterize'):
+            runner.run(cmd, log_file, check=False)
+    except CommandNotFound:
+        msg = "Command dvipng was not found. This is an essential " \
+              + "program for Visual Equation. Finishing execution."
+        ShowError(msg, True)
+    except CommandError as error:
+        ShowError(str(error), False)
 
 
 # eps2svg: Ouput SVG has bounding box problems
@@ -117,7 +185,7 @@ def eps2pdf(eps_file, pdf_file):
 # def pdf2svg(pdf_file, svg_file):
 #    subprocess.call(["pdf2svg", pdf_file, svg_file])
 
-def dvi2svg(dvi_file, svg_file, log_file, scale=5):
+def dvi2svg(dvi_file, svg_file, log_file, scale=5, interactive=True):
     """
     Convert the DVI file to SVG with dvisvgm (it comes with texlive).
     It is the best option found until now:
@@ -125,26 +193,56 @@ def dvi2svg(dvi_file, svg_file, log_file, scale=5):
     * pdf2svg does not work well with pixeled text that dvips create
       in some systems, even when resolution is high in the pdf.
       (it is an issue of \text{} fields, or whatever outside math environment)
+    If interactive is False, errors raise ConversionError instead of being
+    shown (see _run).
     """
-    with open(log_file, "w") as flog:
-        try:
-            subprocess.call(["dvisvgm", "--no-fonts",
-                             "--scale=" + str(scale) + "," + str(scale),
-                             "-o", svg_file, dvi_file], stderr=flog)
-        except OSError:
-            msg = "Command dvisvgm was not found. No SVG was created."
-            ShowError(msg, False)
-
-
-class MyEncoder(json.JSONEncoder):
-    def default(self, o):
-        return o.__dict__
+    cmd = ["dvisvgm", "--no-fonts", "--scale=" + str(scale) + "," + str(scale),
+           "-o", svg_file, dvi_file]
+    if not interactive:
+        _run(cmd, log_file)
+        return
+    try:
+        runner.run(cmd, log_file, check=False)
+    except CommandNotFound:
+        msg = "Command dvisvgm was not found. No SVG was created."
+        ShowError(msg, False)
+    except CommandError as error:
+        ShowError(str(error) + " No SVG was created.", False)
 
 
-def from_json(json_o):
-    if isinstance(json_o, dict):
-        return utils.Op(json_o['n_args'], json_o['latex_code'],
-                        json_o['type_'])
+def eq2dvi(eq, directory, fname='ve', latex_template=None, interactive=True):
+    """
+    Write the LaTeX file of the equation in directory and compile it.
+    Returns the path of the DVI, named fname.dvi.
+    If latex reports an error, a LatexError is raised with lines numbered
+    from the start of the code of the equation. It and CommandKilled, which
+    are errors of the equation, are always raised: the caller decides how
+    to report them (see show_latex_error). Other errors raise
+    ConversionError if interactive is False. Otherwise they are shown, and
+    only a missing latex exits the program.
+    """
+    latex_fpath = os.path.join(directory, fname + '.tex')
+    if latex_template is None:
+        latex_template = commons.LATEX_TEMPLATE
+    eq2latex_file(eq, latex_fpath, latex_template)
+    try:
+        with timing.span('compile'):
+            latex_file2dvi(latex_fpath, directory,
+                           code_first_line(latex_template))
+    except (LatexError, CommandKilled):
+        raise
+    except CommandNotFound:
+        if not interactive:
+            raise
+        msg = "Command latex was not found. This is an essential " \
+              + "program for Visual Equation. Finishing execution."
+        ShowError(msg, True)
+    except CommandError as error:
+        if not interactive:
+            raise
+        # A timeout, for example: other equations can still be generated
+        ShowError(str(error) + " The equation cannot be generated.", False)
+    return os.path.join(directory, fname + '.dvi')
 
 
 def eq2png(eq, dpi, bg, directory, png_fpath=None, add_metadata=False,
@@ -161,133 +259,189 @@ def eq2png(eq, dpi, bg, directory, png_fpath=None, add_metadata=False,
     if not os.path.exists(directory):
         ShowError('Temporal directory used by eq2png does not exist.', True)
     fname = 've'
-    latex_fpath = os.path.join(directory, fname + '.tex')
     dvi2pnglog_fpath = os.path.join(directory, fname + '_div2png.log')
-    dvi_fpath = os.path.join(directory, fname + '.dvi')
     if png_fpath is None:
         png_fpath = os.path.join(directory, fname + '.png')
-    if latex_template is None:
-        latex_template = commons.LATEX_TEMPLATE
-    eq2latex_file(eq, latex_fpath, latex_template)
-    latex_file2dvi(latex_fpath, directory)
+    try:
+        dvi_fpath = eq2dvi(eq, directory, fname, latex_template)
+    except (LatexError, CommandKilled) as error:
+        show_latex_error(error, os.path.join(directory, fname + '.tex'))
+        return png_fpath
     if dpi is None:
         dpi = 300
     dvi2png(dvi_fpath, png_fpath, dvi2pnglog_fpath, dpi, bg)
     if add_metadata:
         # Save the equation into the file
-        eq_str = json.dumps(eq, cls=MyEncoder)
-        exiftoollog_fpath = os.path.join(directory, fname + '_exif.log')
-        with open(exiftoollog_fpath, "w") as flog:
-            try:
-                subprocess.call(["exiftool", "-overwrite_original",
-                                 "-description=" + eq_str,
-                                 png_fpath], stdout=flog)
-            except subprocess.CalledProcessError:
-                msg = "Exiftool related error. Probably equation was not " \
-                      + "saved correctly inside the image."
-                ShowError(msg, False)
-            except OSError:
-                msg = "Command exiftool was not found. Equation was not " \
-                      + "saved inside the image."
-                ShowError(msg, False)
+        warning = _save_eq(metadata.add_to_png, png_fpath,
+                           eqcodec.encode(eq))
+        if warning is not None:
+            ShowError(warning, False)
     return png_fpath
 
 
-def eq2eps(eq, dpi, directory, eps_fpath=None):
-    """ Create a eps from a equation, returns the path of eps image.
+# Formats that can be exported and their file extensions
+EXPORT_FORMATS = {'PNG': 'png', 'PDF': 'pdf', 'EPS': 'eps', 'SVG': 'svg'}
 
-    The user specify the dir where auxiliary files will be created.
-    If the path of the image is not specified, it will be created in the same
-    directory (and will be overwritten if this function is called again with
-    the same directory)
+
+def _run(cmd, log_fpath):
     """
-    # If directory does not exist, raise exception
-    if not os.path.exists(directory):
-        ShowError('Temporal directory used by eq2eps does not exist.', True)
-    fname = 've'
-    latex_fpath = os.path.join(directory, fname + '.tex')
-    dvi2epslog_fpath = os.path.join(directory, fname + '_div2eps.log')
-    dvi_fpath = os.path.join(directory, fname + '.dvi')
-    if eps_fpath is None:
-        eps_fpath = os.path.join(directory, fname + '.ps')
-    eq2latex_file(eq, latex_fpath, commons.LATEX_TEMPLATE)
-    latex_file2dvi(latex_fpath, directory)
-    dvi2eps(dvi_fpath, eps_fpath, dvi2epslog_fpath, dpi)
-    return eps_fpath
+    Run an external program without interacting with the user, so it can be
+    called from a worker thread. Failures raise a CommandError (see module
+    runner).
+    """
+    runner.run(cmd, log_fpath)
 
 
-def eq2pdf(eq, dpi, directory, pdf_fpath=None):
+def _save_eq(add_fun, *args):
     """
-    Convert equation to pdf file. It always adds the equation to metadata.
+    Call add_fun with args to save the equation inside an exported file.
+    The file is useful without it, so a failure is only returned as a
+    warning (None if there was no problem).
     """
-    if not os.path.exists(directory):
-        ShowError('Temporal directory used by eq2pdf does not exist.', True)
-    if pdf_fpath is None:
-        pdf_fpath = os.path.join(directory, 've.pdf')
-        save_eq = False
-    else:
-        save_eq = True
-    eps_fpath = eq2eps(eq, dpi, directory)
-    eps2pdf(eps_fpath, pdf_fpath)
-    if save_eq:
-        # Save the equation into the file
-        eq_str = json.dumps(eq, cls=MyEncoder)
-        exiftoollog_fpath = os.path.join(directory, 've_exif.log')
-        with open(exiftoollog_fpath, "w") as flog:
-            try:
-                subprocess.call(["exiftool", "-overwrite_original",
-                                 "-description=" + eq_str,
-                                 pdf_fpath], stdout=flog)
-            except subprocess.CalledProcessError:
-                msg = "Exiftool related error. Probably equation was not " \
-                      + "saved correctly inside the image."
-                ShowError(msg, True)
-            except OSError:
-                msg = "Command exiftool was not found. Equation was not " \
-                      + "saved inside the image."
-                ShowError(msg, False)
-    return pdf_fpath
-
-
-def eq2svg(eq, scale, directory, svg_fpath):
-    """ Converts the equation to SVG"""
+    try:
+        add_fun(*args)
+    except (ConversionError, OSError, ValueError) as error:
+        return "Equation was not saved inside the file: " + str(error)
+    return None
 
-    # If directory does not exist, raise exception
+
+# Exporters return the warning of _save_eq. Other errors are raised.
+def _export_png(dvi_fpath, out_fpath, dpi, eq_str, work_dir):
+    _run(["dvipng", "-T", "tight", "-D", str(dpi), "-bg", "Transparent",
+          "-o", out_fpath, dvi_fpath],
+         os.path.join(work_dir, 'png.log'))
+    return _save_eq(metadata.add_to_png, out_fpath, eq_str)
+
+
+def _export_eps(dvi_fpath, out_fpath, dpi, eq_str, work_dir):
+    _run(["dvips", "-E", "-D", str(dpi), "-Ppdf", "-o", out_fpath,
+          dvi_fpath], os.path.join(work_dir, 'eps.log'))
+    return _save_eq(metadata.add_to_eps, out_fpath, eq_str)
+
+
+def _export_pdf(dvi_fpath, out_fpath, dpi, eq_str, work_dir):
+    # The intermediate EPS is not the exported one, which has metadata
+    eps_fpath = os.path.join(work_dir, 'pdf.eps')
+    _run(["dvips", "-E", "-D", str(dpi), "-Ppdf", "-o", eps_fpath,
+          dvi_fpath], os.path.join(work_dir, 'pdf_dvips.log'))
+    _run(["epstopdf", "--outfile", out_fpath, eps_fpath],
+         os.path.join(work_dir, 'pdf.log'))
+    return _save_eq(_run, ["exiftool", "-overwrite_original",
+                           "-description=" + eq_str, out_fpath],
+                    os.path.join(work_dir, 'pdf_exif.log'))
+
+
+def _export_svg(dvi_fpath, out_fpath, scale, eq_str, work_dir):
+    _run(["dvisvgm", "--no-fonts", "--scale=" + str(scale) + "," + str(scale),
+          "-o", out_fpath, dvi_fpath], os.path.join(work_dir, 'svg.log'))
+    if not os.path.exists(out_fpath):
+        # dvisvgm does not always return an error code
+        raise ConversionError("Command dvisvgm did not create the SVG.")
+    return _save_eq(metadata.add_to_svg, out_fpath, eq_str)
+
+
+_EXPORTERS = {
+    'PNG': _export_png,
+    'PDF': _export_pdf,
+    'EPS': _export_eps,
+    'SVG': _export_svg,
+}
+
+
+def eq2files(eq, base_fpath, sizes, directory):
+    """
+    Export the equation to several formats compiling LaTeX only once.
+
+    sizes is a dict from the format name (a key of EXPORT_FORMATS) to its
+    dpi (or scale, for SVG). Files are named base_fpath plus the extension
+    of each format. The conversions of the DVI are run in parallel and
+    every output is written to a temporary file next to its destination;
+    only if all of them succeed they are renamed, so either all the files
+    are written or none is modified. Failing to save the equation inside
+    a file does not prevent writing it.
+    Returns the list of written paths. Errors are shown to the user.
+    """
     if not os.path.exists(directory):
-        ShowError('Temporal directory used by eq2svg does not exist.', True)
-    fname = 've'
-    latex_fpath = os.path.join(directory, fname + '.tex')
-    dvi_fpath = os.path.join(directory, fname + '.dvi')
-    dvi2svglog_path = os.path.join(directory,
-                                   fname + '_dvi2svg.log')
-    eq2latex_file(eq, latex_fpath, commons.LATEX_TEMPLATE)
-    latex_file2dvi(latex_fpath, directory)
-    dvi2svg(dvi_fpath, svg_fpath, dvi2svglog_path, scale)
+        ShowError('Temporal directory used by eq2files does not exist.',
+                  True)
+    if not sizes:
+        return []
+    try:
+        dvi_fpath = eq2dvi(eq, directory, 've_export')
+    except (LatexError, CommandKilled) as error:
+        show_latex_error(error, os.path.join(directory, 've_export.tex'))
+        return []
+    if not os.path.exists(dvi_fpath):
+        # The error was shown by eq2dvi
+        return []
+    eq_str = eqcodec.encode(eq)
+    dest_dir, base = os.path.split(os.path.abspath(base_fpath))
+    outputs = {}
+    for save_format in sizes:
+        ext = EXPORT_FORMATS[save_format]
+        fd, temp_fpath = tempfile.mkstemp(suffix='.' + ext,
+                                          prefix='.' + base + '.',
+                                          dir=dest_dir)
+        os.close(fd)
+        outputs[save_format] = (temp_fpath, base_fpath + '.' + ext)
+    errors = []
+    warnings = []
+    work_dirs = []
+    with concurrent.futures.ThreadPoolExecutor(len(sizes)) as executor:
+        futures = {}
+        for save_format, size in sizes.items():
+            work_dirs.append(tempfile.mkdtemp(prefix=save_format.lower(),
+                                              dir=directory))
+            futures[executor.submit(_EXPORTERS[save_format], dvi_fpath,
+                                    outputs[save_format][0], size,
+                                    eq_str, work_dirs[-1])] = save_format
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                warning = future.result()
+            except (ConversionError, OSError, ValueError) as error:
+                errors.append(futures[future] + ": " + str(error))
+            else:
+                if warning is not None:
+                    warnings.append(futures[future] + ": " + warning)
+    for work_dir in work_dirs:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if errors:
+        for temp_fpath, ignored in outputs.values():
+            if os.path.exists(temp_fpath):
+                os.remove(temp_fpath)
+        ShowError("The equation was not exported:\n" + "\n".join(errors),
+                  False)
+        return []
+    # Temporary files are only readable by the user, fix it
+    umask = os.umask(0)
+    os.umask(umask)
+    for temp_fpath, fpath in outputs.values():
+        os.chmod(temp_fpath, 0o666 & ~umask)
+        os.replace(temp_fpath, fpath)
+    if warnings:
+        ShowError("\n".join(warnings), False)
+    return [fpath for ignored, fpath in outputs.values()]
 
 
 def open_eq(parent, filename=None):
     "Return equation inside a file chosen interactively. Else, None."
     if not filename:
         filename, ignored = QFileDialog.getOpenFileName(
-            parent, _('Open equation'), '', _('Valid formats (*.png *.pdf)'))
+            parent, _('Open equation'), '',
+            _('Valid formats (*.png *.pdf *.svg *.eps)'))
     if not filename:
         return None
     try:
-        eq_str = subprocess.check_output(
-            ["exiftool", "-b", "-s3", "-description", filename]).decode('utf8')
-        if not eq_str:
+        eq = metadata.read_eq(filename)
+        if eq is None and filename.lower().endswith(('.png', '.pdf')):
+            # Metadata could have been moved by other programs
+            eq = exiftool_eq(filename)
+        if eq is None:
             msg = _("No equation inside this file.")
             ShowError(msg, False, parent)
-            return None
-        return json.JSONDecoder(object_hook=from_json).decode(eq_str)
-    except subprocess.CalledProcessError:
-        msg = "Error by exiftool when trying to extract equation from file."
-        ShowError(msg, False, parent)
-        return None
-    except OSError:
-        msg = "Command exiftool was not found.\n" \
-              + "You need this tool for saving and recovering equations " \
-              + "from PNG and PDF."
+        return eq
+    except OSError as error:
+        msg = "File could not be read: " + str(error)
         ShowError(msg, False, parent)
         return None
     except ValueError as error:
@@ -297,3 +451,18 @@ def open_eq(parent, filename=None):
                 ) % str(error)
         ShowError(msg, False, parent)
         return None
+
+
+def exiftool_eq(filename):
+    """
+    Return the equation inside filename using exiftool, None if it could not
+    be found. ValueError is raised if metadata cannot be decoded.
+    """
+    try:
+        eq_str = runner.run(["exiftool", "-b", "-s3", "-description",
+                             filename]).decode('utf8')
+    except CommandError:
+        return None
+    if not eq_str:
+        return None
+    return eqcodec.decode(eq_str)
@@ -0,0 +1,377 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to get the position of every block of an equation from the DVI of
+its marked LaTeX code (see eqtools.eq2latex_code_marked).
+
+The first page of the DVI is interpreted without drawing anything: the
+box of a glyph is obtained from the TFM file of its font, which is found
+with kpsewhich. The box of a block is the union of the boxes of the glyphs
+and rules found between its \\special markers.
+"""
+import re
+import struct
+
+from . import runner
+from .errors import CommandError
+
+_MARK = re.compile(rb've:([be]) (\d+)$')
+
+# Inches in a TeX point
+POINT = 1 / 72.27
+# Height and depth of the box of a block without glyphs, in points
+EMPTY_HEIGHT = 7.
+EMPTY_DEPTH = 2.
+# Space left around the equation in the frame, in points
+MARGIN = 2.
+
+# name of the font -> path of its TFM file
+_tfm_paths = {}
+# path of a TFM file -> metrics of its characters
+_tfm_metrics = {}
+
+
+def find_tfm(name):
+    """ Return the path of the TFM file of a font. """
+    if name not in _tfm_paths:
+        try:
+            output = runner.run(["kpsewhich", name + ".tfm"])
+        except CommandError:
+            raise ValueError("TFM file of font " + name + " not found")
+        _tfm_paths[name] = output.decode('utf8').strip()
+    return _tfm_paths[name]
+
+
+def read_tfm(data):
+    """
+    Return a dict char code -> (width, height, depth, italic correction) of
+    the TFM file content data. Dimensions are relative to the design size.
+    """
+    try:
+        lf, lh, bc, ec, nw, nh, nd, ni = struct.unpack('>8H', data[:16])
+    except struct.error:
+        raise ValueError("TFM file is truncated")
+    if lf * 4 > len(data) or ec + 1 < bc:
+        raise ValueError("Invalid header of TFM file")
+    n_chars = ec - bc + 1
+    info_start = 24 + 4 * lh
+
+    def table(start, length):
+        return [fix / 2. ** 20 for fix in
+                struct.unpack('>' + str(length) + 'i',
+                              data[start:start + 4 * length])]
+
+    widths = table(info_start + 4 * n_chars, nw)
+    heights = table(info_start + 4 * (n_chars + nw), nh)
+    depths = table(info_start + 4 * (n_chars + nw + nh), nd)
+    italics = table(info_start + 4 * (n_chars + nw + nh + nd), ni)
+    metrics = {}
+    for i in range(n_chars):
+        width_i, height_depth_i, italic_i, ignored = \
+            data[info_start + 4 * i:info_start + 4 * i + 4]
+        # Index 0 of the width table means that the character does not exist
+        if width_i:
+            metrics[bc + i] = (widths[width_i], heights[height_depth_i >> 4],
+                               depths[height_depth_i & 0xf],
+                               italics[italic_i >> 2])
+    return metrics
+
+
+def load_tfm(name, tfm_finder=find_tfm):
+    """ Return the metrics of the characters of a font. """
+    fpath = tfm_finder(name)
+    if fpath not in _tfm_metrics:
+        try:
+            with open(fpath, "rb") as ftfm:
+                _tfm_metrics[fpath] = read_tfm(ftfm.read())
+        except OSError:
+            raise ValueError("TFM file " + fpath + " cannot be read")
+    return _tfm_metrics[fpath]
+
+
+class _IntervalNode:
+    """
+    Node of a centered interval tree. items are (start, end, value) and the
+    node keeps the ones containing its center.
+    """
+
+    def __init__(self, items):
+        middles = sorted((start + end) / 2. for start, end, ignored in items)
+        self.center = middles[len(middles) // 2]
+        here = [item for item in items if item[0] <= self.center <= item[1]]
+        self.by_start = sorted(here, key=lambda item: item[0])
+        self.by_end = sorted(here, key=lambda item: item[1], reverse=True)
+        before = [item for item in items if item[1] < self.center]
+        after = [item for item in items if item[0] > self.center]
+        self.before = _IntervalNode(before) if before else None
+        self.after = _IntervalNode(after) if after else None
+
+    def stab(self, point, found):
+        """ Append to found the values of the intervals containing point."""
+        node = self
+        while node is not None:
+            if point < node.center:
+                for start, ignored, value in node.by_start:
+                    if start > point:
+                        break
+                    found.append(value)
+                node = node.before
+            elif point > node.center:
+                for ignored, end, value in node.by_end:
+                    if end < point:
+                        break
+                    found.append(value)
+                node = node.after
+            else:
+                found.extend(value for ignored1, ignored2, value
+                             in node.by_start)
+                return
+
+
+class Layout:
+    """
+    Boxes of the blocks of an equation, as (left, top, right, bottom) in
+    inches from the origin of the DVI. frame is a box with the whole
+    equation and a margin around it.
+    """
+
+    def __init__(self, boxes, frame):
+        self.boxes = boxes
+        self.frame = frame
+        # Interval tree of the horizontal extents, built when needed
+        self.tree = None
+
+    def box(self, index):
+        """ Return the box of the block starting at index or None. """
+        return self.boxes.get(index)
+
+    def block_at(self, x, y):
+        """
+        Return the index of the smallest block which box contains point
+        (x, y), in inches from the origin of the DVI, or None.
+        """
+        if not self.boxes:
+            return None
+        if self.tree is None:
+            self.tree = _IntervalNode([(box[0], box[2], index) for index, box
+                                       in self.boxes.items()])
+        candidates = []
+        self.tree.stab(x, candidates)
+        found = None
+        for index in candidates:
+            left, top, right, bottom = self.boxes[index]
+            if not top <= y <= bottom:
+                continue
+            area = (right - left) * (bottom - top)
+            # With equal boxes, the inner block starts later
+            if found is None or (area, -index) < found:
+                found = (area, -index)
+        return None if found is None else -found[1]
+
+
+class _DviReader:
+    def __init__(self, data, tfm_finder):
+        self.data = data
+        self.pos = 0
+        self.tfm_finder = tfm_finder
+        # inches per DVI unit
+        self.unit = None
+        # font number -> (metrics, size in DVI units)
+        self.fonts = {}
+        self.font = None
+        # index of block -> [left, top, right, bottom, has glyphs]
+        self.boxes = {}
+        self.open_blocks = set()
+        self.ink = None
+
+    def unsigned(self, n_bytes):
+        if self.pos + n_bytes > len(self.data):
+            raise ValueError("DVI file is truncated")
+        value = int.from_bytes(self.data[self.pos:self.pos + n_bytes], 'big')
+        self.pos += n_bytes
+        return value
+
+    def signed(self, n_bytes):
+        if self.pos + n_bytes > len(self.data):
+            raise ValueError("DVI file is truncated")
+        value = int.from_bytes(self.data[self.pos:self.pos + n_bytes], 'big',
+                               signed=True)
+        self.pos += n_bytes
+        return value
+
+    def add_ink(self, left, top, right, bottom):
+        if self.ink is None:
+            self.ink = [left, top, right, bottom]
+        else:
+            self.ink = [min(self.ink[0], left), min(self.ink[1], top),
+                        max(self.ink[2], right), max(self.ink[3], bottom)]
+        for index in self.open_blocks:
+            box = self.boxes[index]
+            if box[4]:
+                box[:4] = [min(box[0], left), min(box[1], top),
+                           max(box[2], right), max(box[3], bottom)]
+            else:
+                # Replace the vertical extent guessed from the markers
+                box[:] = [min(box[0], left), top, max(box[2], right), bottom,
+                          True]
+
+    def char(self, code, h, v):
+        """ Add the box of a character and return its width. """
+        try:
+            metrics, size = self.fonts[self.font]
+        except KeyError:
+            raise ValueError("Character set before selecting a font in DVI")
+        if code not in metrics:
+            return 0
+        width, height, depth, italic = (dim * size for dim in metrics[code])
+        self.add_ink(h, v - height, h + width + max(italic, 0), v + depth)
+        return round(width)
+
+    def special(self, length, h, v):
+        match = _MARK.match(self.data[self.pos:self.pos + length])
+        self.pos += length
+        if not match:
+            return
+        index = int(match.group(2))
+        empty = (EMPTY_HEIGHT * POINT / self.unit,
+                 EMPTY_DEPTH * POINT / self.unit)
+        box = self.boxes.setdefault(index, [h, v - empty[0], h, v + empty[1],
+                                            False])
+        box[0] = min(box[0], h)
+        box[2] = max(box[2], h)
+        if not box[4]:
+            box[1] = min(box[1], v - empty[0])
+            box[3] = max(box[3], v + empty[1])
+        if match.group(1) == b'b':
+            self.open_blocks.add(index)
+        else:
+            self.open_blocks.discard(index)
+
+    def font_def(self, number):
+        self.pos += 4  # checksum
+        size = self.unsigned(4)
+        self.pos += 4  # design size
+        length = self.unsigned(1) + self.unsigned(1)
+        name = self.data[self.pos:self.pos + length].decode('ascii',
+                                                            'replace')
+        self.pos += length
+        self.fonts[number] = (load_tfm(name, self.tfm_finder), size)
+
+    def preamble(self):
+        if self.unsigned(1) != 2:
+            raise ValueError("Unknown version of DVI file")
+        num = self.unsigned(4)
+        den = self.unsigned(4)
+        mag = self.unsigned(4)
+        if not num or not den:
+            raise ValueError("Invalid units in DVI file")
+        comment_length = self.unsigned(1)
+        self.pos += comment_length
+        # num/den are tenths of micrometre per unit, 254000 in an inch
+        self.unit = num / den / 254000 * mag / 1000
+
+    def read(self):
+        h = v = w = x = y = z = 0
+        stack = []
+        if self.unsigned(1) != 247:
+            raise ValueError("File is not a DVI")
+        self.preamble()
+        while True:
+            op = self.unsigned(1)
+            if op < 128:
+                h += self.char(op, h, v)
+            elif op <= 131:
+                h += self.char(self.unsigned(op - 127), h, v)
+            elif op in (132, 137):
+                height = self.signed(4)
+                width = self.signed(4)
+                if height > 0 and width > 0:
+                    self.add_ink(h, v - height, h + width, v)
+                if op == 132:
+                    h += width
+            elif op <= 136:
+                self.char(self.unsigned(op - 132), h, v)
+            elif op == 138:
+                pass
+            elif op == 139:
+                self.pos += 44
+                h = v = w = x = y = z = 0
+                stack = []
+            elif op == 140:
+                break
+            elif op == 141:
+                stack.append((h, v, w, x, y, z))
+            elif op == 142:
+                if not stack:
+                    raise ValueError("Unbalanced pop in DVI file")
+                h, v, w, x, y, z = stack.pop()
+            elif op <= 146:
+                h += self.signed(op - 142)
+            elif op == 147:
+                h += w
+            elif op <= 151:
+                w = self.signed(op - 147)
+                h += w
+            elif op == 152:
+                h += x
+            elif op <= 156:
+                x = self.signed(op - 152)
+                h += x
+            elif op <= 160:
+                v += self.signed(op - 156)
+            elif op == 161:
+                v += y
+            elif op <= 165:
+                y = self.signed(op - 161)
+                v += y
+            elif op == 166:
+                v += z
+            elif op <= 170:
+                z = self.signed(op - 166)
+                v += z
+            elif op <= 234:
+                self.font = op - 171
+            elif op <= 238:
+                self.font = self.unsigned(op - 234)
+            elif op <= 242:
+                self.special(self.unsigned(op - 238), h, v)
+            elif op <= 246:
+                self.font_def(self.unsigned(op - 242))
+            else:
+                raise ValueError("Unexpected opcode in DVI file: " + str(op))
+        # Blocks without glyphs, like spaces, must be in the frame too
+        self.open_blocks.clear()
+        for box in self.boxes.values():
+            if not box[4]:
+                self.add_ink(*box[:4])
+        if self.ink is None:
+            raise ValueError("DVI file is empty")
+
+        def to_inches(box):
+            return tuple(dim * self.unit for dim in box[:4])
+
+        margin = MARGIN * POINT
+        left, top, right, bottom = to_inches(self.ink)
+        frame = (left - margin, top - margin, right + margin, bottom + margin)
+        return Layout({index: to_inches(box)
+                       for index, box in self.boxes.items()}, frame)
+
+
+def read_layout(dvi_fpath, tfm_finder=find_tfm):
+    """
+    Return the Layout of the equation in a DVI file. ValueError is raised
+    if it cannot be read or a TFM file is not found.
+    """
+    with open(dvi_fpath, "rb") as fdvi:
+        return _DviReader(fdvi.read(), tfm_finder).read()
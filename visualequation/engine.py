@@ -0,0 +1,46 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module with what every equation being edited shares, so memory and
+warm-up do not grow with the number of windows.
+"""
+import os
+
+from . import rendercache
+from . import prefetch
+
+# Versions of equations kept in the render cache
+CACHE_ENTRIES = 128
+
+
+class Engine:
+    """
+    The scratch directory, the render cache and the worker threads shared by
+    the windows. Jobs of the workers are submitted with the Selection of
+    the window as owner, so windows do not cancel the jobs of each other.
+    """
+
+    def __init__(self, scratch_dir, cache_entries=CACHE_ENTRIES):
+        self.scratch = scratch_dir
+        self.temp_dir = scratch_dir.path
+        self.cache = rendercache.RenderCache(
+            os.path.join(self.temp_dir, 'cache'), cache_entries)
+        # Images at high resolution displayed after a preview
+        self.refiner = prefetch.Prefetcher(niceness=0)
+        # Images that will probably be displayed next
+        self.prefetcher = prefetch.Prefetcher()
+        # LaTeX code typed by the user, so it does not wait for the refines
+        self.checker = prefetch.Prefetcher(niceness=0)
+        # Files of the displayed equations are not removed
+        self.scratch.add_pins(self.cache.files)
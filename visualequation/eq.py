@@ -28,89 +28,95 @@ from .errors import ShowError
 
 
 class SaveDialog(QDialog):
-    prev_format_index = 0
-    prev_size = 600.
+    prev_formats = ('PNG',)
+    prev_dpi = 600.
+    prev_scale = 5.
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle('Save equation')
-        label = QLabel(
-            _("Select format:\n\nNote: Equations can only be recovered"
-              " from PNG and PDF."))
+        label = QLabel(_("Select formats:"))
         label.setWordWrap(True)
-        items = ["PNG", "PDF", "EPS", "SVG"]
-        self.combo = QComboBox(self)
-        self.combo.addItems(items)
-        self.combo.setCurrentIndex(self.prev_format_index)
-        self.label_spin = QLabel(_('Size (dpi):'))
-        self.spin = QDoubleSpinBox(self)
-        self.spin.setMaximum(10000)
+        # Every format is generated from the same LaTeX compilation
+        self.checks = {}
+        for save_format in conversions.EXPORT_FORMATS:
+            self.checks[save_format] = QCheckBox(save_format, self)
+            self.checks[save_format].setChecked(
+                save_format in self.prev_formats)
+            self.checks[save_format].stateChanged.connect(self.changed_check)
+        self.label_dpi = QLabel(_('Size (dpi):'))
+        self.spin_dpi = QDoubleSpinBox(self)
+        self.spin_dpi.setMaximum(10000)
+        self.spin_dpi.setMinimum(10)
+        self.spin_dpi.setValue(self.prev_dpi)
+        self.label_scale = QLabel(_('Size (scale):'))
+        self.spin_scale = QDoubleSpinBox(self)
+        self.spin_scale.setMaximum(10000)
         # Just avoid negative numbers
-        # Minimum conditions are set later
-        self.spin.setMinimum(0.01)
-        self.spin.setValue(self.prev_size)
+        self.spin_scale.setMinimum(0.01)
+        self.spin_scale.setValue(self.prev_scale)
         self.buttons = QDialogButtonBox(
             QDialogButtonBox.Ok | QDialogButtonBox.Cancel,
             Qt.Horizontal, self)
         vbox = QVBoxLayout(self)
         vbox.addWidget(label)
-        vbox.addWidget(self.combo)
-        vbox.addWidget(self.label_spin)
-        vbox.addWidget(self.spin)
+        for save_format in conversions.EXPORT_FORMATS:
+            vbox.addWidget(self.checks[save_format])
+        vbox.addWidget(self.label_dpi)
+        vbox.addWidget(self.spin_dpi)
+        vbox.addWidget(self.label_scale)
+        vbox.addWidget(self.spin_scale)
         vbox.addWidget(self.buttons)
-        self.combo.currentIndexChanged.connect(self.changed_combo)
-        self.spin.valueChanged.connect(self.changed_spin)
         self.buttons.accepted.connect(self.accept)
         self.buttons.rejected.connect(self.reject)
+        self.changed_check()
 
-    def changed_combo(self, index):
-        if "SVG" == self.combo.currentText():
-            self.label_spin.setText(_('Size (scale):'))
-            self.spin.setValue(5)
-        else:
-            self.label_spin.setText(_('Size (dpi):'))
-            self.spin.setValue(600)
-
-    def changed_spin(self):
-        if "SVG" == self.combo.currentText():
-            if self.spin.value() < 0.:
-                self.buttons.button(QDialogButtonBox.Ok).setDisabled(
-                    True)
-            else:
-                self.buttons.button(QDialogButtonBox.Ok).setEnabled(
-                    True)
-        else:
-            if self.spin.value() < 10.:
-                self.buttons.button(QDialogButtonBox.Ok).setDisabled(
-                    True)
-            else:
-                self.buttons.button(QDialogButtonBox.Ok).setEnabled(
-                    True)
+    def formats(self):
+        return [save_format for save_format in conversions.EXPORT_FORMATS
+                if self.checks[save_format].isChecked()]
+
+    def changed_check(self):
+        formats = self.formats()
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(bool(formats))
+        uses_dpi = any(save_format != 'SVG' for save_format in formats)
+        self.label_dpi.setEnabled(uses_dpi)
+        self.spin_dpi.setEnabled(uses_dpi)
+        self.label_scale.setEnabled('SVG' in formats)
+        self.spin_scale.setEnabled('SVG' in formats)
 
     @staticmethod
     def get_save_options(parent=None):
+        """
+        Return a dict from every chosen format to its size (dpi or scale).
+        """
         dialog = SaveDialog(parent)
         result = dialog.exec_()
         if result == QDialog.Accepted:
-            SaveDialog.prev_format_index = dialog.combo.currentIndex()
-            SaveDialog.prev_size = dialog.spin.value()
-            return ((dialog.combo.currentText(),
-                     dialog.spin.value()),
-                    True)
+            SaveDialog.prev_formats = tuple(dialog.formats())
+            SaveDialog.prev_dpi = dialog.spin_dpi.value()
+            SaveDialog.prev_scale = dialog.spin_scale.value()
+            sizes = {}
+            for save_format in dialog.formats():
+                if save_format == 'SVG':
+                    sizes[save_format] = dialog.spin_scale.value()
+                else:
+                    sizes[save_format] = dialog.spin_dpi.value()
+            return sizes, True
         else:
-            return (None, None), False
+            return None, False
 
 
 class Eq:
-    def __init__(self, temp_dir, setpixmap, parent):
+    def __init__(self, engine, setpixmap, parent):
 
         init_eq = [utils.NEWARG]
         self.eq_buffer = []
         self.eq = list(init_eq)  # It will be mutated by the replace functions
-        self.temp_dir = temp_dir
+        self.temp_dir = engine.temp_dir
         self.parent = parent
-        self.eqsel = eqsel.Selection(init_eq, 0, temp_dir, setpixmap)
-        self.eqsel.display(self.eq)
+        self.eqsel = eqsel.Selection(init_eq, 0, engine, setpixmap)
+        # Do not wait for LaTeX to show the window
+        self.eqsel.display_first(self.eq)
         self.eqhist = eqhist.EqHist(self.eqsel)
 
     def insert(self, oper):
@@ -426,38 +432,38 @@ class Eq:
             self.eqhist.save(self.eqsel)
 
     def save_eq(self):
-        (save_format, size), ok = SaveDialog.get_save_options(self.parent)
+        sizes, ok = SaveDialog.get_save_options(self.parent)
         if not ok:
             return
+        exts = [conversions.EXPORT_FORMATS[save_format]
+                for save_format in sizes]
         # Implement a Save File dialog
         # The staticmethod does not accept default suffix
-        formatfilter = save_format + " (*." + save_format.lower() + ")"
+        formatfilter = ", ".join(sizes) + " (" \
+                       + " ".join("*." + ext for ext in exts) + ")"
         dialog = QFileDialog(self.parent, 'Save equation', '', formatfilter)
         dialog.setFileMode(QFileDialog.AnyFile)
         dialog.setAcceptMode(QFileDialog.AcceptSave)
-        dialog.setDefaultSuffix(save_format.lower())
+        dialog.setDefaultSuffix(exts[0])
         dialog.setOption(QFileDialog.DontConfirmOverwrite, True)
         if not dialog.exec_():
             return
         filename = dialog.selectedFiles()[0]
+        # Every file is named as the chosen one, changing the extension
+        base, ext = os.path.splitext(filename)
+        if ext[1:].lower() not in exts:
+            base = filename
         # Implement an Overwrite? dialog since the default one does not
         # check filename when default suffix extension has to be added
-        if os.path.exists(filename):
-            msg = _('A file named "%s" already exists. Do you want to'
-                    ' replace it?') % os.path.basename(filename)
-            ret_val = QMessageBox.question(self.parent, _('Overwrite'), msg)
-            if ret_val != QMessageBox.Yes:
-                return
-        if save_format == 'PNG':
-            conversions.eq2png(self.eq, dpi=size, bg=None,
-                               directory=self.temp_dir, png_fpath=filename,
-                               add_metadata=True)
-        elif save_format == 'PDF':
-            conversions.eq2pdf(self.eq, size, self.temp_dir, filename)
-        elif save_format == 'SVG':
-            conversions.eq2svg(self.eq, size, self.temp_dir, filename)
-        elif save_format == 'EPS':
-            conversions.eq2eps(self.eq, size, self.temp_dir, filename)
+        for ext in exts:
+            if os.path.exists(base + '.' + ext):
+                msg = _('A file named "%s" already exists. Do you want to'
+                        ' replace it?') % os.path.basename(base + '.' + ext)
+                ret_val = QMessageBox.question(self.parent, _('Overwrite'),
+                                               msg)
+                if ret_val != QMessageBox.Yes:
+                    return
+        conversions.eq2files(self.eq, base, sizes, self.temp_dir)
 
     def recover_prev_eq(self):
         """ Recover previous equation from the historial, if any """
@@ -0,0 +1,323 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Module to serialize equations in a compact way so they can be saved inside
+the metadata of images.
+
+The serialized equation is an ASCII string with the following structure:
+
+    VEQ<version>:<flags>:<payload in base64>
+
+flags is 'z' if the payload is compressed with zlib and '-' otherwise.
+Version 1 payload is a sequence of unsigned varints (LEB128) and strings
+(a varint with the length followed by the UTF-8 bytes):
+
+    number of entries of the table
+    entries of the table, each one starting by its kind:
+        0 (symbol): the string
+        1 (operator): n_args, latex_code and type_
+    number of elements of the equation
+    elements of the equation, as indices of the table (opcodes)
+
+Every different symbol or operator is written only once, no matter how many
+times it appears in the equation.
+
+Strings which do not start by the magic prefix are decoded as the JSON
+metadata used by previous versions of Visual Equation.
+"""
+import base64
+import binascii
+import json
+import sys
+import zlib
+
+from .symbols import utils
+
+MAGIC = "VEQ"
+VERSION = 1
+
+_SYMBOL = 0
+_OPERATOR = 1
+
+# Do not compress payloads smaller than this, zlib headers are not for free
+_COMPRESS_THRESHOLD = 128
+
+# Operators already seen by the decoders, so every equation shares the same
+# instances. Well-known operators are registered so they are preferred.
+_interned_ops = {}
+
+
+def intern_op(op):
+    """ Return the canonical instance of an operator equal to op. """
+    return _interned_ops.setdefault((op.n_args, op.latex_code, op.type_), op)
+
+
+for _op in (utils.JUXT, utils.REDIT, utils.LEDIT) \
+        + utils.INDEX_OPS + utils.OPINDEX_OPS:
+    intern_op(_op)
+
+
+def _write_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _write_str(buf, string):
+    data = string.encode('utf8')
+    _write_varint(buf, len(data))
+    buf += data
+
+
+def encode(eq, compress=True):
+    """
+    Return the string representing eq in the compact format.
+    If compress is True, the payload is compressed when it is worth it.
+    """
+    table = []
+    opcodes = {}
+    elements = []
+    for elem in eq:
+        if isinstance(elem, str):
+            key = (_SYMBOL, elem)
+        elif isinstance(elem, utils.Op):
+            key = (_OPERATOR, elem.n_args, elem.latex_code, elem.type_)
+        else:
+            raise ValueError("Unknown equation element: " + repr(elem))
+        if key not in opcodes:
+            opcodes[key] = len(table)
+            table.append(key)
+        elements.append(opcodes[key])
+
+    payload = bytearray()
+    _write_varint(payload, len(table))
+    for key in table:
+        _write_varint(payload, key[0])
+        if key[0] == _SYMBOL:
+            _write_str(payload, key[1])
+        else:
+            _write_varint(payload, key[1])
+            _write_str(payload, key[2])
+            _write_str(payload, key[3])
+    _write_varint(payload, len(elements))
+    for opcode in elements:
+        _write_varint(payload, opcode)
+
+    flags = '-'
+    payload = bytes(payload)
+    if compress and len(payload) >= _COMPRESS_THRESHOLD:
+        compressed = zlib.compress(payload, 9)
+        if len(compressed) < len(payload):
+            flags = 'z'
+            payload = compressed
+    return MAGIC + str(VERSION) + ':' + flags + ':' \
+           + base64.b64encode(payload).decode('ascii')
+
+
+def is_compact(eq_str):
+    """ Whether eq_str is written in the compact format. """
+    return eq_str.startswith(MAGIC)
+
+
+class _NeedMore(Exception):
+    """ Raised by the parser when the buffer ends in the middle of an item."""
+    pass
+
+
+class StreamDecoder:
+    """
+    Incremental decoder of the compact format.
+
+    Pieces of the serialized string can be passed to feed() as they are
+    read, so the equation is built while the file is still being scanned.
+    The whole string is never kept in memory. Call close() to get the
+    equation.
+    """
+
+    def __init__(self):
+        self.header = ''
+        self.b64_pending = ''
+        self.decompressor = None
+        self.buf = bytearray()
+        self.pos = 0
+        self.table = []
+        self.n_table = None
+        self.n_elements = None
+        self.eq = []
+        self.finished = False
+
+    def feed(self, text):
+        """ Process the next piece of the serialized string. """
+        if self.header is not None:
+            self.header += text
+            if self.header.count(':') < 2:
+                if len(self.header) > len(MAGIC) + 16:
+                    raise ValueError("Invalid header of serialized equation")
+                return
+            version, flags, text = self.header.split(':', 2)
+            self._check_header(version, flags)
+            self.header = None
+        # Only decode groups of 4 base64 characters, keep the rest
+        text = self.b64_pending + ''.join(text.split())
+        cut = len(text) - len(text) % 4
+        self.b64_pending = text[cut:]
+        try:
+            data = base64.b64decode(text[:cut], validate=True)
+        except binascii.Error as error:
+            raise ValueError("Invalid base64 payload: " + str(error))
+        self._feed_bytes(data)
+
+    def _check_header(self, version, flags):
+        if not version.startswith(MAGIC):
+            raise ValueError("Serialized equation does not start by "
+                             + MAGIC)
+        try:
+            version = int(version[len(MAGIC):])
+        except ValueError:
+            raise ValueError("Invalid version of serialized equation")
+        if version != VERSION:
+            raise ValueError("Unsupported version of serialized equation: "
+                             + str(version))
+        if flags == 'z':
+            self.decompressor = zlib.decompressobj()
+        elif flags != '-':
+            raise ValueError("Unknown flags of serialized equation: "
+                             + flags)
+
+    def _feed_bytes(self, data):
+        if self.decompressor is not None:
+            try:
+                data = self.decompressor.decompress(data)
+            except zlib.error as error:
+                raise ValueError("Invalid compressed payload: " + str(error))
+        self._consume(data)
+
+    def _consume(self, data):
+        if self.finished:
+            if data:
+                raise ValueError("Trailing data after serialized equation")
+            return
+        # Drop the bytes already consumed before appending new ones
+        del self.buf[:self.pos]
+        self.pos = 0
+        self.buf += data
+        self._parse()
+
+    def _read_varint(self):
+        value = 0
+        shift = 0
+        pos = self.pos
+        while True:
+            if pos >= len(self.buf):
+                raise _NeedMore
+            byte = self.buf[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                self.pos = pos
+                return value
+            shift += 7
+
+    def _read_str(self):
+        length = self._read_varint()
+        if self.pos + length > len(self.buf):
+            raise _NeedMore
+        data = bytes(self.buf[self.pos:self.pos + length])
+        self.pos += length
+        try:
+            return data.decode('utf8')
+        except UnicodeDecodeError as error:
+            raise ValueError("Invalid string in serialized equation: "
+                             + str(error))
+
+    def _read_entry(self):
+        kind = self._read_varint()
+        if kind == _SYMBOL:
+            return sys.intern(self._read_str())
+        elif kind == _OPERATOR:
+            n_args = self._read_varint()
+            latex_code = self._read_str()
+            type_ = self._read_str()
+            return intern_op(utils.Op(n_args, latex_code, type_))
+        else:
+            raise ValueError("Unknown kind of table entry: " + str(kind))
+
+    def _parse(self):
+        """ Parse as many items as possible. Incomplete items are kept. """
+        try:
+            if self.n_table is None:
+                self.n_table = self._read_varint()
+            while len(self.table) < self.n_table:
+                start = self.pos
+                try:
+                    self.table.append(self._read_entry())
+                except _NeedMore:
+                    self.pos = start
+                    raise
+            if self.n_elements is None:
+                self.n_elements = self._read_varint()
+            while len(self.eq) < self.n_elements:
+                opcode = self._read_varint()
+                if opcode >= len(self.table):
+                    raise ValueError("Invalid opcode in serialized equation: "
+                                     + str(opcode))
+                self.eq.append(self.table[opcode])
+            self.finished = True
+            if self.pos != len(self.buf):
+                raise ValueError("Trailing data after serialized equation")
+        except _NeedMore:
+            pass
+
+    def close(self):
+        """ Return the decoded equation. """
+        if self.header is not None:
+            raise ValueError("Incomplete header of serialized equation")
+        if self.b64_pending:
+            raise ValueError("Invalid length of base64 payload")
+        if self.decompressor is not None:
+            self._consume(self.decompressor.flush())
+            if not self.decompressor.eof:
+                raise ValueError("Compressed payload is truncated")
+        if not self.finished:
+            raise ValueError("Serialized equation is truncated")
+        if not self.eq:
+            raise ValueError("Serialized equation is empty")
+        return self.eq
+
+
+def _legacy_hook(json_o):
+    if isinstance(json_o, dict):
+        return intern_op(utils.Op(json_o['n_args'], json_o['latex_code'],
+                                  json_o['type_']))
+
+
+def decode(eq_str):
+    """
+    Return the equation represented by eq_str, written in the compact format
+    or in the legacy JSON format. ValueError is raised if it is not valid.
+    """
+    eq_str = eq_str.strip()
+    if is_compact(eq_str):
+        decoder = StreamDecoder()
+        decoder.feed(eq_str)
+        return decoder.close()
+    try:
+        eq = json.JSONDecoder(object_hook=_legacy_hook).decode(eq_str)
+    except (KeyError, TypeError) as error:
+        raise ValueError("Invalid element in JSON equation: " + str(error))
+    if not isinstance(eq, list) or not eq:
+        raise ValueError("JSON metadata is not an equation")
+    return [sys.intern(elem) if isinstance(elem, str) else elem
+            for elem in eq]
@@ -12,51 +12,78 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 """It manages the Qt interaction of the main equation with the user actions."""
-import os
-import random
-
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 
 from .symbols import utils
-from . import conversions
 from . import eq
+from . import timing
+from .errors import ShowError
+
+# Resolution of the image of the equation when it is dragged
+DRAG_DPI = 300
 
 
 class EqLabel(QLabel):
-    def __init__(self, temp_dir, parent):
+    def __init__(self, engine, parent):
         super().__init__(parent)
         self.parent = parent
-        self.eq = eq.Eq(temp_dir, self.setPixmap, parent)
+        self.eq = eq.Eq(engine, self.setPixmap, parent)
         self.setAcceptDrops(True)
+        # Position where the left button was pressed, if it is still down
+        self.drag_start = None
 
     def event(self, event):
         if event.type() == QEvent.KeyPress and event.key() == Qt.Key_Tab:
-            self.eq.eqsel.display_next()
+            with timing.span('keypress'):
+                self.eq.eqsel.display_next()
             # The True value prevents the event to be sent to other objects
             return True
         else:
             return QLabel.event(self, event)
 
-    #def mousePressEvent(self, event):
-    #    if event.button() == Qt.LeftButton:
-    #        self.eq.next_sel()
-    #    elif event.button() == Qt.RightButton:
-    #        self.eq.previous_sel()
-    #    else:
-    #        QLabel.mousePressEvent(self, event)
+    def mousePressEvent(self, event):
+        if event.button() != Qt.LeftButton:
+            QLabel.mousePressEvent(self, event)
+            return
+        self.drag_start = event.pos()
+        # Select the block under the cursor, if it is known
+        pixmap = self.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return
+        rect = QStyle.alignedRect(self.layoutDirection(), self.alignment(),
+                                  pixmap.size() / pixmap.devicePixelRatio(),
+                                  self.contentsRect())
+        index = self.eq.eqsel.index_at(event.x() - rect.x(),
+                                       event.y() - rect.y())
+        if index is not None:
+            self.eq.eqsel.index = index
+            self.eq.eqsel.display(right=True)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_start = None
+        QLabel.mouseReleaseEvent(self, event)
 
     def mouseMoveEvent(self, event):
-        if event.buttons() != Qt.LeftButton:
+        if event.buttons() != Qt.LeftButton or self.drag_start is None:
             return
+        # Small movements while clicking are not drags
+        if (event.pos() - self.drag_start).manhattanLength() \
+                < QApplication.startDragDistance():
+            return
+        self.drag_start = None
         self.setAcceptDrops(False)
-        base = "eq" + str(random.randint(0, 999999))
-        eq_png = conversions.eq2png(self.eq.eq, dpi=None, bg=None,
-                                    directory=self.eq.temp_dir,
-                                    png_fpath=os.path.join(self.eq.temp_dir,
-                                                           base +'.png'),
-                                    add_metadata=True)
+        # The image is generated once per version of the equation and
+        # removed with the rest of its files by the render cache
+        try:
+            eq_png = self.eq.eqsel.cache.tagged_png(self.eq.eq, DRAG_DPI)
+        except (OSError, ValueError) as error:
+            ShowError("Image of the equation could not be created: "
+                      + str(error), False)
+            self.setAcceptDrops(True)
+            return
         mimedata = QMimeData()
         mimedata.setImageData(QImage(eq_png)) # does not work for web browser
         #mimedata.setText(eq_png) # text-editor and console
@@ -68,15 +95,21 @@ class EqLabel(QLabel):
         self.setAcceptDrops(True)
 
     def keyPressEvent(self, event):
-        modifiers = QApplication.keyboardModifiers()
-        if modifiers == Qt.ControlModifier:
-            self.on_key_pressed_ctrl(event)
-        elif modifiers == Qt.ShiftModifier:
-            self.on_key_pressed_shift(event)
-        elif modifiers == Qt.AltModifier:
-            self.on_key_pressed_alt(event)
-        else:
-            self.on_standard_key_pressed(event)
+        # It includes rendering the new state of the equation
+        with timing.span('keypress'):
+            modifiers = QApplication.keyboardModifiers()
+            if modifiers == Qt.ControlModifier:
+                self.on_key_pressed_ctrl(event)
+            elif modifiers == Qt.ShiftModifier:
+                self.on_key_pressed_shift(event)
+            elif modifiers == Qt.AltModifier:
+                self.on_key_pressed_alt(event)
+            else:
+                self.on_standard_key_pressed(event)
+
+    def paintEvent(self, event):
+        with timing.span('paint'):
+            super().paintEvent(event)
 
     def on_standard_key_pressed(self, event):
         # 0-9 or A-Z or a-z excluding Ctr modifier
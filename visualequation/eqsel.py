@@ -11,13 +11,37 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import copy
+import math
+import functools
+import threading
+
+from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+try:
+    from PyQt5.QtSvg import QSvgRenderer
+except ImportError:
+    # Some distributions package QtSvg separately, vector display is
+    # optional
+    QSvgRenderer = None
 
 from . import eqtools
-from . import conversions
+from . import rendercache
+from . import runner
+from . import warmup
 from .symbols import utils
 from . import game
-from .errors import ShowError
+from . import timing
+from .errors import ShowError, ConversionError, CommandCancelled
+
+
+# Color of the ghost drawn over the selected block
+GHOST_COLOR = QColor(0, 120, 215)
+# Milliseconds without displays before rendering next states in background
+PREFETCH_DELAY = 300
+# Resolution of the previews displayed while the final image is rasterized
+PREVIEW_DPI = 100
 
 
 def get_valid_index(eq, idx, forward=True):
@@ -165,16 +189,63 @@ class ForwardIndices:
             return get_valid_index(eq, self.last_element_of_block + 1)
 
 
+def load_png(png_fpath):
+    """ Return the QPixmap of a PNG file. """
+    with timing.span('decode'):
+        return QPixmap(png_fpath)
+
+
+class _Notifier(QObject):
+    """ It passes to the GUI thread the results of worker threads. """
+    refined = pyqtSignal(int)
+
+
 class Selection:
-    def __init__(self, init_eq, init_index, temp_dir, setpixmap):
+    def __init__(self, init_eq, init_index, engine, setpixmap):
         self.eq = init_eq
         self.index = init_index
         self.right = True
         self.forward_indices = ForwardIndices()
         self.game = game.Game()
-        self.temp_dir = temp_dir
+        self.temp_dir = engine.temp_dir
         self.setpixmap = setpixmap
         self.dpi = 300
+        # The DVI of every displayed version is kept, so changing dpi
+        # (zooming) only rasterizes it again. It is shared by the windows.
+        self.cache = engine.cache
+        # In vector mode the equation is rendered once as SVG and painted
+        # by Qt, so zooming does not call any external program
+        self.vector = False
+        self.svg_key = None
+        self.svg_renderer = None
+        # Image of the marked equation on which the ghost is drawn:
+        # (key, dpi, vector), pixmap and origin of the pixmap in the DVI
+        self.marked_id = None
+        self.marked_pixmap = None
+        self.marked_origin = None
+        # Layout of the displayed equation, None if the ghost is rendered
+        self.marked_layout = None
+        # Images at high resolution are rasterized in background while a
+        # preview is displayed. Every job has a different generation.
+        self.refiner = engine.refiner
+        self.generation = 0
+        # It is set when the generation changes, killing the program run
+        # by the refine job of the previous one
+        self.cancel_refine = threading.Event()
+        # (key, dpi, frame) of the image being refined, and the image the
+        # current display wants refined with its equation
+        self.refining = None
+        self.wanted_refine = None
+        # (key, dpi, frame) of the last image which could not be refined,
+        # it is rendered in the GUI thread so errors are shown
+        self.failed_refine = None
+        self.notifier = _Notifier()
+        self.notifier.refined.connect(self.on_refined)
+        # When the user stops, render the states reachable with one key
+        self.prefetcher = engine.prefetcher
+        self.prefetch_timer = QTimer()
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.timeout.connect(self.prefetch)
 
     def display(self, eq=None, right=True):
         """
@@ -187,17 +258,336 @@ class Selection:
             self.eq = eq
         if not 0 <= self.index < len(self.eq):
             ShowError('Provided index outside the equation in display.', True)
+        self.right = right
+        # What the user asks for goes first
+        self.prefetch_timer.stop()
+        self.prefetcher.cancel(self)
+        self.wanted_refine = None
+        pixmap = None
+        if not game.Game.active:
+            pixmap = self.overlay_pixmap()
+        if pixmap is None:
+            pixmap = self.fallback_pixmap()
+        self.start_refine()
+        self.setpixmap(pixmap)
+        if not game.Game.active:
+            self.prefetch_timer.start(PREFETCH_DELAY)
+
+    def display_first(self, eq):
+        """
+        Display a placeholder and render eq in background, which also warms
+        up the TeX toolchain. eq is displayed when it is ready, unless
+        something else was displayed before.
+        """
+        self.eq = eq
+        self.refiner.cancel(self)
+        self.next_generation()
+        self.refining = None
+        self.setpixmap(self.placeholder_pixmap())
+        # The equation can change in the GUI thread, pass a copy
+        self.refiner.submit([functools.partial(
+            self.warm_up, eqtools.eq2latex_code_marked(self.eq),
+            self.fallback_eq(self.index, self.right), self.dpi,
+            self.generation)], self)
+
+    def next_generation(self):
+        """ Start a new job, the previous one is stale. """
+        self.generation += 1
+        self.cancel_refine.set()
+        self.cancel_refine = threading.Event()
+
+    def start_refine(self):
+        """
+        Refine in background the image wanted by the display, unless it is
+        being refined: displaying the same version again, as moving the
+        selection, does not start it from scratch. Any other refine is
+        stale and is killed.
+        """
+        if self.wanted_refine is None:
+            target = None
+        else:
+            target, eq = self.wanted_refine
+        if target == self.refining:
+            return
+        self.refiner.cancel(self)
+        self.next_generation()
+        self.refining = target
+        if target is not None:
+            ignored, dpi, frame = target
+            self.refiner.submit([functools.partial(
+                self.refine, eq, dpi, frame, self.generation,
+                self.cancel_refine)], self)
+
+    def warm_up(self, marked_code, fallback_eq, dpi, generation):
+        """ Job of the refiner: render the first display. """
+        try:
+            warmup.warm_up(self.cache, marked_code, fallback_eq, dpi)
+        finally:
+            # Even if it failed: display() will report the error
+            self.notifier.refined.emit(generation)
+
+    def placeholder_pixmap(self):
+        """ Return a pixmap with an ellipsis, of the size of a symbol. """
+        size = round(self.dpi / 6.)
+        pixmap = QPixmap(size, size)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setPen(qApp.palette().color(QPalette.Mid))
+        font = painter.font()
+        font.setPixelSize(size // 2)
+        painter.setFont(font)
+        painter.drawText(pixmap.rect(), Qt.AlignCenter, "...")
+        painter.end()
+        return pixmap
+
+    def close(self):
+        """ Stop the work in background, the equation is not displayed. """
+        self.prefetch_timer.stop()
+        self.prefetcher.cancel(self)
+        self.refiner.cancel(self)
+        self.cancel_refine.set()
+        self.notifier.refined.disconnect()
+
+    def fallback_eq(self, index, right):
+        """ Return the equation with the ghost at index as part of it. """
         eqsel = list(self.eq)
         if right:
-            self.right = True
-            eqsel.insert(self.index, utils.REDIT)
+            eqsel.insert(index, utils.REDIT)
         else:
-            self.right = False
-            eqsel.insert(self.index, utils.LEDIT)
+            eqsel.insert(index, utils.LEDIT)
+        return eqsel
 
+    def fallback_pixmap(self):
+        """ Return a pixmap of the equation rendered with the ghost. """
+        self.marked_layout = None
+        # An image of the overlay is not displayed
+        self.wanted_refine = None
+        eqsel = self.fallback_eq(self.index, self.right)
         self.game.update(eqsel)
-        eqsel_png = conversions.eq2png(eqsel, self.dpi, None, self.temp_dir)
-        self.setpixmap(QPixmap(eqsel_png))
+        if self.vector:
+            pixmap = self.svg_pixmap(eqsel)
+            if pixmap is not None:
+                return pixmap
+            ShowError('Equation could not be displayed as SVG.', False)
+            self.vector = False
+        pixmap, ignored = self.raster_pixmap(eqsel)
+        return pixmap
+
+    def raster_pixmap(self, eq, frame=None, previous=None):
+        """
+        Return a pixmap of eq at self.dpi and whether it is the final one.
+
+        If the PNG is not in the cache, a preview is returned: previous, a
+        (pixmap, dpi) pair of the same image, or the PNG at PREVIEW_DPI,
+        scaled to the right size. The PNG is rasterized in background from
+        the same DVI (see start_refine) and the equation is displayed again
+        when it is ready.
+        """
+        if game.Game.active \
+                or self.cache.has(eq, ('png', self.dpi, None, frame)) \
+                or (previous is None and self.dpi <= PREVIEW_DPI) \
+                or self.failed_refine == (rendercache.eq2key(eq), self.dpi,
+                                          frame):
+            return load_png(self.cache.png(eq, self.dpi, frame=frame)), True
+        if previous is None:
+            previous = (load_png(self.cache.png(eq, PREVIEW_DPI, frame=frame)),
+                        PREVIEW_DPI)
+        pixmap, dpi = previous
+        factor = self.dpi / dpi
+        preview = pixmap.scaled(round(pixmap.width() * factor),
+                                round(pixmap.height() * factor),
+                                Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        self.wanted_refine = ((rendercache.eq2key(eq), self.dpi, frame), eq)
+        return preview, False
+
+    def refine(self, eq, dpi, frame, generation, cancel):
+        """
+        Job of the refiner: rasterize the final PNG. dvipng is killed when
+        cancel is set.
+        """
+        try:
+            with runner.cancelled_by(cancel):
+                self.cache.png(eq, dpi, frame=frame, interactive=False)
+        except CommandCancelled:
+            pass
+        except ConversionError:
+            self.failed_refine = (rendercache.eq2key(eq), dpi, frame)
+        finally:
+            # Even if it failed: the preview is replaced
+            self.notifier.refined.emit(generation)
+
+    def on_refined(self, generation):
+        # Ignore it if another job was started meanwhile
+        if generation == self.generation:
+            self.refining = None
+            self.display(right=self.right)
+
+    def next_states(self):
+        """
+        Return the (index, right) pairs that TAB (or RIGHT), LEFT and
+        ALT+LEFT would display.
+        """
+        # Do not modify the state of the real one
+        forward_indices = copy.copy(self.forward_indices)
+        if self.right:
+            states = [(forward_indices.get_next_index(self.eq, self.index),
+                       True), (self.index, False)]
+        else:
+            prev_index = self.index - 1 if self.index else len(self.eq) - 1
+            states = [(self.index, True),
+                      (get_valid_index(self.eq, prev_index, False), False)]
+        surrounding = eqtools.surrounding_block_start(self.eq, self.index)
+        states.append((get_valid_index(self.eq, surrounding, False), True))
+        return states
+
+    def prefetch(self):
+        """
+        Render in background the next states which need the fallback render.
+        The rest are drawn from the current image without rendering.
+        """
+        jobs = []
+        for index, right in self.next_states():
+            if self.marked_layout is not None \
+                    and self.marked_layout.box(index) is not None:
+                continue
+            eqsel = self.fallback_eq(index, right)
+            if self.vector:
+                jobs.append(functools.partial(self.cache.svg, eqsel,
+                                              interactive=False))
+            else:
+                jobs.append(functools.partial(self.cache.png, eqsel, self.dpi,
+                                              interactive=False))
+        if jobs:
+            self.prefetcher.submit(jobs, self)
+
+    def set_vector(self, state):
+        """
+        Set whether to display the equation as SVG. Return whether it is
+        possible.
+        """
+        if state and QSvgRenderer is None:
+            ShowError('Module QtSvg of PyQt5 is needed for vector display.',
+                      False)
+            state = False
+        self.vector = state
+        self.svg_key = None
+        self.svg_renderer = None
+        return state
+
+    def svg_pixmap(self, eqsel):
+        """
+        Return a pixmap of eqsel painted from its SVG at self.dpi, taking
+        into account the pixel ratio of the screen. The SVG is only loaded
+        when eqsel changes. None is returned if SVG could not be generated.
+        """
+        key = rendercache.eq2key(eqsel)
+        if key != self.svg_key:
+            svg_fpath = self.cache.svg(eqsel)
+            if svg_fpath is None:
+                return None
+            with timing.span('decode'):
+                renderer = QSvgRenderer(svg_fpath)
+            if not renderer.isValid():
+                return None
+            self.svg_renderer = renderer
+            self.svg_key = key
+        viewbox = self.svg_renderer.viewBoxF()
+        ratio = qApp.devicePixelRatio()
+        # A unit of the SVG is 1/72 inch
+        factor = self.dpi / 72. * ratio
+        pixmap = QPixmap(math.ceil(viewbox.width() * factor),
+                         math.ceil(viewbox.height() * factor))
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        self.svg_renderer.render(painter)
+        painter.end()
+        pixmap.setDevicePixelRatio(ratio)
+        return pixmap
+
+    def overlay_pixmap(self):
+        """
+        Return a pixmap of the equation with the ghost drawn over the
+        selected block, or None if the position of the block is unknown.
+        The equation is compiled once per version, so moving the selection
+        does not call any external program.
+        """
+        latex_code = eqtools.eq2latex_code_marked(self.eq)
+        layout = self.cache.layout(latex_code)
+        if layout is None:
+            return None
+        box = layout.box(self.index)
+        if box is None:
+            return None
+        marked_id = (rendercache.eq2key(latex_code), self.dpi, self.vector)
+        if marked_id != self.marked_id:
+            if self.vector:
+                pixmap = self.svg_pixmap(latex_code)
+                if pixmap is None:
+                    return None
+                # SVG coordinates are big points from the origin of the DVI
+                viewbox = self.svg_renderer.viewBoxF()
+                origin = (viewbox.x() / 72., viewbox.y() / 72.)
+            else:
+                # The image of another zoom of this version is a preview
+                previous = None
+                if self.marked_id is not None \
+                        and self.marked_id[0] == marked_id[0] \
+                        and not self.marked_id[2]:
+                    previous = (self.marked_pixmap, self.marked_id[1])
+                pixmap, final = self.raster_pixmap(latex_code, layout.frame,
+                                                   previous)
+                if pixmap.isNull():
+                    return None
+                origin = layout.frame[:2]
+                if not final:
+                    marked_id += ('preview',)
+            self.marked_id = marked_id
+            self.marked_pixmap = pixmap
+            self.marked_origin = origin
+        self.marked_layout = layout
+        # The copy shares the data of the cached pixmap until it is painted
+        pixmap = QPixmap(self.marked_pixmap)
+        left, top, right, bottom = box
+        x0, y0 = self.marked_origin
+        # Logical pixels, even when the pixmap has a device pixel ratio
+        rect = QRectF((left - x0) * self.dpi, (top - y0) * self.dpi,
+                      (right - left) * self.dpi, (bottom - top) * self.dpi)
+        self.draw_ghost(pixmap, rect)
+        return pixmap
+
+    def index_at(self, x, y):
+        """
+        Return the index of the block displayed at (x, y), in logical pixels
+        of the current pixmap, or None if there is no block there or it is
+        not known.
+        """
+        if self.marked_layout is None:
+            return None
+        x0, y0 = self.marked_origin
+        return self.marked_layout.block_at(x / self.dpi + x0,
+                                           y / self.dpi + y0)
+
+    def draw_ghost(self, pixmap, rect):
+        """
+        Highlight rect in pixmap, with a bar in the side where the ghost
+        is looking.
+        """
+        margin = self.dpi / 144.
+        rect = rect.adjusted(-margin, -margin, margin, margin)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(rect, QColor(GHOST_COLOR.red(), GHOST_COLOR.green(),
+                                      GHOST_COLOR.blue(), 48))
+        painter.setPen(QPen(GHOST_COLOR, margin / 2.))
+        painter.drawRect(rect)
+        bar_width = 2 * margin
+        if self.right:
+            bar = QRectF(rect.right() - bar_width, rect.top(), bar_width,
+                         rect.height())
+        else:
+            bar = QRectF(rect.left(), rect.top(), bar_width, rect.height())
+        painter.fillRect(bar, GHOST_COLOR)
+        painter.end()
 
     def set_valid_index(self, eq=None, forward=True):
         """
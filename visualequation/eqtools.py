@@ -15,6 +15,8 @@
 Module to transform equations to latex code and getting information from or
 replacing equation blocks.
 """
+import re
+
 from .symbols import utils
 from .errors import ShowError
 
@@ -89,6 +91,75 @@ def eq2latex_code(eq):
     return latex
 
 
+MARK_START = r'\special{{ve:b {0}}}'
+MARK_END = r'\special{{ve:e {0}}}'
+_ENDS_WITH_MARKS = re.compile(r'(?:\\special\{ve:e \d+\})+$')
+# Accents are placed using the metrics of single characters, which would be
+# lost if their argument was surrounded by markers
+_ACCENTS = (r'\dot{', r'\ddot{', r'\dddot{', r'\acute{', r'\breve{',
+            r'\grave{', r'\tilde{', r'\bar{', r'\check{', r'\hat{', r'\vec{')
+
+
+def eq2latex_code_marked(eq):
+    """
+    Returns latex code of the equation where the code of every block that
+    can be selected is surrounded by \\special markers with its index, so
+    the position of the blocks can be read from the DVI (see dvilayout).
+    Markers do not modify how the equation looks.
+
+    Exceptions: the bases of index operators, which cannot be selected, and
+    a symbol which is the argument of an accent.
+    """
+
+    def block2latex(index, mark):
+        elem = eq[index]
+        if isinstance(elem, utils.Op):
+            is_index_op = elem.type_ in ('index', 'opindex')
+            is_accent = elem.latex_code.startswith(_ACCENTS)
+            index_of_arg = index + 1
+            latex_args = ()
+            base_marks = ''
+            for arg_i in range(elem.n_args):
+                arg = eq[index_of_arg]
+                if is_index_op and arg_i == 0:
+                    latex_arg, index_of_arg = block2latex(index_of_arg,
+                                                          False)
+                    # A script after a marker would not be attached to the
+                    # last element of the base, so the markers ending the
+                    # base are moved after the scripts
+                    if '{{{0}}}' not in elem.latex_code:
+                        match = _ENDS_WITH_MARKS.search(latex_arg)
+                        if match:
+                            base_marks = match.group()
+                            latex_arg = latex_arg[:match.start()]
+                else:
+                    # Intermediate JUXTs cannot be selected
+                    mark_arg = not (elem == utils.JUXT and arg == utils.JUXT
+                                    or is_accent and isinstance(arg, str))
+                    latex_arg, index_of_arg = block2latex(index_of_arg,
+                                                          mark_arg)
+                latex_args += (latex_arg,)
+            latex = elem(*latex_args) + base_marks
+            next_index = index_of_arg
+        elif isinstance(elem, str):
+            latex = elem
+            next_index = index + 1
+        else:
+            ShowError('Unknown equation element in eq2latex_code_marked: '
+                      + repr(elem), True)
+        if mark:
+            latex = MARK_START.format(index) + latex + MARK_END.format(index)
+        return latex, next_index
+
+    index = 0
+    latex = ''
+    while index < len(eq):
+        string, index = block2latex(index, True)
+        latex += string
+
+    return latex
+
+
 def insertrbyjuxt(eq, start_index, eqblock):
     """
     Insert eqblock after the block which starts at start_index by using Juxt.
@@ -15,9 +15,71 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 
 
+class ConversionError(Exception):
+    """ An external program failed when converting an equation. """
+    pass
+
+
+class CommandError(ConversionError):
+    """
+    An external program run by module runner did not do its work. Attribute
+    retry tells whether running it again could succeed.
+    """
+    retry = False
+
+
+class CommandNotFound(CommandError):
+    """ The program is not installed. """
+    pass
+
+
+class CommandFailed(CommandError):
+    """ The program exited with an error code. """
+    pass
+
+
+class CommandTimeout(CommandError):
+    """ The program did not finish in time and was killed. """
+    # It could be slow because of the load of the system
+    retry = True
+
+
+class CommandCancelled(CommandError):
+    """ The program was killed because its output was no longer needed. """
+    pass
+
+
+class CommandKilled(CommandError):
+    """
+    The program was killed by a signal, usually because it exceeded its
+    limit of CPU time.
+    """
+    pass
+
+
+class LatexError(CommandFailed):
+    """
+    latex could not compile an equation. It describes the first error of its
+    log: the message, the line of the LaTeX code of the equation and the
+    token where it was found (None if they are not known).
+    """
+
+    def __init__(self, message, line=None, token=None):
+        self.message = message
+        self.line = line
+        self.token = token
+        if line is None:
+            text = message
+        else:
+            text = "Line %d: %s" % (line, message)
+        if token is not None:
+            text += " (" + token + ")"
+        super().__init__(text)
+
+
 class ShowError(QMessageBox):
 
-    # It is modified in __main__.MainWindow
+    # It is modified in mainwindow.MainWindow
     default_parent = None
 
     def __init__(self, msg, exit_on_click, parent=None):
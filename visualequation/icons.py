@@ -0,0 +1,115 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to get the icons of the symbols.
+
+generate_icons.py packs the icons of every section of icons-def.ini in an
+atlas image and writes the position of each one in ATLAS_INDEX. An icon is
+cut from its atlas, which is read only once. Icons not found in the index
+are read from their own file.
+
+Icons are also generated at twice the size, with suffix @2x. They are used
+when the device pixel ratio of the screen is greater than 1, so Qt does not
+need to scale the icons.
+"""
+import os
+import json
+
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+
+from . import commons
+
+ATLAS_INDEX = os.path.join(commons.ICONS_DIR, 'atlas.json')
+# Device pixel ratios with their own icons, besides 1
+SCALES = (2,)
+
+# scale -> {tag -> [atlas file name, x, y, width, height]}
+_indices = {}
+# atlas file name -> QPixmap
+_atlases = {}
+# (tag, scale) -> QPixmap
+_pixmaps = {}
+
+
+def _suffix(scale):
+    return '' if scale == 1 else '@' + str(scale) + 'x'
+
+
+def _get_index(scale=1):
+    if scale not in _indices:
+        index_path = os.path.join(commons.ICONS_DIR,
+                                  'atlas' + _suffix(scale) + '.json')
+        try:
+            with open(index_path, "r") as findex:
+                _indices[scale] = json.load(findex)
+        except (OSError, ValueError):
+            _indices[scale] = {}
+    return _indices[scale]
+
+
+def _icon_path(tag, scale=1):
+    return os.path.join(commons.ICONS_DIR, tag + _suffix(scale) + ".png")
+
+
+def screen_scale():
+    """
+    Return the scale of the icons for the device pixel ratio of the
+    application: the smallest one not lower than the ratio.
+    """
+    app = QGuiApplication.instance()
+    ratio = app.devicePixelRatio() if app is not None else 1
+    if ratio <= 1:
+        return 1
+    for scale in SCALES:
+        if ratio <= scale:
+            return scale
+    return SCALES[-1]
+
+
+def exists(tag):
+    """ Return whether there is an icon for tag. """
+    return tag in _get_index() or os.path.exists(_icon_path(tag))
+
+
+def _load(tag, scale):
+    """ Return the QPixmap of an icon of a given scale or None. """
+    entry = _get_index(scale).get(tag)
+    if entry is None:
+        if scale != 1 and not os.path.exists(_icon_path(tag, scale)):
+            return None
+        return QPixmap(_icon_path(tag, scale))
+    atlas_name, x, y, width, height = entry
+    if atlas_name not in _atlases:
+        _atlases[atlas_name] = QPixmap(
+            os.path.join(commons.ICONS_DIR, atlas_name))
+    return _atlases[atlas_name].copy(x, y, width, height)
+
+
+def pixmap(tag):
+    """
+    Return the QPixmap of the icon of tag (null if it does not exist) for
+    the screen.
+    """
+    key = (tag, screen_scale())
+    if key not in _pixmaps:
+        scale = key[1]
+        icon = _load(tag, scale)
+        if icon is None:
+            # Icons of the scale were not generated
+            scale = 1
+            icon = _load(tag, scale)
+        icon.setDevicePixelRatio(scale)
+        _pixmaps[key] = icon
+    return _pixmaps[key]
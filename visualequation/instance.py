@@ -0,0 +1,127 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to keep a single running instance of the program per user.
+
+The first instance listens in a local socket. Later launches send it their
+arguments as a line of JSON and exit, so the running instance opens them
+with Qt, the icons and LaTeX already loaded.
+"""
+import os
+import json
+import getpass
+
+from PyQt5.QtCore import *
+try:
+    from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+except ImportError:
+    # Some distributions package QtNetwork separately, every launch is
+    # then a new instance
+    QLocalServer = QLocalSocket = None
+
+# Milliseconds to wait for the running instance
+TIMEOUT = 5000
+ACK = b'ok\n'
+
+
+def server_name():
+    """ Return the name of the socket, which is different for every user. """
+    try:
+        user = str(os.getuid())
+    except AttributeError:
+        user = getpass.getuser()
+    return "visualequation-" + user
+
+
+def send(message, name=None):
+    """
+    Send message, a dict which can be encoded as JSON, to the running
+    instance. Return whether it was received.
+    """
+    if QLocalSocket is None:
+        return False
+    socket = QLocalSocket()
+    socket.connectToServer(name or server_name())
+    if not socket.waitForConnected(TIMEOUT):
+        return False
+    socket.write(json.dumps(message).encode('utf8') + b'\n')
+    received = socket.waitForBytesWritten(TIMEOUT) \
+        and socket.waitForReadyRead(TIMEOUT) \
+        and bytes(socket.readAll()) == ACK
+    socket.disconnectFromServer()
+    return received
+
+
+class Server(QObject):
+    """
+    Receive the messages of later launches. Signal received is emitted with
+    every one of them.
+    """
+    received = pyqtSignal(dict)
+
+    def __init__(self, name=None, parent=None):
+        super().__init__(parent)
+        self.name = name or server_name()
+        self.server = None
+        # socket -> bytes received
+        self.buffers = {}
+
+    def listen(self):
+        """ Start listening. Return whether it was possible. """
+        if QLocalServer is None:
+            return False
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self.on_connection)
+        if self.server.listen(self.name):
+            return True
+        # Only remove the socket of an instance which did not finish
+        # properly, not the one of an instance which is running
+        socket = QLocalSocket()
+        socket.connectToServer(self.name)
+        if socket.waitForConnected(TIMEOUT):
+            socket.disconnectFromServer()
+            return False
+        if socket.error() not in (QLocalSocket.ConnectionRefusedError,
+                                  QLocalSocket.ServerNotFoundError):
+            return False
+        QLocalServer.removeServer(self.name)
+        return self.server.listen(self.name)
+
+    def on_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self.buffers[socket] = b''
+            socket.readyRead.connect(lambda socket=socket: self.on_read(socket))
+            socket.disconnected.connect(
+                lambda socket=socket: self.on_disconnected(socket))
+
+    def on_read(self, socket):
+        self.buffers[socket] += bytes(socket.readAll())
+        if not self.buffers[socket].endswith(b'\n'):
+            return
+        try:
+            message = json.loads(self.buffers[socket].decode('utf8'))
+        except ValueError:
+            message = None
+        self.buffers[socket] = b''
+        if isinstance(message, dict):
+            socket.write(ACK)
+            socket.flush()
+            self.received.emit(message)
+        else:
+            socket.disconnectFromServer()
+
+    def on_disconnected(self, socket):
+        self.buffers.pop(socket, None)
+        socket.deleteLater()
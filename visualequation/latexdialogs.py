@@ -13,8 +13,8 @@
 
 """ The module that manages the user interaction with LaTeX code."""
 
-import os
-import subprocess
+import functools
+import threading
 
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
@@ -22,7 +22,13 @@ from PyQt5.QtCore import *
 
 from . import eqtools
 from . import commons
-from . import conversions
+from . import runner
+from .errors import ConversionError, CommandCancelled
+
+# Resolution of the image of the block
+DPI = 300
+# Milliseconds without typing before the code is checked
+CHECK_DELAY = 400
 
 
 class ShowLatexDialog(QDialog):
@@ -87,20 +93,42 @@ class ShowLatexDialog(QDialog):
         return None
 
 
+class _Notifier(QObject):
+    """ It passes to the GUI thread the results of the worker thread. """
+    # generation, LaTeX code and error message ('' if it is valid)
+    checked = pyqtSignal(int, str, str)
+
+
 class EditLatexDialog(QDialog):
-    def __init__(self, latexblock, temp_dir, parent=None):
+    """
+    The code is checked in background when the user stops typing. Results
+    of every version, including errors, are kept by the render cache, so
+    going back to a previous version is checked immediately. The check of
+    a version which is no longer current is killed.
+    """
+
+    def __init__(self, latexblock, engine, parent=None):
         super().__init__(parent)
-        self.temp_dir = temp_dir
+        self.cache = engine.cache
+        self.checker = engine.checker
         self.setWindowTitle(_('Edit LaTeX code of selection'))
         self.resize(600, 600)
         self.setSizeGripEnabled(True)
         self.eqblock = QLabel(self)
         self.eqblock.setAlignment(Qt.AlignCenter)
-        eqblock_im = conversions.eq2png(latexblock, 300, None, self.temp_dir)
-        self.eqblock.setPixmap(QPixmap(eqblock_im))
+        self.eqblock.setPixmap(QPixmap(self.cache.png(latexblock, DPI)))
         self.scrollarea = QScrollArea(self)
         self.scrollarea.setWidget(self.eqblock)
         self.scrollarea.setWidgetResizable(True)
+        # Results of previous checks are ignored
+        self.generation = 0
+        # Set when the running check is stale
+        self.cancel_check = threading.Event()
+        self.notifier = _Notifier()
+        self.notifier.checked.connect(self.on_checked)
+        self.check_timer = QTimer(self)
+        self.check_timer.setSingleShot(True)
+        self.check_timer.timeout.connect(self.handlecheck)
 
         self.text = QTextEdit(self)
         self.text.insertPlainText(latexblock)
@@ -138,54 +166,89 @@ class EditLatexDialog(QDialog):
 
     def ontextchanged(self):
         self.buttons.button(QDialogButtonBox.Ok).setDisabled(True)
-        self.compilationmsg.setText(_('Press Check button when code is ready'))
+        # Results of the previous version are no longer displayed
+        self.next_generation()
+        self.checker.cancel(self)
         state = self.validator.validate(self.text.toPlainText(), 0)[0]
         if state != QValidator.Acceptable:
+            self.check_timer.stop()
             self.compilationmsg.setText(
                 _('LaTeX code contains invalid characters'))
             self.checkbutton.setDisabled(True)
         else:
+            self.compilationmsg.setText(_('Change LaTeX code as desired'))
             self.checkbutton.setEnabled(True)
+            self.check_timer.start(CHECK_DELAY)
+
+    def next_generation(self):
+        """ Start a new check, the previous one is stale. """
+        self.generation += 1
+        self.cancel_check.set()
+        self.cancel_check = threading.Event()
+
+    def latex_code(self):
+        """
+        Return the code without trailing new lines, a common source of
+        invisible errors.
+        """
+        return self.text.toPlainText().rstrip()
 
     def handlecheck(self):
-        self.compilationmsg.setText(_('Checking LaTeX code...'))
-        latex_file = os.path.join(self.temp_dir, "edit.tex")
-        # Remove trailing new lines, a common source of invisible errors
-        cursor = self.text.textCursor()
-        pos = cursor.position()
-        newtext = self.text.toPlainText().rstrip()
-        self.text.setPlainText(newtext)
-        if len(newtext) > pos:
-            cursor.setPosition(pos)
+        """ Check the code now, in background if it was not checked. """
+        self.check_timer.stop()
+        self.next_generation()
+        code = self.latex_code()
+        error = self.cache.error(code)
+        if error is not None:
+            self.on_checked(self.generation, code, str(error))
+        elif self.cache.has(code, ('png', DPI, None, None)):
+            self.on_checked(self.generation, code, '')
         else:
-            cursor.setPosition(len(newtext))
-        self.text.setTextCursor(cursor)
-        conversions.eq2latex_file(self.text.toPlainText(),
-                                  latex_file,
-                                  commons.LATEX_TEMPLATE)
+            self.compilationmsg.setText(_('Checking LaTeX code...'))
+            # A pending check of a previous version is discarded
+            self.checker.submit([functools.partial(
+                self.check, code, self.generation, self.cancel_check)], self)
+        self.text.setFocus()
+
+    def check(self, code, generation, cancel):
+        """
+        Job of the checker: compile the code. LaTeX is killed when cancel is
+        set.
+        """
         try:
-            subprocess.check_output(["latex", "-interaction=nonstopmode",
-                                     "-halt-on-error",
-                                     "-output-directory=" + self.temp_dir,
-                                     latex_file])
-        except subprocess.CalledProcessError as error:
-            self.compilationmsg.setText(_('LaTex code is not valid'))
-            self.text.setFocus()
+            with runner.cancelled_by(cancel):
+                self.cache.png(code, DPI, interactive=False)
+        except CommandCancelled:
+            # A newer version is being checked
             return
-        dvi_file = os.path.join(self.temp_dir, "edit.dvi")
-        dvi_log = os.path.join(self.temp_dir, "edit.log")
-        png_file = os.path.join(self.temp_dir, "edit.png")
-        conversions.dvi2png(dvi_file, png_file, dvi_log, 300, None)
-        self.eqblock.setPixmap(QPixmap(png_file))
+        except (ConversionError, OSError) as error:
+            self.notifier.checked.emit(generation, code, str(error))
+        else:
+            self.notifier.checked.emit(generation, code, '')
+
+    def on_checked(self, generation, code, error):
+        if generation != self.generation:
+            return
+        if error:
+            self.compilationmsg.setText(_('LaTex code is not valid') + ':\n'
+                                        + error)
+            return
+        self.eqblock.setPixmap(QPixmap(self.cache.png(code, DPI)))
         self.compilationmsg.setText(_('LaTex code is valid'))
         self.buttons.button(QDialogButtonBox.Ok).setEnabled(True)
-        self.text.setFocus()
+
+    def done(self, result):
+        self.check_timer.stop()
+        self.checker.cancel(self)
+        self.cancel_check.set()
+        self.notifier.checked.disconnect()
+        super().done(result)
 
     @staticmethod
-    def editlatex(latexblock, temp_dir, parent=None):
-        dialog = EditLatexDialog(latexblock, temp_dir, parent)
+    def editlatex(latexblock, engine, parent=None):
+        dialog = EditLatexDialog(latexblock, engine, parent)
         result = dialog.exec_()
         if result == QDialog.Accepted:
-            return dialog.text.toPlainText()
+            return dialog.latex_code()
         else:
             return None
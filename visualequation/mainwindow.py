@@ -0,0 +1,426 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+The main window of the program and the events loop of the instance which
+owns the windows.
+"""
+from . import startup
+import sys
+import functools
+import traceback
+
+from PyQt5.QtWidgets import *
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+startup.mark("import Qt")
+
+from . import commons
+from data.usage import getusage
+from . import symbolstab
+from . import eqlabel
+from . import eqtools
+from . import game
+from . import latexdialogs
+from . import scratch
+from . import instance
+from . import engine
+from . import timing
+from .errors import ShowError
+startup.mark("import program")
+
+# Milliseconds between checks of the space used by intermediate files
+SCRATCH_INTERVAL = 60000
+
+
+class MyScrollBar(QScrollBar):
+    """
+    Class to set focus in equation when moving the scroll bars.
+    It also moves the equation correctly when inserting new elements.
+    """
+
+    def __init__(self, orientation, parent=None):
+        super().__init__(orientation, parent)
+        self.equation = None
+        self.prev_max = None
+
+    def mouseReleaseEvent(self, event):
+        QScrollBar.mouseReleaseEvent(self, event)
+        self.equation.setFocus()
+
+    def setFocusTo(self, widget):
+        self.equation = widget
+
+    def sliderChange(self, change):
+        QScrollBar.sliderChange(self, change)
+        # Do not use/set prev_max vertically
+        if change == QAbstractSlider.SliderRangeChange and \
+                self.orientation() == Qt.Horizontal:
+            if self.prev_max is not None:
+                self.setValue(self.value() + self.maximum() - self.prev_max)
+            self.prev_max = self.maximum()
+
+
+class MyScrollArea(QScrollArea):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.vbar = MyScrollBar(Qt.Vertical, self)
+        self.hbar = MyScrollBar(Qt.Horizontal, self)
+        self.setVerticalScrollBar(self.vbar)
+        self.setHorizontalScrollBar(self.hbar)
+
+    def setWidget(self, widget):
+        QScrollArea.setWidget(self, widget)
+        self.vbar.setFocusTo(widget)
+        self.hbar.setFocusTo(widget)
+
+
+class MainWindow(QMainWindow):
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self.temp_dir = engine.temp_dir
+        ShowError.default_parent = self
+        self.init_center_widget()
+        self.statusBar()
+        self.init_menu()
+
+        self.setWindowTitle('Visual Equation')
+        self.setWindowIcon(QIcon(commons.ICON))
+        self.resize(900, 600)
+
+    def event(self, event):
+        # Errors are shown over the window being used
+        if event.type() == QEvent.WindowActivate:
+            ShowError.default_parent = self
+        return QMainWindow.event(self, event)
+
+    def closeEvent(self, event):
+        if ShowError.default_parent is self:
+            ShowError.default_parent = None
+        self.maineq.eq.eqsel.close()
+        QMainWindow.closeEvent(self, event)
+
+    def init_menu(self):
+        # File
+        new_act = QAction(_('&New'), self)
+        new_act.setShortcut('Ctrl+N')
+        new_act.setStatusTip(_('Create a new equation'))
+        new_act.triggered.connect(self.maineq.eq.new_eq)
+        open_act = QAction(_('&Open'), self)
+        open_act.setShortcut('Ctrl+O')
+        open_act.setStatusTip(_('Open equation from image'))
+        open_act.triggered.connect(self.maineq.eq.open_eq)
+        save_act = QAction(_('&Save'), self)
+        save_act.setShortcut('Ctrl+S')
+        save_act.setStatusTip(_('Save image'))
+        save_act.triggered.connect(self.maineq.eq.save_eq)
+        exit_act = QAction(_('&Exit'), self)
+        exit_act.setShortcut('Ctrl+Q')
+        exit_act.setStatusTip(_('Exit application'))
+        exit_act.triggered.connect(qApp.quit)
+        # Edit
+        undo_act = QAction(_('&Undo'), self)
+        undo_act.setShortcut('Ctrl+Z')
+        undo_act.setStatusTip(_('Return equation to previous state'))
+        undo_act.triggered.connect(self.maineq.eq.recover_prev_eq)
+        redo_act = QAction(_('&Redo'), self)
+        redo_act.setShortcut('Ctrl+Y')
+        redo_act.setStatusTip(_('Recover next equation state'))
+        redo_act.triggered.connect(self.maineq.eq.recover_next_eq)
+        copy_act = QAction(_('&Copy'), self)
+        copy_act.setShortcut('Ctrl+C')
+        copy_act.setStatusTip(_('Copy selection'))
+        copy_act.triggered.connect(self.maineq.eq.sel2eqbuffer)
+
+        def cut():
+            self.maineq.eq.sel2eqbuffer()
+            self.maineq.eq.remove_sel()
+
+        cut_act = QAction(_('C&ut'), self)
+        cut_act.setShortcut('Ctrl+X')
+        cut_act.setStatusTip(_('Cut selection'))
+        cut_act.triggered.connect(cut)
+        paste_act = QAction(_('&Paste'), self)
+        paste_act.setShortcut('Ctrl+V')
+        paste_act.setStatusTip(_('Paste previous cut or copied selection'))
+        paste_act.triggered.connect(self.maineq.eq.eqbuffer2sel)
+
+        def editlatex():
+            oldlatexcode = eqtools.eqblock2latex(self.maineq.eq.eq,
+                                                 self.maineq.eq.eqsel.index)[0]
+            newlatexcode = latexdialogs.EditLatexDialog.editlatex(
+                oldlatexcode, self.engine, self)
+            if newlatexcode:
+                self.maineq.eq.insert_substituting(newlatexcode)
+
+        editlatex_act = QAction(_('Edit &LaTeX block'), self)
+        editlatex_act.setStatusTip(_('Edit LaTeX code of selected block'))
+        editlatex_act.triggered.connect(editlatex)
+
+        def selectall():
+            self.maineq.eq.eqsel.index = 0
+            self.maineq.eq.eqsel.display()
+
+        selectall_act = QAction('&Select all', self)
+        selectall_act.setShortcut('Ctrl+A')
+        selectall_act.setStatusTip(_('Select the entire equation'))
+        selectall_act.triggered.connect(selectall)
+
+        # View
+        def zoomin():
+            if self.maineq.eq.eqsel.dpi < 1000:
+                self.maineq.eq.eqsel.dpi += 50
+                self.maineq.eq.eqsel.display(right=self.maineq.eq.eqsel.right)
+            else:
+                ShowError(_('Equation will no be increased.'), False)
+
+        zoomin_act = QAction(_('Zoom &In'), self)
+        zoomin_act.setShortcut('Ctrl++')
+        zoomin_act.setStatusTip(_('Increase size of the equation'))
+        zoomin_act.triggered.connect(zoomin)
+
+        def zoomout():
+            if self.maineq.eq.eqsel.dpi >= 100:
+                self.maineq.eq.eqsel.dpi -= 50
+                self.maineq.eq.eqsel.display(right=self.maineq.eq.eqsel.right)
+            else:
+                ShowError(_('Equation will no be decreased.'), False)
+
+        zoomout_act = QAction(_('Zoom &Out'), self)
+        zoomout_act.setShortcut('Ctrl+-')
+        zoomout_act.setStatusTip(_('Decrease size of the equation'))
+        zoomout_act.triggered.connect(zoomout)
+
+        def vector():
+            state = self.maineq.eq.eqsel.set_vector(vector_act.isChecked())
+            vector_act.setChecked(state)
+            self.maineq.eq.eqsel.display(right=self.maineq.eq.eqsel.right)
+
+        vector_act = QAction(_('&Vector display'), self, checkable=True)
+        vector_act.setStatusTip(_('Render the equation once as SVG so '
+                                  'zooming does not need to render it again'))
+        vector_act.triggered.connect(vector)
+
+        def showlatex():
+            latexdialogs.ShowLatexDialog.showlatex(self.maineq.eq, self)
+
+        showlatex_act = QAction(_('Show &LaTeX code'), self)
+        showlatex_act.setStatusTip(
+            _('Show the LaTeX code generating the equation'))
+        showlatex_act.triggered.connect(showlatex)
+
+        # Games
+        def alice():
+            state = activate_game_act.isChecked()
+            game.Game.activate(state)
+            self.maineq.eq.eqsel.display(self.maineq.eq.eq,
+                                         self.maineq.eq.eqsel.right)
+
+        activate_game_act = QAction(_('Invite &Alice'), self, checkable=True)
+        activate_game_act.triggered.connect(alice)
+        activate_game_act.setStatusTip(_('Let Alice to be with you while '
+                                         'building the equation'))
+        # Help
+        usage_act = QAction(_('&Usage'), self)
+        usage_act.setShortcut('Ctrl+H')
+        usage_act.setStatusTip(_('Usage of the program'))
+        usage_act.triggered.connect(self.usagedialog)
+        about_act = QAction(_('About &Visual Equation'), self)
+        about_act.triggered.connect(self.about)
+        about_qt_act = QAction(_('About &Qt'), self)
+        about_qt_act.triggered.connect(QApplication.aboutQt)
+
+        # Define menuBar
+        menubar = self.menuBar()
+        menubar.setNativeMenuBar(False)
+        file_menu = menubar.addMenu(_('&File'))
+        file_menu.addAction(new_act)
+        file_menu.addAction(open_act)
+        file_menu.addAction(save_act)
+        file_menu.addSeparator()
+        file_menu.addAction(exit_act)
+        edit_menu = menubar.addMenu(_('&Edit'))
+        edit_menu.addAction(undo_act)
+        edit_menu.addAction(redo_act)
+        edit_menu.addSeparator()
+        edit_menu.addAction(copy_act)
+        edit_menu.addAction(cut_act)
+        edit_menu.addAction(paste_act)
+        edit_menu.addSeparator()
+        edit_menu.addAction(editlatex_act)
+        edit_menu.addSeparator()
+        edit_menu.addAction(selectall_act)
+        view_menu = menubar.addMenu(_('&View'))
+        view_menu.addAction(zoomin_act)
+        view_menu.addAction(zoomout_act)
+        view_menu.addAction(vector_act)
+        view_menu.addSeparator()
+        view_menu.addAction(showlatex_act)
+        game_menu = menubar.addMenu(_('&Games'))
+        game_menu.addAction(activate_game_act)
+        help_menu = menubar.addMenu(_('&Help'))
+        help_menu.addAction(usage_act)
+        help_menu.addAction(about_qt_act)
+        help_menu.addAction(about_act)
+
+    def init_center_widget(self):
+        # Create central widget
+        central_widget = QWidget(self)
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout()
+        # Create the equation
+        self.maineq = eqlabel.EqLabel(self.engine, self)
+        startup.mark("placeholder")
+        self.maineq.setAlignment(Qt.AlignCenter)
+        self.scrollarea = MyScrollArea(self)
+        self.scrollarea.setWidget(self.maineq)
+        self.scrollarea.setWidgetResizable(True)
+        # Create the symbols TabWidget
+        self.tabs = symbolstab.TabWidget(self, self.maineq)
+        self.tabs.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        startup.mark("tab building")
+        # Add everything to the central widget
+        layout.addWidget(self.scrollarea)
+        layout.addWidget(self.tabs)
+        central_widget.setLayout(layout)
+        self.maineq.setFocus()
+
+    def usagedialog(self):
+        class Dialog(QDialog):
+            def __init__(self, parent=None):
+                super().__init__(parent)
+                self.setModal(False)
+                self.setWindowTitle(_('Usage'))
+                self.resize(1000, 600)
+                self.setSizeGripEnabled(True)
+                text = QTextEdit(self)
+                text.setReadOnly(True)
+                text.insertHtml(getusage())
+                text.moveCursor(QTextCursor.Start)
+                buttons = QDialogButtonBox(QDialogButtonBox.Ok, self)
+                vbox = QVBoxLayout(self)
+                vbox.addWidget(text)
+                vbox.addWidget(buttons)
+                buttons.accepted.connect(self.accept)
+
+        dialog = Dialog(self)
+        dialog.show()
+
+    def about(self):
+        msg = _("<p>Visual Equation</p>"
+                "<p><em>Version:</em> %s </p>"
+                "<p><em>Author:</em> Daniel Molina Garcia</P>"
+                '<p><em>Sources:</em> '
+                '<a href="https://github.com/daniel-molina/visualequation">'
+                "Webpage</a></p>"
+                "<p><em>License:</em> GPLv3 or above</p>") % commons.VERSION
+        QMessageBox.about(self, _("About"), msg)
+
+
+def run(args, files, single):
+    """
+    Open a window for every file and run the events loop until the last
+    window is closed. If single, listen to the later launches of the
+    program.
+    """
+    # Catch all exceptions by installing a global exception hook
+    # sys._excepthook = sys.excepthook
+    def exception_hook(exctype, value, traceback_error):
+        # sys._excepthook(exctype, value, traceback_error)
+        ShowError('Unhandled exception. Feel free to report this incident'
+                  ' with the following traceback code:\n\n'
+                  + str(value) + '\n\n'
+                  + ''.join(traceback.format_tb(traceback_error)),
+                  True)
+
+    sys.excepthook = exception_hook
+
+    # Use global for app to be destructed at the end
+    # http://pyqt.sourceforge.net/Docs/PyQt5/gotchas.html#crashes-on-exit
+    global app
+    # Icons have versions for screens with high density of pixels
+    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
+    app = QApplication(sys.argv)
+    startup.mark("application")
+
+    # Durations of the stages of displaying equations
+    profile_sink = timing.profile(args.profile)
+
+    # Prepare a temporal directory to manage all intermediate files, and
+    # the cache and threads shared by the windows
+    scratch_dir = scratch.Scratch()
+    shared = engine.Engine(scratch_dir)
+    startup.mark("scratch space")
+
+    # Windows are kept here until they are closed
+    windows = []
+
+    def collect_scratch():
+        """ Keep the intermediate files within their quota. """
+        freed = scratch_dir.collect()
+        if freed:
+            msg = _("Removed {} KiB of temporary files, {} KiB in use").format(
+                freed >> 10, scratch_dir.usage() >> 10)
+            for window in windows:
+                window.statusBar().showMessage(msg, 5000)
+
+    scratch_timer = QTimer()
+    scratch_timer.timeout.connect(collect_scratch)
+    scratch_timer.start(SCRATCH_INTERVAL)
+
+    def open_window(filename=None):
+        new_win = MainWindow(shared)
+        new_win.setAttribute(Qt.WA_DeleteOnClose)
+        new_win.destroyed.connect(functools.partial(windows.remove, new_win))
+        windows.append(new_win)
+        new_win.show()
+        # Build the symbols of hidden tabs once the window is on screen
+        QTimer.singleShot(symbolstab.WARM_DELAY, new_win.tabs.warm)
+        if filename:
+            new_win.maineq.eq.open_eq(filename)
+        return new_win
+
+    open_window(files[0] if files else None)
+    startup.mark("window")
+    for filename in files[1:]:
+        open_window(filename)
+
+    if single:
+        def on_message(message):
+            filenames = [filename for filename in message.get('files', [])
+                         if isinstance(filename, str)]
+            for filename in filenames or [None]:
+                new_win = open_window(filename)
+            new_win.raise_()
+            new_win.activateWindow()
+
+        server = instance.Server()
+        server.received.connect(on_message)
+        server.listen()
+
+    if args.profile_startup:
+        def report():
+            # Called when the events of showing the window are processed
+            startup.mark("show window")
+            startup.report()
+            app.quit()
+
+        QTimer.singleShot(0, report)
+
+    exit_code = app.exec_()
+    if profile_sink is not None:
+        timing.histograms.report()
+        profile_sink.close()
+    scratch_dir.remove()
+    sys.exit(exit_code)
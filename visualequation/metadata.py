@@ -0,0 +1,256 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to save equations inside PNG, SVG and EPS files and to recover
+them from every format exported by Visual Equation without external
+programs.
+
+Files are never parsed completely: only a bounded region where the
+equation is expected is scanned (the header of SVG and EPS files, the
+chunk headers of PNG files and the tail of PDF files, where exiftool
+appends its XMP packet).
+"""
+import os
+import re
+import struct
+import html
+import zlib
+
+from . import eqcodec
+
+# Maximum number of bytes scanned in a file looking for the equation
+SCAN_LIMIT = 1 << 20
+# Size of the pieces read at a time
+CHUNK_SIZE = 1 << 14
+
+SVG_NAMESPACE = "https://github.com/daniel-molina/visualequation"
+SVG_START_TAG = '<ve:equation xmlns:ve="' + SVG_NAMESPACE + '">'
+SVG_END_TAG = '</ve:equation>'
+
+EPS_KEYWORD = "%%VisualEquation: "
+EPS_CONTINUATION = "%%+ "
+# DSC forbids lines longer than 255 characters
+EPS_MAX_LINE = 255
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_KEYWORD = b'Description'
+XMP_KEYWORD = b'XML:com.adobe.xmp'
+
+_XMP_DESCRIPTION = re.compile(
+    rb'<dc:description>\s*<rdf:Alt>\s*<rdf:li[^>]*>(.*?)</rdf:li>', re.S)
+_SVG_DRAWING = re.compile(rb'<(defs|g|path|use)[\s>]')
+
+
+def _replace_file(fpath, content):
+    """ Write content into fpath atomically. """
+    temp_fpath = fpath + '.part'
+    with open(temp_fpath, "wb") as ftemp:
+        ftemp.write(content)
+    os.replace(temp_fpath, fpath)
+
+
+def add_to_png(png_fpath, eq_str):
+    """
+    Insert eq_str in a tEXt chunk with keyword Description just after the
+    header chunk, where exiftool would write it.
+    """
+    with open(png_fpath, "rb") as fpng:
+        content = fpng.read()
+    if not content.startswith(PNG_SIGNATURE) \
+            or content[len(PNG_SIGNATURE):len(PNG_SIGNATURE) + 8] \
+            != b'\0\0\0\rIHDR':
+        raise ValueError("File is not a PNG: " + png_fpath)
+    # Signature and IHDR chunk (length, type, 13 bytes of data and CRC)
+    end = len(PNG_SIGNATURE) + 25
+    data = PNG_KEYWORD + b'\0' + eq_str.encode('latin1')
+    chunk = struct.pack('>I', len(data)) + b'tEXt' + data \
+            + struct.pack('>I', zlib.crc32(b'tEXt' + data))
+    _replace_file(png_fpath, content[:end] + chunk + content[end:])
+
+
+def add_to_svg(svg_fpath, eq_str):
+    """
+    Insert eq_str in a <metadata> element just after the opening tag of
+    the root <svg> element.
+    """
+    with open(svg_fpath, "rb") as fsvg:
+        content = fsvg.read()
+    start = content.find(b'<svg')
+    end = content.find(b'>', start)
+    if start == -1 or end == -1:
+        raise ValueError("No <svg> element found in " + svg_fpath)
+    metadata = '\n<metadata>' + SVG_START_TAG + html.escape(eq_str) \
+               + SVG_END_TAG + '</metadata>'
+    _replace_file(svg_fpath, content[:end + 1] + metadata.encode('utf8')
+                  + content[end + 1:])
+
+
+def add_to_eps(eps_fpath, eq_str):
+    """
+    Insert eq_str in the header comments of an EPS file, using DSC
+    continuation lines if it is too long.
+    """
+    with open(eps_fpath, "rb") as feps:
+        content = feps.read()
+    end = content.find(b'%%EndComments')
+    if end == -1:
+        # The header finishes at the first line not being a comment
+        match = re.compile(rb'^[^%]', re.M).search(content)
+        if match is None:
+            raise ValueError("No DSC header found in " + eps_fpath)
+        end = match.start()
+    lines = []
+    width = EPS_MAX_LINE - len(EPS_KEYWORD)
+    lines.append(EPS_KEYWORD + eq_str[:width])
+    width = EPS_MAX_LINE - len(EPS_CONTINUATION)
+    for pos in range(EPS_MAX_LINE - len(EPS_KEYWORD), len(eq_str), width):
+        lines.append(EPS_CONTINUATION + eq_str[pos:pos + width])
+    comments = ''.join(line + '\n' for line in lines)
+    _replace_file(eps_fpath, content[:end] + comments.encode('ascii')
+                  + content[end:])
+
+
+def _read_chunks(fobj, limit=SCAN_LIMIT):
+    """ Yield pieces of fobj until limit bytes are read or EOF. """
+    read = 0
+    while read < limit:
+        chunk = fobj.read(min(CHUNK_SIZE, limit - read))
+        if not chunk:
+            return
+        read += len(chunk)
+        yield chunk
+
+
+def _decode_bytes(data):
+    """ Return the equation in data (str of the compact or legacy format)."""
+    try:
+        eq_str = data.decode('utf8')
+    except UnicodeDecodeError:
+        raise ValueError("Metadata is not valid UTF-8")
+    return eqcodec.decode(html.unescape(eq_str))
+
+
+def _eq_from_svg(fobj):
+    start_tag = SVG_START_TAG.encode('utf8')
+    end_tag = SVG_END_TAG.encode('utf8')
+    chunks = _read_chunks(fobj)
+    buf = b''
+    # <metadata> is written before any drawing element
+    for chunk in chunks:
+        buf += chunk
+        start = buf.find(start_tag)
+        if start != -1:
+            buf = buf[start + len(start_tag):]
+            break
+        if _SVG_DRAWING.search(buf):
+            return None
+        # Keep enough bytes to find a tag split between two chunks
+        buf = buf[-len(start_tag):]
+    else:
+        return None
+    while True:
+        end = buf.find(end_tag)
+        if end != -1:
+            return _decode_bytes(buf[:end])
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Equation inside SVG file is truncated")
+        buf += chunk
+
+
+def _eq_from_eps(fobj):
+    # Only the header comments are read
+    decoder = None
+    read = 0
+    while read < SCAN_LIMIT:
+        line = fobj.readline(EPS_MAX_LINE + 2)
+        read += len(line)
+        if not line.startswith(b'%') or line.startswith(b'%%EndComments'):
+            break
+        line = line.decode('ascii', 'replace').rstrip('\r\n')
+        if line.startswith(EPS_KEYWORD):
+            decoder = eqcodec.StreamDecoder()
+            decoder.feed(line[len(EPS_KEYWORD):])
+        elif decoder is not None:
+            if not line.startswith(EPS_CONTINUATION):
+                break
+            decoder.feed(line[len(EPS_CONTINUATION):])
+    if decoder is None:
+        return None
+    return decoder.close()
+
+
+def _eq_from_png(fobj):
+    # Walk the chunks skipping their content, but textual ones
+    fobj.seek(len(PNG_SIGNATURE))
+    while True:
+        header = fobj.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'IEND':
+            return None
+        if chunk_type not in (b'tEXt', b'iTXt') or length > SCAN_LIMIT:
+            fobj.seek(length + 4, os.SEEK_CUR)
+            continue
+        data = fobj.read(length)
+        fobj.seek(4, os.SEEK_CUR)
+        keyword, ignored, text = data.partition(b'\0')
+        if chunk_type == b'iTXt':
+            # Compression flag and method, language tag and translated
+            # keyword precede the text
+            if text[:1] != b'\0':
+                continue
+            text = text[2:].split(b'\0', 2)[-1]
+        if keyword == PNG_KEYWORD:
+            return _decode_bytes(text)
+        if keyword == XMP_KEYWORD:
+            match = _XMP_DESCRIPTION.search(text)
+            if match:
+                return _decode_bytes(match.group(1))
+
+
+def _eq_from_pdf(fobj):
+    # exiftool appends the metadata at the end of the file
+    fobj.seek(0, os.SEEK_END)
+    size = fobj.tell()
+    fobj.seek(max(0, size - SCAN_LIMIT))
+    # If the metadata was updated several times, the last one is valid
+    match = None
+    for match in _XMP_DESCRIPTION.finditer(fobj.read()):
+        pass
+    if match is None:
+        return None
+    return _decode_bytes(match.group(1))
+
+
+def read_eq(fpath):
+    """
+    Return the equation saved inside fpath or None if no equation is found.
+    Format is determined by the content of the file, not by its name.
+    ValueError is raised if the metadata cannot be decoded.
+    """
+    with open(fpath, "rb") as fobj:
+        head = fobj.read(len(PNG_SIGNATURE))
+        if head == PNG_SIGNATURE:
+            return _eq_from_png(fobj)
+        fobj.seek(0)
+        if head.startswith(b'%PDF'):
+            return _eq_from_pdf(fobj)
+        elif head.startswith(b'%!PS'):
+            return _eq_from_eps(fobj)
+        elif head.startswith(b'<?xml') or head.startswith(b'<svg'):
+            return _eq_from_svg(fobj)
+        else:
+            raise ValueError("Unknown format of file " + fpath)
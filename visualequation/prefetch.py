@@ -0,0 +1,116 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to render in the background the images that will probably be
+displayed next, so they are already in the render cache when needed.
+"""
+import os
+import threading
+import traceback
+import collections
+
+from . import runner
+from .errors import ConversionError, CommandError
+
+# Niceness of the worker thread and the programs it runs
+NICENESS = 19
+
+
+def lower_priority(niceness=NICENESS):
+    """
+    Lower the priority of the calling thread. On Linux, programs started
+    from it inherit the priority.
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        # Priorities of threads are not supported by every platform
+        pass
+
+
+class Prefetcher:
+    """
+    Worker thread running rendering jobs, at low priority by default.
+
+    A job is a function which is called without arguments and should store
+    its output in a cache. Nobody waits for it, so its errors are ignored
+    (unexpected ones are printed). A job failing with an error which could
+    go away, as a timeout under load (see CommandError.retry), is run
+    again once, after the other pending jobs.
+    Jobs are discarded as soon as a new batch is submitted or cancel() is
+    called by the same owner (any object, so several windows can share the
+    worker). The program run by a job of the owner already running is
+    killed (see runner.cancelled_by), so the worker is free at once.
+    """
+
+    def __init__(self, niceness=NICENESS):
+        self.niceness = niceness
+        # (owner, job, event, whether it is a retry) tuples
+        self.jobs = collections.deque()
+        # owner -> event set to kill the programs of its jobs
+        self.events = {}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def _discard(self, owner):
+        self.jobs = collections.deque(item for item in self.jobs
+                                      if item[0] is not owner)
+        event = self.events.pop(owner, None)
+        if event is not None:
+            event.set()
+
+    def submit(self, jobs, owner=None):
+        """ Replace the jobs of owner by the given ones. """
+        with self.condition:
+            self._discard(owner)
+            event = self.events[owner] = threading.Event()
+            self.jobs.extend((owner, job, event, False) for job in jobs)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._work,
+                                               name="prefetch", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def cancel(self, owner=None):
+        """ Discard the jobs of owner, killing the one running. """
+        with self.condition:
+            self._discard(owner)
+
+    def pending(self):
+        """ Return the number of jobs not started yet. """
+        with self.condition:
+            return len(self.jobs)
+
+    def _work(self):
+        if self.niceness:
+            lower_priority(self.niceness)
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                owner, job, event, retried = self.jobs.popleft()
+            try:
+                with runner.cancelled_by(event):
+                    job()
+            except CommandError as error:
+                if error.retry and not retried:
+                    with self.condition:
+                        # Unless the owner replaced its jobs meanwhile
+                        if self.events.get(owner) is event:
+                            self.jobs.append((owner, job, event, True))
+            except (ConversionError, OSError, ValueError):
+                pass
+            except Exception:
+                # A bug in a job must not stop the jobs of the session
+                traceback.print_exc()
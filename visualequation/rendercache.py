@@ -0,0 +1,282 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to keep the files generated when rendering equations, so they are
+not generated again when the same version of an equation is displayed.
+"""
+import os
+import glob
+import shutil
+import hashlib
+import threading
+import collections
+
+from . import commons
+from . import conversions
+from . import dvilayout
+from . import eqcodec
+from . import metadata
+from . import eqtools
+from .errors import ConversionError, LatexError, CommandKilled
+
+
+def eq2key(eq, latex_template=None):
+    """
+    Return the key identifying a version of an equation: a hash of its
+    LaTeX code and the template used to compile it.
+    """
+    if isinstance(eq, str):
+        latex_code = eq
+    else:
+        latex_code = eqtools.eq2latex_code(eq)
+    if latex_template is None:
+        latex_template = commons.LATEX_TEMPLATE
+    return hashlib.sha1((latex_template + '\0' + latex_code).encode(
+        'utf8')).hexdigest()[:20]
+
+
+class RenderCache:
+    """
+    Cache of the DVI files of equations and the images obtained from them.
+
+    A DVI is compiled only once per version of the equation. Images at
+    different resolutions are rasterized from that DVI, so zooming never
+    runs latex. When there are more than max_entries versions, the files of
+    the least recently used one are removed.
+
+    It can be used from several threads. Every output is generated by one
+    thread at a time, so a file is never generated twice, but other outputs
+    of the same version can be obtained meanwhile. Files are generated with
+    a temporary name and published when they are complete. Threads not
+    allowed to interact with the user must pass interactive=False, errors
+    raise then ConversionError.
+
+    Versions which latex cannot compile are cached too: their LatexError, or
+    CommandKilled if latex exceeded its limits, is raised again without
+    running latex when interactive is False. Timeouts are not cached.
+    """
+
+    def __init__(self, directory, max_entries=64):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.max_entries = max_entries
+        # key -> {output name: file path}
+        self.entries = collections.OrderedDict()
+        # It protects entries and output_locks
+        self.lock = threading.Lock()
+        # key -> {output name: lock held while that output is generated}
+        self.output_locks = {}
+
+    def _entry(self, key, name):
+        """
+        Return the entry of key, marking it as the most recently used, and
+        the lock to hold when generating its output name.
+        """
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                self.entries[key] = {}
+                self.output_locks[key] = {}
+                while len(self.entries) > self.max_entries:
+                    old_key, ignored = self.entries.popitem(last=False)
+                    del self.output_locks[old_key]
+                    self._remove_files(old_key)
+            locks = self.output_locks[key]
+            if name not in locks:
+                locks[name] = threading.Lock()
+            return self.entries[key], locks[name]
+
+    def _publish(self, entry, name, value, temp_fpath=None):
+        """
+        Store value as output name of entry. If temp_fpath is given, value
+        is a file path and temp_fpath is renamed to it; nothing is stored if
+        it does not exist (the program failed).
+        """
+        with self.lock:
+            if temp_fpath is not None:
+                if not os.path.exists(temp_fpath):
+                    return
+                os.replace(temp_fpath, value)
+            entry[name] = value
+
+    def _remove_files(self, key):
+        for fpath in glob.glob(os.path.join(self.directory, key + '*')):
+            try:
+                os.remove(fpath)
+            except OSError:
+                pass
+
+    def has(self, eq, name='dvi', latex_template=None):
+        """ Whether an output of the equation is in the cache. """
+        with self.lock:
+            entry = self.entries.get(eq2key(eq, latex_template))
+            return entry is not None and name in entry
+
+    def error(self, eq, latex_template=None):
+        """
+        Return the error of the equation if it could not be compiled, else
+        None.
+        """
+        with self.lock:
+            entry = self.entries.get(eq2key(eq, latex_template))
+            return None if entry is None else entry.get('error')
+
+    def dvi(self, eq, latex_template=None, interactive=True):
+        """
+        Return the path of the DVI of the equation. If it cannot be compiled,
+        the error is cached: it is raised, or shown if interactive is True
+        (the path returned does not exist then).
+        """
+        key = eq2key(eq, latex_template)
+        entry, output_lock = self._entry(key, 'dvi')
+        with output_lock:
+            if 'dvi' not in entry and 'error' not in entry:
+                try:
+                    dvi_fpath = conversions.eq2dvi(
+                        eq, self.directory, key, latex_template, interactive)
+                except (LatexError, CommandKilled) as error:
+                    self._publish(entry, 'error', error)
+                else:
+                    if not os.path.exists(dvi_fpath):
+                        # The error was shown by eq2dvi
+                        return dvi_fpath
+                    self._publish(entry, 'dvi', dvi_fpath)
+            if 'error' in entry:
+                if not interactive:
+                    raise entry['error']
+                conversions.show_latex_error(
+                    entry['error'], os.path.join(self.directory, key + '.tex'))
+                return os.path.join(self.directory, key + '.dvi')
+            return entry['dvi']
+
+    def png(self, eq, dpi, bg=None, latex_template=None, frame=None,
+            interactive=True):
+        """
+        Return the path of a PNG of the equation with the given resolution
+        and background. If frame is given, the PNG covers that region of
+        the DVI (see conversions.dvi2png).
+        """
+        key = eq2key(eq, latex_template)
+        name = ('png', dpi, bg, frame)
+        entry, output_lock = self._entry(key, name)
+        with output_lock:
+            if name not in entry:
+                fname = key + '_' + str(dpi) \
+                        + ('' if bg is None else '_' + bg) \
+                        + ('' if frame is None else '_f')
+                png_fpath = os.path.join(self.directory, fname + '.png')
+                dvi_fpath = self.dvi(eq, latex_template, interactive)
+                if not os.path.exists(dvi_fpath):
+                    return png_fpath
+                temp_fpath = os.path.join(self.directory, fname + '_part.png')
+                conversions.dvi2png(dvi_fpath, temp_fpath,
+                                    os.path.join(self.directory,
+                                                 fname + '_dvi2png.log'),
+                                    dpi, bg, frame, interactive)
+                self._publish(entry, name, png_fpath, temp_fpath)
+                if name not in entry:
+                    # The error was shown by dvi2png
+                    return png_fpath
+            return entry[name]
+
+    def tagged_png(self, eq, dpi, latex_template=None):
+        """
+        Return the path of a PNG of the equation which includes the
+        equation in its metadata, as the exported ones.
+        """
+        key = eq2key(eq, latex_template)
+        # Different equations can have the same LaTeX code, for example a
+        # block whose code was edited
+        eq_str = eqcodec.encode(eq)
+        eq_hash = hashlib.sha1(eq_str.encode('utf8')).hexdigest()[:10]
+        name = ('tagged_png', dpi, eq_hash)
+        entry, output_lock = self._entry(key, name)
+        with output_lock:
+            if name not in entry:
+                png_fpath = self.png(eq, dpi, latex_template=latex_template)
+                if not os.path.exists(png_fpath):
+                    return png_fpath
+                fname = key + '_' + str(dpi) + '_' + eq_hash
+                tagged_fpath = os.path.join(self.directory, fname + '.png')
+                temp_fpath = os.path.join(self.directory,
+                                          fname + '_part.png')
+                shutil.copyfile(png_fpath, temp_fpath)
+                metadata.add_to_png(temp_fpath, eq_str)
+                self._publish(entry, name, tagged_fpath, temp_fpath)
+            return entry[name]
+
+    def svg(self, eq, scale=1, latex_template=None, interactive=True):
+        """
+        Return the path of a SVG of the equation, None if it could not be
+        generated. With scale 1, a unit of the SVG is a big point (1/72
+        inch).
+        """
+        key = eq2key(eq, latex_template)
+        name = ('svg', scale)
+        entry, output_lock = self._entry(key, name)
+        with output_lock:
+            if name not in entry:
+                dvi_fpath = self.dvi(eq, latex_template, interactive)
+                if not os.path.exists(dvi_fpath):
+                    return None
+                fname = key + '_s' + str(scale)
+                temp_fpath = os.path.join(self.directory, fname + '_part.svg')
+                conversions.dvi2svg(dvi_fpath, temp_fpath,
+                                    os.path.join(self.directory,
+                                                 fname + '_dvi2svg.log'),
+                                    scale, interactive)
+                self._publish(entry, name,
+                              os.path.join(self.directory, fname + '.svg'),
+                              temp_fpath)
+            return entry.get(name)
+
+    def layout(self, eq, latex_template=None):
+        """
+        Return the dvilayout.Layout of an equation given as marked LaTeX
+        code (see eqtools.eq2latex_code_marked) or None if it cannot be
+        obtained. Errors are never shown: the equation can be displayed
+        without its layout.
+        """
+        key = eq2key(eq, latex_template)
+        entry, output_lock = self._entry(key, 'layout')
+        with output_lock:
+            if 'layout' not in entry:
+                try:
+                    dvi_fpath = self.dvi(eq, latex_template, False)
+                except ConversionError:
+                    # Compile errors are cached by dvi(), timeouts are
+                    # tried again
+                    return None
+                try:
+                    layout = dvilayout.read_layout(dvi_fpath)
+                except (ValueError, OSError):
+                    layout = None
+                self._publish(entry, 'layout', layout)
+            return entry['layout']
+
+    def files(self):
+        """ Return the paths of the outputs in the cache. """
+        with self.lock:
+            return [value for entry in self.entries.values()
+                    for value in entry.values() if isinstance(value, str)]
+
+    def clear(self):
+        """ Remove every file of the cache. """
+        with self.lock:
+            for key in self.entries:
+                self._remove_files(key)
+            self.entries.clear()
+            self.output_locks.clear()
@@ -0,0 +1,176 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to run the programs of the TeX toolchain, so malformed input which
+makes one of them loop cannot freeze Visual Equation.
+
+Every program runs in its own process group with a wall-clock timeout and,
+where module resource is available, limits of CPU time and memory. When the
+timeout expires, the whole group is killed, including the programs started
+by it (dvipng runs ghostscript, for example).
+
+A thread can also have the programs it runs killed when another thread sets
+an event, see cancelled_by().
+"""
+import os
+import time
+import signal
+import functools
+import threading
+import contextlib
+import subprocess
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, only the timeout is applied
+    resource = None
+
+from .errors import CommandNotFound, CommandFailed, CommandTimeout, \
+    CommandKilled, CommandCancelled
+
+# Seconds a program can run
+TIMEOUT = 30
+# Seconds of CPU a program can use
+CPU_LIMIT = 30
+# Bytes of memory a program can use
+MEMORY_LIMIT = 2 * 1024 ** 3
+# Seconds between checks of the cancel event
+CANCEL_POLL = 0.05
+
+# Attribute event: cancel event of the programs run by the thread
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def cancelled_by(event):
+    """
+    Make the programs run by this thread in the with statement be killed,
+    raising CommandCancelled, as soon as event (a threading.Event) is set.
+    """
+    previous = getattr(_local, 'event', None)
+    _local.event = event
+    try:
+        yield
+    finally:
+        _local.event = previous
+
+
+def _limits(cpu, memory):
+    """
+    Return the (resource, soft, hard) limits to set, without raising the
+    hard limits of this process (it is not allowed).
+    """
+    limits = []
+    for limit, value in ((resource.RLIMIT_CPU, cpu),
+                         (resource.RLIMIT_AS, memory)):
+        if value is None:
+            continue
+        ignored, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        limits.append((limit, value, hard))
+    return limits
+
+
+def _set_limits(limits):
+    # It runs in the child between fork and exec: do as little as possible
+    for limit, soft, hard in limits:
+        resource.setrlimit(limit, (soft, hard))
+
+
+def _kill(process):
+    """ Kill the process and its children, then wait for it. """
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except OSError:
+        # It already finished
+        pass
+    process.communicate()
+
+
+def _communicate(process, cmd, timeout):
+    """
+    Return the output of process like process.communicate(timeout), but
+    raising CommandCancelled if the cancel event of the thread is set.
+    """
+    event = getattr(_local, 'event', None)
+    if event is None:
+        return process.communicate(timeout=timeout)[0]
+    deadline = time.monotonic() + timeout
+    while True:
+        if event.is_set():
+            raise CommandCancelled("Command %s was cancelled." % cmd[0])
+        try:
+            return process.communicate(timeout=max(0, min(
+                CANCEL_POLL, deadline - time.monotonic())))[0]
+        except subprocess.TimeoutExpired:
+            if time.monotonic() >= deadline:
+                raise
+
+
+def run(cmd, log_fpath=None, check=True, timeout=TIMEOUT, cpu=CPU_LIMIT,
+        memory=MEMORY_LIMIT):
+    """
+    Run the program and arguments in list cmd.
+
+    If log_fpath is given, the output of the program is written there and
+    None is returned, else its standard output is returned as bytes.
+    Limits are disabled passing None. Errors raise a CommandError: a
+    non-zero exit code raises CommandFailed only if check is True.
+    """
+    event = getattr(_local, 'event', None)
+    if event is not None and event.is_set():
+        raise CommandCancelled("Command %s was cancelled." % cmd[0])
+    options = {}
+    if os.name == 'posix':
+        options['start_new_session'] = True
+        if resource is not None:
+            options['preexec_fn'] = functools.partial(_set_limits,
+                                                      _limits(cpu, memory))
+    flog = None
+    if log_fpath is None:
+        options['stdout'] = subprocess.PIPE
+    else:
+        flog = open(log_fpath, "w")
+        options['stdout'] = flog
+        options['stderr'] = subprocess.STDOUT
+    try:
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                                       **options)
+        except OSError:
+            raise CommandNotFound("Command %s was not found." % cmd[0])
+        try:
+            output = _communicate(process, cmd, timeout)
+        except subprocess.TimeoutExpired:
+            _kill(process)
+            raise CommandTimeout("Command %s did not finish in %s seconds."
+                                 % (cmd[0], timeout))
+        except BaseException:
+            _kill(process)
+            raise
+    finally:
+        if flog is not None:
+            flog.close()
+    details = "" if log_fpath is None else " Read %s for details." % log_fpath
+    if process.returncode < 0:
+        raise CommandKilled("Command %s was killed by signal %d, it could "
+                            "exceed its limit of CPU or memory.%s"
+                            % (cmd[0], -process.returncode, details))
+    if check and process.returncode:
+        raise CommandFailed("Command %s failed.%s" % (cmd[0], details))
+    return output
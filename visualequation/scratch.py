@@ -0,0 +1,180 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to manage the directory where intermediate files are written.
+"""
+import os
+import time
+import shutil
+import tempfile
+try:
+    import fcntl
+except ImportError:
+    # Without locks, directories of other sessions are never removed
+    fcntl = None
+
+# Memory filesystem preferred for the intermediate files
+SHM_DIR = "/dev/shm"
+# Maximum number of bytes of intermediate files kept
+QUOTA = 64 << 20
+# Files modified in the last seconds are never removed: they can be
+# being written by another thread
+GRACE = 10
+PREFIX = "visualequation-"
+# File of every directory locked by its session while it runs
+LOCK_FNAME = ".lock"
+
+
+def _lock(dirpath):
+    """
+    Return an open file of the lock of dirpath if it could be locked, else
+    None. The lock is held until the file is closed.
+    """
+    try:
+        lock_file = open(os.path.join(dirpath, LOCK_FNAME), "a")
+    except OSError:
+        return None
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _remove_stale_dirs(base_dir):
+    """
+    Remove directories left by sessions which were not closed, which are
+    the ones whose lock is not held. A PID cannot be used to know it: the
+    session can run in another PID namespace sharing base_dir.
+    """
+    if fcntl is None:
+        return
+    try:
+        names = os.listdir(base_dir)
+    except OSError:
+        return
+    limit = time.time() - GRACE
+    for name in names:
+        dirpath = os.path.join(base_dir, name)
+        if not name.startswith(PREFIX) or not os.path.isdir(dirpath):
+            continue
+        if not os.path.exists(os.path.join(dirpath, LOCK_FNAME)):
+            # A session which is starting has not created the lock yet
+            try:
+                if os.path.getmtime(dirpath) > limit:
+                    continue
+            except OSError:
+                continue
+        lock_file = _lock(dirpath)
+        if lock_file is not None:
+            shutil.rmtree(dirpath, ignore_errors=True)
+            lock_file.close()
+
+
+def _choose_base_dir(quota):
+    """
+    Return SHM_DIR if it can be used for a session with the given quota,
+    else None (the default directory of tempfile).
+    """
+    try:
+        if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+            stat = os.statvfs(SHM_DIR)
+            if stat.f_bavail * stat.f_frsize >= 2 * quota:
+                return SHM_DIR
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+class Scratch:
+    """
+    Directory of the intermediate files of a session.
+
+    It is created in SHM_DIR if there is enough space, so LaTeX and the
+    converters do not touch the disk. collect() removes the least recently
+    used files when they take more than quota bytes, except the ones
+    reported by the functions passed to add_pins().
+    """
+
+    def __init__(self, quota=QUOTA, base_dir=False):
+        self.quota = quota
+        if base_dir is False:
+            base_dir = _choose_base_dir(quota)
+        _remove_stale_dirs(base_dir or tempfile.gettempdir())
+        self.path = tempfile.mkdtemp(prefix=PREFIX + str(os.getpid()) + '-',
+                                     dir=base_dir)
+        # Other sessions do not remove the directory while it is held
+        self.lock_file = _lock(self.path) if fcntl is not None else None
+        self.pin_sources = []
+
+    def add_pins(self, pin_source):
+        """
+        Register a function returning the paths of files that must not be
+        removed by collect().
+        """
+        self.pin_sources.append(pin_source)
+
+    def _files(self):
+        """ Return a list of (last use, size, path) of every file. """
+        files = []
+        for dirpath, ignored, fnames in os.walk(self.path):
+            for fname in fnames:
+                if dirpath == self.path and fname == LOCK_FNAME:
+                    continue
+                fpath = os.path.join(dirpath, fname)
+                try:
+                    stat = os.stat(fpath)
+                except OSError:
+                    continue
+                files.append((max(stat.st_atime, stat.st_mtime),
+                              stat.st_size, fpath))
+        return files
+
+    def usage(self):
+        """ Return the number of bytes used by the files. """
+        return sum(size for ignored, size, ignored2 in self._files())
+
+    def collect(self):
+        """
+        Remove files, least recently used first, until they fit in the
+        quota. Return the number of bytes freed.
+        """
+        files = self._files()
+        used = sum(size for ignored, size, ignored2 in files)
+        if used <= self.quota:
+            return 0
+        pinned = set()
+        for pin_source in self.pin_sources:
+            pinned.update(os.path.abspath(fpath) for fpath in pin_source())
+        limit = time.time() - GRACE
+        freed = 0
+        for last_use, size, fpath in sorted(files):
+            if used - freed <= self.quota or last_use > limit:
+                break
+            if os.path.abspath(fpath) in pinned:
+                continue
+            try:
+                os.remove(fpath)
+            except OSError:
+                continue
+            freed += size
+        return freed
+
+    def remove(self):
+        """ Remove the directory with everything inside. """
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
@@ -0,0 +1,45 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to measure the time spent in every phase of the start of the
+program. Time is counted since this module is imported, which should be
+done first.
+"""
+import sys
+import time
+
+_last = _start = time.perf_counter()
+# List of (name, seconds) of the phases finished
+phases = []
+
+
+def mark(name):
+    """ Record that the phase name, started with the previous one, ended. """
+    global _last
+    now = time.perf_counter()
+    phases.append((name, now - _last))
+    _last = now
+
+
+def total():
+    """ Return the seconds elapsed until the last phase ended. """
+    return _last - _start
+
+
+def report(stream=sys.stderr):
+    """ Write the duration of every phase and the total. """
+    for name, seconds in phases:
+        stream.write("%-20s %8.3f s\n" % (name, seconds))
+    stream.write("%-20s %8.3f s\n" % ("total", total()))
+    stream.flush()
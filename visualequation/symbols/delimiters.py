@@ -54,8 +54,7 @@ def free_delimiters(parent):
             button_l = QPushButton(_('Choose'))
             button_l.clicked.connect(self.handle_click_l)
             self.repr_l = QLabel('')
-            self.repr_l.setPixmap(QPixmap(os.path.join(
-                commons.ICONS_DIR, self.symb_l.tag + ".png")))
+            self.repr_l.setPixmap(icons.pixmap(self.symb_l.tag))
             self.repr_l.setAlignment(Qt.AlignCenter)
             hbox_l.addWidget(button_l)
             hbox_l.addWidget(self.repr_l)
@@ -66,8 +65,7 @@ def free_delimiters(parent):
             button_r = QPushButton(_('Choose'))
             button_r.clicked.connect(self.handle_click_r)
             self.repr_r = QLabel('')
-            self.repr_r.setPixmap(QPixmap(os.path.join(
-                commons.ICONS_DIR, self.symb_r.tag + ".png")))
+            self.repr_r.setPixmap(icons.pixmap(self.symb_r.tag))
             self.repr_r.setAlignment(Qt.AlignCenter)
             hbox_r.addWidget(button_r)
             hbox_r.addWidget(self.repr_r)
@@ -91,8 +89,7 @@ def free_delimiters(parent):
             result = dialog.exec_()
             if result == QDialog.Accepted:
                 self.symb_l = dialog.symb_chosen
-                self.repr_l.setPixmap(QPixmap(os.path.join(
-                    commons.ICONS_DIR, self.symb_l.tag + ".png")))
+                self.repr_l.setPixmap(icons.pixmap(self.symb_l.tag))
 
         def handle_click_r(self):
             dialog = ChooseSymbDialog(self, _("Right delimiter"),
@@ -100,8 +97,7 @@ def free_delimiters(parent):
             result = dialog.exec_()
             if result == QDialog.Accepted:
                 self.symb_r = dialog.symb_chosen
-                self.repr_r.setPixmap(QPixmap(os.path.join(
-                    commons.ICONS_DIR, self.symb_r.tag + ".png")))
+                self.repr_r.setPixmap(icons.pixmap(self.symb_r.tag))
 
         @staticmethod
         def get_delimiter(parent=None):
@@ -45,8 +45,7 @@ def matrix_type(parent):
             button_type = QPushButton(_('Choose'))
             button_type.clicked.connect(self.handle_click)
             self.repr_type = QLabel('')
-            self.repr_type.setPixmap(QPixmap(os.path.join(
-                commons.ICONS_DIR, self.symb.tag + ".png")))
+            self.repr_type.setPixmap(icons.pixmap(self.symb.tag))
             self.repr_type.setAlignment(Qt.AlignCenter)
             hbox_type.addWidget(button_type)
             hbox_type.addWidget(self.repr_type)
@@ -75,8 +74,7 @@ def matrix_type(parent):
             result = dialog.exec_()
             if result == QDialog.Accepted:
                 self.symb = dialog.symb_chosen
-                self.repr_type.setPixmap(QPixmap(os.path.join(
-                    commons.ICONS_DIR, self.symb.tag + ".png")))
+                self.repr_type.setPixmap(icons.pixmap(self.symb.tag))
 
         def check_state(self, *args, **kargs):
             state1 = self.validator.validate(self.ledit_rows.text(), 0)[0]
@@ -133,8 +131,7 @@ def array(parent):
             button_l = QPushButton(_('Choose'))
             button_l.clicked.connect(self.handle_click_l)
             self.repr_l = QLabel('')
-            self.repr_l.setPixmap(QPixmap(os.path.join(
-                commons.ICONS_DIR, self.symb_l.tag + ".png")))
+            self.repr_l.setPixmap(icons.pixmap(self.symb_l.tag))
             self.repr_l.setAlignment(Qt.AlignCenter)
             hbox_l.addWidget(button_l)
             hbox_l.addWidget(self.repr_l)
@@ -145,8 +142,7 @@ def array(parent):
             button_r = QPushButton(_('Choose'))
             button_r.clicked.connect(self.handle_click_r)
             self.repr_r = QLabel('')
-            self.repr_r.setPixmap(QPixmap(os.path.join(
-                commons.ICONS_DIR, self.symb_r.tag + ".png")))
+            self.repr_r.setPixmap(icons.pixmap(self.symb_r.tag))
             self.repr_r.setAlignment(Qt.AlignCenter)
             hbox_r.addWidget(button_r)
             hbox_r.addWidget(self.repr_r)
@@ -182,8 +178,7 @@ def array(parent):
             result = dialog.exec_()
             if result == QDialog.Accepted:
                 self.symb_l = dialog.symb_chosen
-                self.repr_l.setPixmap(QPixmap(os.path.join(
-                    commons.ICONS_DIR, self.symb_l.tag + ".png")))
+                self.repr_l.setPixmap(icons.pixmap(self.symb_l.tag))
 
         def handle_click_r(self):
             dialog = ChooseSymbDialog(self, _("Right delimiter"),
@@ -191,8 +186,7 @@ def array(parent):
             result = dialog.exec_()
             if result == QDialog.Accepted:
                 self.symb_r = dialog.symb_chosen
-                self.repr_r.setPixmap(QPixmap(os.path.join(
-                    commons.ICONS_DIR, self.symb_r.tag + ".png")))
+                self.repr_r.setPixmap(icons.pixmap(self.symb_r.tag))
 
         def check_state(self, *args, **kargs):
             state1 = self.validator.validate(self.ledit_rows.text(), 0)[0]
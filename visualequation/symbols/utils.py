@@ -22,6 +22,7 @@ from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 
 from .. import commons
+from .. import icons
 
 
 class Op(object):
@@ -97,8 +98,7 @@ class Symb(QLabel):
         super().__init__('')
         self.parent = parent
         self.symb = symb
-        self.setPixmap(QPixmap(os.path.join(commons.ICONS_DIR,
-                                            symb.tag + ".png")))
+        self.setPixmap(icons.pixmap(symb.tag))
         self.setAlignment(Qt.AlignCenter)
 
     def mousePressEvent(self, event):
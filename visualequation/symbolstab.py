@@ -15,54 +15,74 @@
 Module to manage the menu of Visual Equation and the distribution of the
 symbols in the above panel.
 """
-import os
-
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 
 from .symbols import lists
-from . import commons
+from . import icons
 from .errors import ShowError
 
 
+# Milliseconds after the window is shown to start building the hidden tabs
+WARM_DELAY = 500
+
+
 class TabWidget(QTabWidget):
+    """
+    Tabs with the symbols of lists.MENUITEMSDATA.
+
+    The labels of a tab are created when it is shown for the first time.
+    warm() creates the remaining ones in the background, one tab per pass of
+    the event loop, so they do not delay the first paint of the window.
+    """
+
     def __init__(self, parent, maineq):
         super().__init__(parent)
 
         self.maineq = maineq
         self.tabs = []
+        self.built = [False] * len(lists.MENUITEMSDATA)
+        self.setIconSize(QSize(50, 30))
         for index, menuitemdata in enumerate(lists.MENUITEMSDATA):
             self.tabs.append(QWidget())
-            icon_path = os.path.join(commons.ICONS_DIR,
-                                     menuitemdata.tag + ".png")
-            if not os.path.exists(icon_path):
+            if not icons.exists(menuitemdata.tag):
                 ShowError("Icon " + menuitemdata.tag + " not found.", True)
-            icon = QIcon(icon_path)
-            self.setIconSize(QSize(50, 30))
+            icon = QIcon(icons.pixmap(menuitemdata.tag))
             self.addTab(self.tabs[index], icon, "")
             #self.setTabToolTip(index, "Hello")
             #self.setTabWhatsThis(index, "Hello")
-            layout = QGridLayout(self)
-            row = 0
-            column = 0
-            for symb in menuitemdata.symb_l:
-                label = QLabel('')
-                icon_path = os.path.join(commons.ICONS_DIR, symb.tag + ".png")
-                if not os.path.exists(icon_path):
-                    ShowError("Icon " + symb.tag + " not found.", True)
-                label.setPixmap(QPixmap(icon_path))
-                cmd = lambda state, code=symb.code: \
-                      self.handle_click(state, code)
-                label.mousePressEvent = cmd
-                layout.addWidget(label, row, column)
-                label.setAlignment(Qt.AlignCenter)
-                column += 1
-                if column > 9:
-                    column = 0
-                    row += 1
-             
-            self.tabs[index].setLayout(layout)
+        self.currentChanged.connect(self.build_tab)
+        self.build_tab(self.currentIndex())
+
+    def build_tab(self, index):
+        """ Create the labels of a tab if it was not done before. """
+        if index < 0 or self.built[index]:
+            return
+        self.built[index] = True
+        layout = QGridLayout(self.tabs[index])
+        row = 0
+        column = 0
+        for symb in lists.MENUITEMSDATA[index].symb_l:
+            label = QLabel('')
+            if not icons.exists(symb.tag):
+                ShowError("Icon " + symb.tag + " not found.", True)
+            label.setPixmap(icons.pixmap(symb.tag))
+            cmd = lambda state, code=symb.code: \
+                  self.handle_click(state, code)
+            label.mousePressEvent = cmd
+            layout.addWidget(label, row, column)
+            label.setAlignment(Qt.AlignCenter)
+            column += 1
+            if column > 9:
+                column = 0
+                row += 1
+
+    def warm(self):
+        """ Build the next tab not built yet and schedule the following. """
+        if False in self.built:
+            self.build_tab(self.built.index(False))
+            QTimer.singleShot(0, self.warm)
 
     def handle_click(self, event, code):
         modifiers = QApplication.keyboardModifiers()
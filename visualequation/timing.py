@@ -0,0 +1,180 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to measure the time spent in every stage of displaying an
+equation: keypress, serialize, write, compile, rasterize, decode and paint.
+
+A stage is measured with span(name). Its duration is passed to every
+collector, an object with a method add(name, seconds, background) which can
+be called from any thread. Spans measured out of the main thread, as the
+renders of the workers, are background: nobody is waiting for them, so
+they are counted apart from the ones the user waits for. By default,
+durations are only counted in histograms. A file given by the environment
+variable VISUALEQUATION_PROFILE or the option --profile receives every
+duration as a line of JSON.
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+import contextlib
+
+ENV_VAR = 'VISUALEQUATION_PROFILE'
+# Upper bounds of the buckets of the histograms, in milliseconds
+BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histograms:
+    """
+    A histogram of the durations of every stage, with the background spans
+    apart.
+    """
+
+    def __init__(self, bounds=BOUNDS):
+        self.bounds = bounds
+        self.lock = threading.Lock()
+        # (name, background) -> counts of every bucket, the last one without
+        # bound
+        self.counts = {}
+        # (name, background) -> seconds spent in the stage
+        self.totals = {}
+
+    def add(self, name, seconds, background=False):
+        bucket = bisect.bisect_left(self.bounds, seconds * 1000)
+        key = (name, background)
+        with self.lock:
+            if key not in self.counts:
+                self.counts[key] = [0] * (len(self.bounds) + 1)
+                self.totals[key] = 0.
+            self.counts[key][bucket] += 1
+            self.totals[key] += seconds
+
+    def count(self, name, background=False):
+        """ Return the number of times the stage was measured. """
+        with self.lock:
+            return sum(self.counts.get((name, background), ()))
+
+    def mean(self, name, background=False):
+        """ Return the mean duration of the stage in seconds, or None. """
+        key = (name, background)
+        with self.lock:
+            count = sum(self.counts.get(key, ()))
+            return self.totals[key] / count if count else None
+
+    def percentile(self, name, fraction, background=False):
+        """
+        Return the bound, in milliseconds, below which are the given
+        fraction of the durations of the stage (None if it is above every
+        bound or the stage was not measured).
+        """
+        with self.lock:
+            counts = self.counts.get((name, background))
+            if not counts:
+                return None
+            needed = fraction * sum(counts)
+            accumulated = 0
+            for bound, count in zip(self.bounds, counts):
+                accumulated += count
+                if accumulated >= needed:
+                    return bound
+            return None
+
+    def report(self, stream=sys.stderr):
+        """
+        Write the count, mean and percentiles of every stage, the background
+        ones last.
+        """
+        with self.lock:
+            keys = sorted(self.counts, key=lambda key: (key[1], key[0]))
+        for name, background in keys:
+            p50 = self.percentile(name, 0.5, background)
+            p95 = self.percentile(name, 0.95, background)
+            label = name + " (bg)" if background else name
+            stream.write("%-16s %6d  mean %9.3f ms  p50 <= %s ms  "
+                         "p95 <= %s ms\n"
+                         % (label, self.count(name, background),
+                            self.mean(name, background) * 1000,
+                            p50 or "inf", p95 or "inf"))
+        stream.flush()
+
+
+class JsonLines:
+    """
+    Append every duration to a file as a line of JSON. Durations received
+    after close() are dropped: a span can end in a worker while the program
+    exits.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, "a", buffering=1)
+
+    def add(self, name, seconds, background=False):
+        line = json.dumps({'stage': name, 'ms': round(seconds * 1000, 3),
+                           'time': round(time.time(), 3),
+                           'thread': threading.current_thread().name,
+                           'background': background})
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line + "\n")
+
+    def close(self):
+        """ Stop receiving durations and close the file. """
+        if self in collectors:
+            remove_collector(self)
+        with self.lock:
+            self.file.close()
+
+
+histograms = Histograms()
+collectors = [histograms]
+
+
+def add_collector(collector):
+    collectors.append(collector)
+
+
+def remove_collector(collector):
+    collectors.remove(collector)
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Measure the code of a with statement as the stage name, in background if
+    it is not run by the main thread.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        background = threading.current_thread() is not threading.main_thread()
+        for collector in list(collectors):
+            collector.add(name, seconds, background)
+
+
+def profile(path=None):
+    """
+    Write the durations to path, or to the file given by ENV_VAR if path is
+    None. Return the collector added, None if no file was given.
+    """
+    path = path or os.environ.get(ENV_VAR)
+    if not path:
+        return None
+    sink = JsonLines(path)
+    add_collector(sink)
+    return sink
@@ -0,0 +1,52 @@
+# visualequation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# visualequation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+A module to prepare the TeX toolchain at launch, in background, so the
+first equations are rendered as fast as the rest.
+"""
+from . import dvilayout
+
+# Fonts used by the packages of the LaTeX template
+FONTS = ('cmr10', 'cmmi10', 'cmsy10', 'cmex10', 'msam10', 'msbm10',
+         'stmary10', 'esint10', 'ecrm1000')
+
+
+def touch_fonts(fonts=FONTS, tfm_finder=dvilayout.find_tfm):
+    """
+    Find and read the TFM files of fonts, so they are in the caches of
+    dvilayout and of the system. Return the names of the fonts found.
+    """
+    found = []
+    for name in fonts:
+        try:
+            dvilayout.load_tfm(name, tfm_finder)
+        except ValueError:
+            continue
+        found.append(name)
+    return found
+
+
+def warm_up(cache, marked_code, fallback_eq, dpi):
+    """
+    Render what the first display of an equation needs: the layout of its
+    marked code and its image at dpi, or the image of fallback_eq if the
+    layout cannot be read. Running latex loads its format and the fonts of
+    the template from disk.
+    """
+    touch_fonts()
+    layout = cache.layout(marked_code)
+    if layout is not None:
+        cache.png(marked_code, dpi, frame=layout.frame, interactive=False)
+    else:
+        cache.png(fallback_eq, dpi, interactive=False)